@@ -4,11 +4,23 @@
 ################################################################################
 from __future__ import absolute_import
 
+import sys
+
 from ._version import __version__
+from .batch import LookupResult, LookupResults
+from .cache import ReputationCache, SqliteReputationStore
 from .client import TieClient
+from .codec import JsonCodec, OrjsonCodec, UjsonCodec, get_default_codec
+from .dedupe import EventDeduplicator
+from .filters import EventFilter, HashFilter, SystemGuidFilter, TrustLevelFilter
+from .hashes import FileHashes, HashMemo, LazyHashes
+from .reputation import Reputation, ReputationSet, LazyReputationSet
 from .constants import *
 from .callbacks import *
 
+if sys.version_info >= (3, 5):
+    from .aio import AsyncTieClient
+
 
 def get_version():
     """
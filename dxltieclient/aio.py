@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+################################################################################
+# Copyright (c) 2017 McAfee LLC - All Rights Reserved.
+################################################################################
+
+from __future__ import absolute_import
+
+import asyncio  # pylint: disable=import-error
+import copy
+from collections import OrderedDict
+
+from .batch import DEFAULT_MAX_IN_FLIGHT, LookupResult, LookupResults
+from .cache import ReputationCache
+from .client import CERT_COLUMN_ATTRIBUTES, FILE_COLUMN_ATTRIBUTES, TieClient
+from .constants import CertProvider, FileProvider
+
+
+class AsyncTieClient(object):
+    """
+    The :class:`AsyncTieClient` class exposes the request methods of a :class:`dxltieclient.client.TieClient`
+    to `asyncio` applications (Python 3 only).
+
+    Each method mirrors the :class:`dxltieclient.client.TieClient` method of the same name, including the
+    batch methods (:func:`get_file_reputations` and :func:`get_certificate_reputations`). The methods are
+    not coroutines: they send the requests immediately and return an `asyncio` future, which can be awaited
+    (or passed to ``asyncio.gather``, ``asyncio.wait_for``, etc.) from a coroutine. The requests are sent
+    using the asynchronous request support of the DXL client and the futures are completed on the event
+    loop (via ``loop.call_soon_threadsafe``) when the responses arrive, so no thread is consumed (or
+    blocked) per outstanding request.
+
+    If a response is not received within the ``response_timeout`` of the wrapped
+    :class:`dxltieclient.client.TieClient`, the future fails with a
+    :class:`dxlclient.exceptions.WaitTimeoutException` (as the synchronous methods do). Cancelling the future
+    (for example, via ``asyncio.wait_for`` with a shorter timeout) causes the response to be discarded.
+
+    **Example Usage**
+
+        .. code-block:: python
+
+            async_tie_client = AsyncTieClient(TieClient(dxl_client))
+
+            async def lookup(hashes_list):
+                return await asyncio.gather(
+                    *[async_tie_client.get_file_reputation(hashes) for hashes in hashes_list],
+                    return_exceptions=True)
+    """
+
+    def __init__(self, tie_client, loop=None):
+        """
+        Constructor parameters:
+
+        :param tie_client: The :class:`dxltieclient.client.TieClient` used to send the requests
+        :param loop: The `asyncio` event loop on which the futures are completed (optional). If not
+            specified, the event loop of the calling coroutine is used.
+        """
+        self._tie_client = tie_client
+        self._loop = loop
+
+    @property
+    def tie_client(self):
+        """
+        The :class:`dxltieclient.client.TieClient` used to send the requests
+        """
+        return self._tie_client
+
+    def get_file_reputation(self, hashes):
+        """
+        Retrieves the reputations for the specified file (as identified by hashes). See
+        :func:`dxltieclient.client.TieClient.get_file_reputation` for details.
+
+        :param hashes: A ``dict`` (dictionary) of hashes that identify the file to retrieve the reputations for
+        :return: An awaitable future that completes with the reputations ``dict`` (dictionary)
+        """
+        return self._wrap(self._tie_client.get_file_reputation_async(hashes))
+
+    def set_file_reputation(self, trust_level, hashes, filename="", comment=""):
+        """
+        Sets the "Enterprise" reputation (`trust level`) of a specified file (as identified by hashes). See
+        :func:`dxltieclient.client.TieClient.set_file_reputation` for details.
+
+        :param trust_level: The new `trust level` for the file
+        :param hashes: A ``dict`` (dictionary) of hashes that identify the file
+        :param filename: A file name to associate with the file (optional)
+        :param comment: A comment to associate with the file (optional)
+        :return: An awaitable future that completes once the TIE server has acknowledged the request
+        """
+        return self._wrap(self._tie_client.set_file_reputation_async(
+            trust_level, hashes, filename=filename, comment=comment))
+
+    def get_file_reputations(self, hashes_list, max_in_flight=DEFAULT_MAX_IN_FLIGHT):
+        """
+        Retrieves the reputations for each of the specified files (as identified by hashes). See
+        :func:`dxltieclient.client.TieClient.get_file_reputations` for details.
+
+        :param hashes_list: An iterable of ``dict`` (dictionary) of hashes, each of which identifies a file
+        :param max_in_flight: The maximum number of requests awaiting a response at the same time
+            (defaults to ``100``)
+        :return: An awaitable future that completes with the :class:`dxltieclient.batch.LookupResults`
+            ``list`` containing a :class:`dxltieclient.batch.LookupResult` for each file
+        """
+        return self._get_reputations_batch(
+            hashes_list, ReputationCache.make_key, self._tie_client.get_file_reputation_async,
+            max_in_flight, FileProvider, FILE_COLUMN_ATTRIBUTES)
+
+    def get_file_first_references(self, hashes, query_limit=500):
+        """
+        Retrieves the set of systems which have referenced the specified file (as identified by hashes).
+        See :func:`dxltieclient.client.TieClient.get_file_first_references` for details.
+
+        :param hashes: A ``dict`` (dictionary) of hashes that identify the file to lookup
+        :param query_limit: The maximum number of results to return
+        :return: An awaitable future that completes with the ``list`` of systems
+        """
+        return self._wrap(self._tie_client.get_file_first_references_async(
+            hashes, query_limit=query_limit))
+
+    def get_certificate_reputation(self, sha1, public_key_sha1=None):
+        """
+        Retrieves the reputations for the specified certificate. See
+        :func:`dxltieclient.client.TieClient.get_certificate_reputation` for details.
+
+        :param sha1: The SHA-1 of the certificate
+        :param public_key_sha1: The SHA-1 of the certificate's public key (optional)
+        :return: An awaitable future that completes with the reputations ``dict`` (dictionary)
+        """
+        return self._wrap(self._tie_client.get_certificate_reputation_async(
+            sha1, public_key_sha1=public_key_sha1))
+
+    def get_certificate_reputations(self, certs, max_in_flight=DEFAULT_MAX_IN_FLIGHT):
+        """
+        Retrieves the reputations for each of the specified certificates. See
+        :func:`dxltieclient.client.TieClient.get_certificate_reputations` for details.
+
+        :param certs: An iterable of ``(sha1, public_key_sha1)`` tuples, each of which identifies a certificate.
+            The SHA-1 of the certificate's public key may be ``None``.
+        :param max_in_flight: The maximum number of requests awaiting a response at the same time
+            (defaults to ``100``)
+        :return: An awaitable future that completes with the :class:`dxltieclient.batch.LookupResults`
+            ``list`` containing a :class:`dxltieclient.batch.LookupResult` for each certificate
+        """
+        return self._get_reputations_batch(
+            certs, lambda cert: ReputationCache.make_key(TieClient._cert_hashes(*cert)),
+            lambda cert: self._tie_client.get_certificate_reputation_async(*cert),
+            max_in_flight, CertProvider, CERT_COLUMN_ATTRIBUTES)
+
+    def set_certificate_reputation(self, trust_level, sha1, public_key_sha1=None, comment=""):
+        """
+        Sets the "Enterprise" reputation (`trust level`) of a specified certificate. See
+        :func:`dxltieclient.client.TieClient.set_certificate_reputation` for details.
+
+        :param trust_level: The new `trust level` for the certificate
+        :param sha1: The SHA-1 of the certificate
+        :param public_key_sha1: The SHA-1 of the certificate's public key (optional)
+        :param comment: A comment to associate with the certificate (optional)
+        :return: An awaitable future that completes once the TIE server has acknowledged the request
+        """
+        return self._wrap(self._tie_client.set_certificate_reputation_async(
+            trust_level, sha1, public_key_sha1=public_key_sha1, comment=comment))
+
+    def get_certificate_first_references(self, sha1, public_key_sha1=None, query_limit=500):
+        """
+        Retrieves the set of systems which have referenced the specified certificate. See
+        :func:`dxltieclient.client.TieClient.get_certificate_first_references` for details.
+
+        :param sha1: The SHA-1 of the certificate
+        :param public_key_sha1: The SHA-1 of the certificate's public key (optional)
+        :param query_limit: The maximum number of results to return
+        :return: An awaitable future that completes with the ``list`` of systems
+        """
+        return self._wrap(self._tie_client.get_certificate_first_references_async(
+            sha1, public_key_sha1=public_key_sha1, query_limit=query_limit))
+
+    def _get_reputations_batch(self, items, make_key, lookup, max_in_flight, providers, column_attributes):
+        """
+        Retrieves the reputations for each of the specified items, with at most ``max_in_flight`` lookups
+        outstanding at the same time. Identical items (with the same cache key) are only looked up once.
+        The lookups are started from callbacks on the event loop as earlier lookups complete, so no thread
+        is blocked while the batch is in progress. Cancelling the returned future cancels the outstanding
+        lookups.
+
+        :param items: An iterable of the items to retrieve reputations for
+        :param make_key: Function returning the cache key for an item
+        :param lookup: Function returning a :class:`concurrent.futures.Future` for the reputations of an item
+        :param max_in_flight: The maximum number of lookups awaiting a response at the same time
+        :param providers: The reputation providers class (for the columnar export of the results)
+        :param column_attributes: The attributes included in the columnar export of the results
+        :return: An `asyncio` future that completes with the :class:`dxltieclient.batch.LookupResults`
+        """
+        if max_in_flight < 1:
+            raise ValueError("Maximum requests in flight must be greater than 0")
+        loop = self._loop or asyncio.get_event_loop()
+        batch_future = loop.create_future()
+
+        results = []
+        # Cache key to the item and the indices of the items awaiting the corresponding lookup
+        pending = OrderedDict()
+        for index, item in enumerate(items):
+            results.append(None)
+            try:
+                key = make_key(item)
+            except Exception as ex:  # pylint: disable=broad-except
+                results[index] = LookupResult(None, ex)
+                continue
+            pending.setdefault(key, (item, []))[1].append(index)
+        pending_lookups = iter(pending.values())
+        in_flight = set()
+
+        def on_lookup_done(aio_future, indices):
+            in_flight.discard(aio_future)
+            if batch_future.done():
+                return
+            if aio_future.cancelled():
+                result = LookupResult(None, asyncio.CancelledError())
+            else:
+                error = aio_future.exception()
+                result = LookupResult(None, error) if error is not None else \
+                    LookupResult(aio_future.result(), None)
+            results[indices[0]] = result
+            for index in indices[1:]:
+                results[index] = LookupResult(copy.deepcopy(result.value), result.error)
+            start_lookups()
+
+        def start_lookups():
+            for item, indices in pending_lookups:
+                try:
+                    aio_future = self._wrap(lookup(item))
+                except Exception as ex:  # pylint: disable=broad-except
+                    for index in indices:
+                        results[index] = LookupResult(None, ex)
+                    continue
+                in_flight.add(aio_future)
+                aio_future.add_done_callback(lambda aio_future, indices=indices: on_lookup_done(aio_future, indices))
+                if len(in_flight) >= max_in_flight:
+                    return
+            if not in_flight and not batch_future.done():
+                batch_future.set_result(LookupResults(results, providers, column_attributes))
+
+        def on_batch_done(batch_future):
+            # Cancel the outstanding lookups if the batch was cancelled
+            if batch_future.cancelled():
+                for aio_future in list(in_flight):
+                    aio_future.cancel()
+
+        batch_future.add_done_callback(on_batch_done)
+        start_lookups()
+        return batch_future
+
+    def _wrap(self, future):
+        """
+        Returns an `asyncio` future that completes on the event loop when the specified
+        :class:`concurrent.futures.Future` completes. Cancelling the `asyncio` future cancels the
+        :class:`concurrent.futures.Future`. Timeouts are applied by the
+        :class:`concurrent.futures.Future` (see :func:`dxltieclient.batch.send_async_request`), which
+        unregisters the response callback from the DXL client when it is cancelled or times out.
+
+        :param future: The :class:`concurrent.futures.Future`
+        :return: The `asyncio` future
+        """
+        loop = self._loop or asyncio.get_event_loop()
+        aio_future = loop.create_future()
+
+        def copy_state(future):
+            if aio_future.done():
+                return
+            if future.cancelled():
+                aio_future.cancel()
+            elif future.exception() is not None:
+                aio_future.set_exception(future.exception())
+            else:
+                aio_future.set_result(future.result())
+
+        def on_done(future):
+            # Typically invoked on the DXL client thread that delivered the response
+            if loop.is_closed():
+                return
+            try:
+                loop.call_soon_threadsafe(copy_state, future)
+            except RuntimeError:
+                # The loop was closed concurrently
+                pass
+
+        def on_aio_done(aio_future):  # pylint: disable=unused-argument
+            # Discard the response if the request was cancelled (this also unregisters the response
+            # callback from the DXL client)
+            future.cancel()
+
+        aio_future.add_done_callback(on_aio_done)
+        future.add_done_callback(on_done)
+        return aio_future
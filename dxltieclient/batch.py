@@ -0,0 +1,615 @@
+# -*- coding: utf-8 -*-
+################################################################################
+# Copyright (c) 2017 McAfee LLC - All Rights Reserved.
+################################################################################
+
+from __future__ import absolute_import
+
+import array
+import copy
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import namedtuple, OrderedDict
+from concurrent.futures import Future
+
+from dxlclient import ResponseCallback
+from dxlclient.exceptions import WaitTimeoutException
+from dxlclient.message import Message
+
+from .constants import ReputationProp
+
+try:
+    import numpy
+except ImportError:
+    numpy = None  # pylint: disable=invalid-name
+
+logger = logging.getLogger(__name__)
+
+#: The default maximum number of requests that are outstanding at the same time during a batch lookup
+DEFAULT_MAX_IN_FLIGHT = 100
+
+
+class LookupResult(namedtuple("LookupResult", ["value", "error"])):
+    """
+    The result of a single lookup within a batch (see
+    :func:`dxltieclient.client.TieClient.get_file_reputations`).
+
+    The ``value`` field contains the value that the corresponding single lookup method would have returned
+    (``None`` if the lookup failed). The ``error`` field contains the exception that the corresponding single
+    lookup method would have raised (``None`` if the lookup succeeded).
+    """
+    __slots__ = ()
+
+
+class LookupResults(list):
+    """
+    The ``list`` of :class:`LookupResult` returned by a batch reputation lookup (see
+    :func:`dxltieclient.client.TieClient.get_file_reputations` and
+    :func:`dxltieclient.client.TieClient.get_certificate_reputations`).
+
+    In addition to the standard ``list`` behavior, the results can be exported in a columnar form (see
+    :func:`to_columns`) which can be loaded into analytics libraries such as `pandas` without
+    converting each reputation.
+    """
+
+    def __init__(self, results=(), provider_class=None, column_attributes=None):
+        """
+        Constructor parameters:
+
+        :param results: An iterable of :class:`LookupResult`
+        :param provider_class: The `reputation provider` constants class for the results (for example,
+            :class:`dxltieclient.constants.FileProvider`)
+        :param column_attributes: ``dict`` (dictionary) of `provider` identifier to the attribute classes
+            and attributes which are exported as columns by default (see :func:`to_columns`)
+        """
+        super(LookupResults, self).__init__(results)
+        self.provider_class = provider_class
+        self.column_attributes = column_attributes or {}
+
+    def to_columns(self, providers=None, attributes=None, missing=-1):
+        """
+        Exports the results as columns of integers, one entry per result (in the order of the results).
+
+        The following columns are returned:
+
+            * ``error``: ``1`` if the lookup failed, otherwise ``0``
+            * ``<provider>_trust_level`` and ``<provider>_create_date``: The `trust level` and creation
+              date of the reputation from each `provider` (for example, ``enterprise_trust_level``)
+            * ``<provider>_<attribute>``: The value of each selected attribute, parsed to an integer
+              (for example, ``enterprise_prevalence``)
+
+        If `NumPy` is installed, each column is a 64-bit integer ``numpy.ndarray``, otherwise each
+        column is an ``array.array`` of integers. Both support the buffer protocol, so they can be
+        loaded (for example, into a ``pandas.DataFrame``) without converting individual values.
+
+        **Example Usage**
+
+            .. code-block:: python
+
+                results = tie_client.get_file_reputations(hashes_list)
+                data_frame = pandas.DataFrame(results.to_columns())
+
+        :param providers: The `provider` identifiers to export trust levels and creation dates for
+            (defaults to all of the `providers` in the provider constants class of the results)
+        :param attributes: ``dict`` (dictionary) of `provider` identifier to the attributes to export
+            for that `provider`. Each attribute is either an attribute constant (for example,
+            ``FileEnterpriseAttrib.PREVALENCE``) or a tuple of a column name suffix and an attribute
+            constant. Defaults to the prevalence, first contact and (for files) detection count
+            attributes of the Enterprise `provider`.
+        :param missing: The value used when a lookup failed, or when a reputation or attribute is not
+            present or is not an integer
+        :return: An ``OrderedDict`` of column name to column
+        """
+        provider_names = self._provider_names()
+        if providers is None:
+            providers = sorted(provider_names)
+        if attributes is None:
+            attributes = self.column_attributes
+
+        columns = OrderedDict()
+        columns["error"] = [0 if result.error is None else 1 for result in self]
+        for provider_id in providers:
+            prefix = provider_names.get(provider_id, str(provider_id)) + "_"
+            reputations = [self._get_reputation(result, provider_id) for result in self]
+            columns[prefix + "trust_level"] = [
+                missing if reputation is None else
+                _to_int(reputation.get(ReputationProp.TRUST_LEVEL), missing) for reputation in reputations]
+            columns[prefix + "create_date"] = [
+                missing if reputation is None else
+                _to_int(reputation.get(ReputationProp.CREATE_DATE), missing) for reputation in reputations]
+            for attrib in attributes.get(provider_id, ()):
+                name, attrib = attrib if isinstance(attrib, tuple) else (attrib, attrib)
+                columns[prefix + str(name).lower()] = [
+                    missing if reputation is None else
+                    _to_int(reputation.get(ReputationProp.ATTRIBUTES, {}).get(attrib), missing)
+                    for reputation in reputations]
+
+        for name, values in columns.items():
+            columns[name] = _to_column(values)
+        return columns
+
+    def _provider_names(self):
+        """
+        Returns the names of the providers in the provider constants class of the results
+        :return: ``dict`` (dictionary) of provider identifier to lower case name
+        """
+        if self.provider_class is None:
+            return {}
+        return {getattr(self.provider_class, name): name.lower()
+                for name in dir(self.provider_class) if name.isupper()}
+
+    @staticmethod
+    def _get_reputation(result, provider_id):
+        """
+        Returns the reputation from the specified provider within a result
+        :param result: The :class:`LookupResult`
+        :param provider_id: The provider identifier
+        :return: The reputation ``dict`` (dictionary) (``None`` if not present)
+        """
+        if result.error is not None or result.value is None:
+            return None
+        reputation = result.value.get(provider_id)
+        if reputation is not None and not isinstance(reputation, dict):
+            # Reputation object (see ResultMode)
+            return {ReputationProp.TRUST_LEVEL: reputation.trust_level,
+                    ReputationProp.CREATE_DATE: reputation.create_date,
+                    ReputationProp.ATTRIBUTES: _AttributeView(reputation)}
+        return reputation
+
+
+class _AttributeView(object):
+    """
+    Minimal ``dict``-like view of the attributes of a :class:`dxltieclient.reputation.Reputation`.
+    """
+    __slots__ = ("_reputation",)
+
+    def __init__(self, reputation):
+        self._reputation = reputation
+
+    def get(self, attrib, default=None):
+        return self._reputation.get_attribute(attrib, default)
+
+
+def _to_int(value, missing):
+    """
+    Parses the specified value to an integer
+    :param value: The value
+    :param missing: The value to return if the value is ``None`` or is not an integer
+    :return: The integer value
+    """
+    if value is None:
+        return missing
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return missing
+
+
+def _to_column(values):
+    """
+    Converts the specified list of integers to a column
+    :param values: The list of integers
+    :return: A ``numpy.ndarray`` (if NumPy is available) or an ``array.array``
+    """
+    if numpy is not None:
+        return numpy.array(values, dtype=numpy.int64)
+    try:
+        return array.array("q", values)
+    except ValueError:
+        # Python 2 does not support the "q" (long long) type code
+        return array.array("l", values)
+
+
+def check_response(response):
+    """
+    Raises an exception if the specified DXL response is an error response.
+
+    :param response: The DXL response
+    :return: The DXL response
+    """
+    if response.message_type == Message.MESSAGE_TYPE_ERROR:
+        raise Exception("Error: " + response.error_message + " (" + str(response.error_code) + ")")
+    return response
+
+
+def _unregister_response_callback(dxl_client, message_id):
+    """
+    Removes the response callback registered for the asynchronous request with the specified message
+    identifier. The DXL client only removes the callback when the response is received, so this must be
+    invoked when a response will no longer be processed (for example, after a timeout), otherwise the
+    callback (and everything it references) would be retained indefinitely.
+
+    The DXL client does not expose a public method for this, so the callback is removed via its request
+    manager (if the client has one).
+
+    :param dxl_client: The DXL client used to send the request
+    :param message_id: The message identifier of the request
+    """
+    request_manager = getattr(dxl_client, "_request_manager", None)
+    if request_manager is not None:
+        request_manager.unregister_async_callback(message_id)
+        request_manager.remove_current_request(message_id)
+
+
+class _DispatchResponseCallback(ResponseCallback):
+    """
+    Response callback that reports the response for a single request to a :class:`_RequestDispatcher`.
+    """
+
+    def __init__(self, dispatcher, index):
+        super(_DispatchResponseCallback, self).__init__()
+        self._dispatcher = dispatcher
+        self._index = index
+
+    def on_response(self, response):
+        self._dispatcher.on_response(self._index, response)
+
+
+class _FutureResponseCallback(ResponseCallback):
+    """
+    Response callback that completes a :class:`concurrent.futures.Future` with the parsed response (or
+    with a :class:`dxlclient.exceptions.WaitTimeoutException` if the response is not received in time).
+    """
+
+    def __init__(self, future, parse_response):
+        super(_FutureResponseCallback, self).__init__()
+        self._future = future
+        self._parse_response = parse_response
+        # Serializes the completion of the future by the response and the timeout
+        self._lock = threading.Lock()
+
+    def on_response(self, response):
+        with self._lock:
+            # The caller may have cancelled the future (or it may have timed out) while the request was
+            # outstanding
+            if self._future.done() or not self._future.set_running_or_notify_cancel():
+                return
+            try:
+                self._future.set_result(self._parse_response(check_response(response)))
+            except Exception as ex:  # pylint: disable=broad-except
+                self._future.set_exception(ex)
+
+    def on_timeout(self, message_id):
+        """
+        Fails the future (unless it has already completed) as the response was not received in time.
+
+        :param message_id: The message identifier of the request
+        """
+        with self._lock:
+            if self._future.done() or not self._future.set_running_or_notify_cancel():
+                return
+            self._future.set_exception(WaitTimeoutException(
+                "Timeout waiting for response to message: " + message_id))
+
+
+class _TimeoutHandle(object):
+    """
+    Handle for a function scheduled by a :class:`_TimeoutScheduler`, which can be used to cancel it.
+    """
+    __slots__ = ("func", "_scheduler")
+
+    def __init__(self, scheduler, func):
+        #: The function to invoke (``None`` once cancelled or invoked)
+        self.func = func
+        self._scheduler = scheduler
+
+    def cancel(self):
+        """
+        Cancels the function (if it has not been invoked yet), releasing the reference to it.
+        """
+        self._scheduler.cancel(self)
+
+
+class _TimeoutScheduler(object):
+    """
+    Invokes functions once their deadlines have passed, using a single daemon thread (started on first
+    use) for all of the outstanding asynchronous requests.
+
+    Cancelled functions are released immediately. Their (empty) entries are removed when they reach the
+    front of the queue, or when they make up more than half of the queue.
+    """
+
+    #: The queue size below which cancelled entries are only removed when they reach the front
+    MIN_COMPACT_SIZE = 64
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        # Heap of (deadline, sequence, handle)
+        self._entries = []
+        self._sequence = itertools.count()
+        self._cancelled = 0
+        self._thread = None
+
+    @property
+    def size(self):
+        """
+        The number of functions awaiting their deadline (excluding cancelled functions)
+        """
+        with self._condition:
+            return len(self._entries) - self._cancelled
+
+    def schedule(self, delay, func):
+        """
+        Schedules the specified function to be invoked after the specified delay.
+
+        :param delay: The number of seconds after which the function is invoked
+        :param func: The function
+        :return: A :class:`_TimeoutHandle` which can be used to cancel the function
+        """
+        handle = _TimeoutHandle(self, func)
+        with self._condition:
+            heapq.heappush(self._entries, (time.time() + delay, next(self._sequence), handle))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="TieClientTimeouts")
+                self._thread.daemon = True
+                self._thread.start()
+            self._condition.notify()
+        return handle
+
+    def cancel(self, handle):
+        """
+        Cancels the function of the specified handle (if it has not been invoked yet).
+
+        :param handle: The :class:`_TimeoutHandle` returned by :func:`schedule`
+        """
+        with self._condition:
+            if handle.func is None:
+                return
+            handle.func = None
+            self._cancelled += 1
+            if len(self._entries) >= self.MIN_COMPACT_SIZE and self._cancelled * 2 > len(self._entries):
+                self._entries = [entry for entry in self._entries if entry[2].func is not None]
+                heapq.heapify(self._entries)
+                self._cancelled = 0
+
+    def _run(self):
+        """
+        Invokes the functions as their deadlines pass.
+        """
+        while True:
+            with self._condition:
+                while True:
+                    now = time.time()
+                    if self._entries and self._entries[0][0] <= now:
+                        handle = heapq.heappop(self._entries)[2]
+                        func, handle.func = handle.func, None
+                        if func is None:
+                            self._cancelled -= 1
+                            continue
+                        break
+                    self._condition.wait(self._entries[0][0] - now if self._entries else None)
+            try:
+                func()
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Error invoking timeout handler")
+
+
+# The scheduler used to time out asynchronous requests
+_timeout_scheduler = _TimeoutScheduler()
+
+
+def send_async_request(dxl_client, request, parse_response, timeout=None):
+    """
+    Sends the specified DXL request asynchronously.
+
+    The response callback is unregistered from the DXL client if the returned future is cancelled or
+    times out, so that requests which never receive a response are not retained.
+
+    :param dxl_client: The DXL client used to send the request
+    :param request: The DXL request
+    :param parse_response: Function invoked with the (non-error) DXL response which returns the value
+        for the request
+    :param timeout: The number of seconds after which the future fails with a
+        :class:`dxlclient.exceptions.WaitTimeoutException` if the response has not been received
+        (optional, by default the future waits indefinitely)
+    :return: A :class:`concurrent.futures.Future` that completes with the value for the request, or with
+        the exception raised while sending the request or processing the response
+    """
+    future = Future()
+    message_id = request.message_id
+    response_callback = _FutureResponseCallback(future, parse_response)
+    try:
+        dxl_client.async_request(request, response_callback)
+    except Exception as ex:  # pylint: disable=broad-except
+        # The DXL client does not unregister the callback if the request could not be sent
+        _unregister_response_callback(dxl_client, message_id)
+        future.set_running_or_notify_cancel()
+        future.set_exception(ex)
+        return future
+
+    timeout_handle = None if timeout is None else \
+        _timeout_scheduler.schedule(timeout, lambda: response_callback.on_timeout(message_id))
+
+    def on_done(_):
+        # Release the timeout (so that the completed future is not retained until its deadline), and
+        # unregister the callback if the future is cancelled or times out (if the response was received,
+        # the DXL client has already removed it)
+        if timeout_handle is not None:
+            timeout_handle.cancel()
+        _unregister_response_callback(dxl_client, message_id)
+
+    future.add_done_callback(on_done)
+    return future
+
+
+def completed_future(value):
+    """
+    Returns a :class:`concurrent.futures.Future` that has already completed with the specified value.
+
+    :param value: The value
+    :return: The completed :class:`concurrent.futures.Future`
+    """
+    future = Future()
+    future.set_running_or_notify_cancel()
+    future.set_result(value)
+    return future
+
+
+class _RequestDispatcher(object):
+    """
+    Sends a sequence of DXL requests asynchronously, keeping at most a fixed number of requests
+    outstanding, and collects the results in the order of the requests.
+    """
+
+    def __init__(self, dxl_client, parse_response, max_in_flight, timeout):
+        """
+        Constructor parameters:
+
+        :param dxl_client: The DXL client used to send the requests
+        :param parse_response: Function invoked with each (non-error) DXL response which returns the value
+            for the corresponding request
+        :param max_in_flight: The maximum number of requests that are outstanding at the same time
+        :param timeout: The maximum number of seconds to wait for the response to each request
+        """
+        if max_in_flight < 1:
+            raise ValueError("Maximum requests in flight must be greater than 0")
+        self._dxl_client = dxl_client
+        self._parse_response = parse_response
+        self._max_in_flight = max_in_flight
+        self._timeout = timeout
+        self._condition = threading.Condition()
+        # Request index to (message id, deadline) for requests awaiting a response
+        self._in_flight = {}
+        self._results = []
+
+    def dispatch(self, requests, create_request=None):
+        """
+        Sends the specified requests and waits for all of their responses.
+
+        :param requests: An iterable of DXL requests, or of the items for which ``create_request`` creates
+            the DXL requests
+        :param create_request: Function which returns the DXL request for an item (optional). Each request
+            is only created once a request slot is available, so that at most ``max_in_flight`` requests
+            (and their payloads) exist at a time. If the function raises an exception, the exception is
+            the result for the item.
+        :return: A ``list`` of :class:`LookupResult` in the order of the requests
+        """
+        for index, request in enumerate(requests):
+            with self._condition:
+                self._results.append(None)
+                while len(self._in_flight) >= self._max_in_flight:
+                    self._wait()
+            if create_request is not None:
+                try:
+                    request = create_request(request)
+                except Exception as ex:  # pylint: disable=broad-except
+                    self._results[index] = LookupResult(None, ex)
+                    continue
+            with self._condition:
+                self._in_flight[index] = (request.message_id, time.time() + self._timeout)
+            try:
+                self._dxl_client.async_request(
+                    request, _DispatchResponseCallback(self, index))
+            except Exception as ex:  # pylint: disable=broad-except
+                # The DXL client does not unregister the callback if the request could not be sent
+                _unregister_response_callback(self._dxl_client, request.message_id)
+                self._complete(index, LookupResult(None, ex))
+
+        with self._condition:
+            while self._in_flight:
+                self._wait()
+        return self._results
+
+    def on_response(self, index, response):
+        """
+        Invoked when the response for a request has been received.
+
+        :param index: The index of the request
+        :param response: The DXL response
+        """
+        try:
+            result = LookupResult(self._parse_response(check_response(response)), None)
+        except Exception as ex:  # pylint: disable=broad-except
+            result = LookupResult(None, ex)
+        self._complete(index, result)
+
+    def _complete(self, index, result):
+        """
+        Records the result for a request (unless it has already timed out).
+
+        :param index: The index of the request
+        :param result: The :class:`LookupResult`
+        """
+        with self._condition:
+            if self._in_flight.pop(index, None) is not None:
+                self._results[index] = result
+                self._condition.notify_all()
+
+    def _wait(self):
+        """
+        Waits until a request completes or the earliest deadline passes, and fails the requests whose
+        deadline has passed (the condition must be held by the caller).
+        """
+        now = time.time()
+        for index, (message_id, deadline) in list(self._in_flight.items()):
+            if deadline <= now:
+                del self._in_flight[index]
+                _unregister_response_callback(self._dxl_client, message_id)
+                self._results[index] = LookupResult(None, WaitTimeoutException(
+                    "Timeout waiting for response to message: " + message_id))
+        if self._in_flight:
+            self._condition.wait(
+                max(0, min(deadline for _, deadline in self._in_flight.values()) - now))
+
+
+class _Call(object):
+    """
+    A call that is in progress within a :class:`_SingleFlight`.
+    """
+    __slots__ = ("done", "value", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        self.waiters = 0
+
+
+class _SingleFlight(object):
+    """
+    Coalesces concurrent calls for the same key so that only one of them is performed. The other callers
+    wait for the result of the call in progress and receive a copy of its value (or its exception).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def call(self, key, func):
+        """
+        Invokes the specified function, unless a call for the same key is already in progress, in which
+        case the result of that call is returned instead.
+
+        :param key: The key identifying the call
+        :param func: The function to invoke
+        :return: The value returned by the function
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.value)
+
+        try:
+            call.value = func()
+        except Exception as ex:
+            call.error = ex
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+        # Waiting callers copy the value, so it must not be handed out for modification
+        return copy.deepcopy(call.value) if call.waiters else call.value
@@ -0,0 +1,790 @@
+# -*- coding: utf-8 -*-
+################################################################################
+# Copyright (c) 2017 McAfee LLC - All Rights Reserved.
+################################################################################
+
+from __future__ import absolute_import
+
+import copy
+import errno
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from .constants import ReputationProp
+from .hashes import FileHashes
+
+# Marker returned by the internal store when a key is not present (or expired)
+_MISSING = object()
+
+
+class _LruTtlStore(object):
+    """
+    Bounded mapping with per-entry expiration and least-recently-used eviction.
+
+    This class is not thread-safe, the owner is responsible for locking.
+    """
+
+    def __init__(self, max_size, ttl):
+        """
+        Constructor parameters:
+
+        :param max_size: The maximum number of entries to hold (``0`` disables the store)
+        :param ttl: The number of seconds an entry remains valid after it was stored
+        """
+        if max_size < 0:
+            raise ValueError("Maximum size must be greater than or equal to 0")
+        if ttl <= 0:
+            raise ValueError("TTL must be greater than 0")
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def keys(self):
+        """
+        Returns a list of the keys currently held by the store (including expired entries that
+        have not been purged yet).
+        """
+        return list(self._entries.keys())
+
+    def get(self, key, now):
+        """
+        Returns the value for the specified key and marks it as most recently used.
+
+        :param key: The key
+        :param now: The current time
+        :return: A tuple containing the value (``_MISSING`` if the key is not present or has
+            expired) and whether an expired entry was removed
+        """
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return _MISSING, False
+        if entry[0] <= now:
+            return _MISSING, True
+        self._entries[key] = entry
+        return entry[1], False
+
+    def put(self, key, value, now, ttl=None):
+        """
+        Stores the value for the specified key.
+
+        :param key: The key
+        :param value: The value
+        :param now: The current time
+        :param ttl: The number of seconds the entry remains valid (defaults to the store TTL)
+        :return: The list of keys that were evicted to make room for the new entry
+        """
+        if self.max_size == 0:
+            return []
+        self._entries.pop(key, None)
+        self._entries[key] = (now + (self.ttl if ttl is None else ttl), value)
+        evicted = []
+        while len(self._entries) > self.max_size:
+            evicted.append(self._entries.popitem(last=False)[0])
+        return evicted
+
+    def pop(self, key):
+        """
+        Removes the specified key from the store.
+
+        :param key: The key
+        :return: ``True`` if the key was present
+        """
+        return self._entries.pop(key, None) is not None
+
+    def clear(self):
+        """
+        Removes all entries from the store.
+        """
+        self._entries.clear()
+
+
+class ReputationCache(object):
+    """
+    A bounded, in-process cache of reputations that can be attached to a
+    :class:`dxltieclient.client.TieClient` to avoid a round trip to the TIE server for
+    reputations that were recently retrieved.
+
+    Each entry expires once its `time to live` (TTL) has elapsed. When the cache is full, the
+    least recently used entry is evicted. The cached values are the reputations ``dict``
+    (dictionary) returned by the client. A copy is returned on each hit, so callers are free to
+    modify the values they receive (the :class:`dxltieclient.client.TieClient` skips the copy when its
+    `result mode` builds new objects from the cached value).
+
+    Empty results (files or certificates that have no reputations) are held separately in a
+    `negative` cache which has its own size limit and (typically much shorter) TTL. This allows
+    repeated lookups of unknown hashes to be answered locally without displacing known reputations.
+
+    An optional backing store (see :class:`SqliteReputationStore`) can be specified to persist
+    reputations across process restarts. Reputations that are not held in memory are then read
+    from the backing store (and remain valid until their TTL, measured from the time they were
+    originally retrieved, has elapsed). The backing store is written while the lock of the cache is
+    held, so that it is updated in the same order as the in-memory cache.
+
+    **Example Usage**
+
+        .. code-block:: python
+
+            # Cache up to 50,000 file reputations for 10 minutes
+            tie_client = TieClient(client, file_reputation_cache=ReputationCache(50000, 600))
+
+            reputations_dict = tie_client.get_file_reputation({
+                HashType.MD5: "f2c7bb8acc97f92e987a2d4087d021b1"
+            })
+
+            print("hits: {0}, misses: {1}".format(
+                tie_client.file_reputation_cache.hits,
+                tie_client.file_reputation_cache.misses))
+    """
+
+    #: The default maximum number of entries held by the cache
+    DEFAULT_MAX_SIZE = 10000
+    #: The default number of seconds an entry remains valid
+    DEFAULT_TTL = 300
+    #: The default maximum number of empty results held by the cache
+    DEFAULT_NEGATIVE_MAX_SIZE = 10000
+    #: The default number of seconds an empty result remains valid
+    DEFAULT_NEGATIVE_TTL = 30
+    #: The maximum number of recently changed hashes tracked to detect stale results (see :func:`put`)
+    MAX_CHANGED_HASHES = 10000
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE, ttl=DEFAULT_TTL,
+                 negative_max_size=DEFAULT_NEGATIVE_MAX_SIZE, negative_ttl=DEFAULT_NEGATIVE_TTL,
+                 backing_store=None):
+        """
+        Constructor parameters:
+
+        :param max_size: The maximum number of reputations to hold (defaults to ``10000``)
+        :param ttl: The number of seconds a reputation remains valid after it was retrieved
+            (defaults to ``300``)
+        :param negative_max_size: The maximum number of empty results to hold (defaults to ``10000``).
+            A value of ``0`` disables the caching of empty results.
+        :param negative_ttl: The number of seconds an empty result remains valid after it was retrieved
+            (defaults to ``30``)
+        :param backing_store: An optional persistent store (for example, a :class:`SqliteReputationStore`)
+        """
+        self._lock = threading.Lock()
+        self._store = _LruTtlStore(max_size, ttl)
+        self._negative_store = _LruTtlStore(negative_max_size, negative_ttl)
+        self._backing_store = backing_store
+        # Index of (hash type, hash value) to the set of cache keys containing it
+        self._hash_index = {}
+        self._hits = 0
+        self._negative_hits = 0
+        self._backing_store_hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._invalidations = 0
+        # Incremented on each reputation change (see generation)
+        self._generation = 0
+        # The generation of the most recent change of each (hash type, hash value)
+        self._changed_hashes = OrderedDict()
+        # The most recent generation whose changes are no longer tracked in _changed_hashes
+        self._forgotten_generation = 0
+        self._stale_puts = 0
+
+    @staticmethod
+    def make_key(hashes):
+        """
+        Returns the cache key for the specified hashes. Hash types and values are normalized
+        (lower case) so that the key does not depend on the case or order of the hashes.
+
+        :param hashes: A ``dict`` (dictionary) of hashes. The ``key`` in the dictionary is the
+            `hash type` and the ``value`` is the `hex` representation of the hash value. A
+            :class:`dxltieclient.hashes.FileHashes` may also be specified.
+        :return: The cache key
+        """
+        if isinstance(hashes, FileHashes):
+            return hashes.cache_key
+        return frozenset((hash_type.lower(), hash_value.lower())
+                         for hash_type, hash_value in hashes.items())
+
+    @property
+    def max_size(self):
+        """
+        The maximum number of reputations held by the cache
+        """
+        return self._store.max_size
+
+    @property
+    def ttl(self):
+        """
+        The number of seconds a reputation remains valid after it was retrieved
+        """
+        return self._store.ttl
+
+    @property
+    def negative_max_size(self):
+        """
+        The maximum number of empty results held by the cache
+        """
+        return self._negative_store.max_size
+
+    @property
+    def negative_ttl(self):
+        """
+        The number of seconds an empty result remains valid after it was retrieved
+        """
+        return self._negative_store.ttl
+
+    @property
+    def size(self):
+        """
+        The number of reputations currently held by the cache (excluding empty results)
+        """
+        with self._lock:
+            return len(self._store)
+
+    @property
+    def negative_size(self):
+        """
+        The number of empty results currently held by the cache
+        """
+        with self._lock:
+            return len(self._negative_store)
+
+    @property
+    def hits(self):
+        """
+        The number of lookups that were satisfied by the cache (including empty results)
+        """
+        return self._hits
+
+    @property
+    def negative_hits(self):
+        """
+        The number of lookups that were satisfied by an empty result held by the cache
+        """
+        return self._negative_hits
+
+    @property
+    def backing_store(self):
+        """
+        The persistent store backing the cache (``None`` if the cache is not persisted)
+        """
+        return self._backing_store
+
+    @property
+    def backing_store_hits(self):
+        """
+        The number of lookups that were satisfied by reading the backing store
+        """
+        return self._backing_store_hits
+
+    @property
+    def misses(self):
+        """
+        The number of lookups that were not satisfied by the cache
+        """
+        return self._misses
+
+    @property
+    def evictions(self):
+        """
+        The number of reputations that were evicted to make room for newer reputations
+        """
+        return self._evictions
+
+    @property
+    def expirations(self):
+        """
+        The number of reputations that were discarded because their TTL had elapsed
+        """
+        return self._expirations
+
+    @property
+    def invalidations(self):
+        """
+        The number of reputations that were removed or replaced due to reputation change events
+        (see :func:`update`)
+        """
+        return self._invalidations
+
+    @property
+    def generation(self):
+        """
+        The number of reputation changes applied to the cache (see :func:`update`). The generation is
+        captured before a reputation request is sent and specified when the result is stored via
+        :func:`put`, so that results which were retrieved before a reputation change do not replace the
+        newer reputations.
+        """
+        return self._generation
+
+    @property
+    def stale_puts(self):
+        """
+        The number of results that were not stored because the reputations changed while they were being
+        retrieved (see :func:`put`)
+        """
+        return self._stale_puts
+
+    def get(self, key, copy_result=True):
+        """
+        Returns a copy of the cached reputations for the specified key.
+
+        :param key: The cache key (see :func:`make_key`)
+        :param copy_result: Whether to return a copy of the cached reputations (defaults to ``True``). If
+            ``False``, the cached ``dict`` (dictionary) itself is returned and must not be modified by the
+            caller (this avoids the cost of the copy when the caller only reads the reputations).
+        :return: The reputations ``dict`` (dictionary) or ``None`` if the key is not cached
+        """
+        now = time.time()
+        with self._lock:
+            value = _MISSING
+            for store in (self._store, self._negative_store):
+                if key in store:
+                    value, expired = store.get(key, now)
+                    if expired:
+                        self._expirations += 1
+                        self._unindex(key)
+                    break
+            if value is not _MISSING:
+                return self._hit(value, copy_result)
+            if self._backing_store is None:
+                self._misses += 1
+                return None
+            generation = self._generation
+
+        # Lazily load the reputations from the backing store (outside of the lock)
+        value = self._load(key, now, generation)
+        with self._lock:
+            if value is _MISSING:
+                self._misses += 1
+                return None
+            self._backing_store_hits += 1
+            return self._hit(value, copy_result)
+
+    def put(self, key, reputations, generation=None):
+        """
+        Stores a copy of the reputations for the specified key.
+
+        :param key: The cache key (see :func:`make_key`)
+        :param reputations: The reputations ``dict`` (dictionary)
+        :param generation: The :attr:`generation` of the cache when the reputations were requested
+            (optional). If a reputation change for any of the hashes in the key has been applied since,
+            the (stale) reputations are not stored.
+        """
+        value = copy.deepcopy(reputations)
+        now = time.time()
+        with self._lock:
+            if generation is not None and self._is_stale(key, generation):
+                self._stale_puts += 1
+                return
+            self._put(key, value, now)
+            if self._backing_store is not None:
+                self._backing_store.put(key, value, now)
+
+    def invalidate(self, key):
+        """
+        Removes the reputations for the specified key from the cache.
+
+        :param key: The cache key (see :func:`make_key`)
+        """
+        with self._lock:
+            self._remove(key)
+            if self._backing_store is not None:
+                self._backing_store.delete([key])
+
+    def update(self, hashes, reputations=None):
+        """
+        Applies a reputation change to the cache.
+
+        Each cached entry whose hashes are all contained in the specified hashes is replaced with
+        the new reputations. Any other cached entry that shares at least one hash with the specified
+        hashes is removed (as is every matching entry if no reputations are specified).
+
+        :param hashes: A ``dict`` (dictionary) of hashes that identify the file or certificate whose
+            reputation has changed. The ``key`` in the dictionary is the `hash type` and the
+            ``value`` is the `hex` representation of the hash value.
+        :param reputations: The new reputations ``dict`` (dictionary) (optional)
+        """
+        changed_key = self.make_key(hashes)
+        value = None if reputations is None else copy.deepcopy(reputations)
+        now = time.time()
+        with self._lock:
+            self._record_change(changed_key)
+            matching_keys = set()
+            for hash_pair in changed_key:
+                matching_keys.update(self._hash_index.get(hash_pair, ()))
+            for key in matching_keys:
+                self._invalidations += 1
+                if value is not None and key <= changed_key:
+                    self._put(key, value, now)
+                else:
+                    self._remove(key)
+
+            if self._backing_store is not None:
+                stored_keys = self._backing_store.find(changed_key)
+                if value is not None:
+                    for key in stored_keys:
+                        if key <= changed_key:
+                            self._backing_store.put(key, value, now)
+                self._backing_store.delete(
+                    [key for key in stored_keys if value is None or not key <= changed_key])
+
+    def clear(self):
+        """
+        Removes all reputations from the cache. The backing store (if applicable) is not modified.
+        """
+        with self._lock:
+            self._store.clear()
+            self._negative_store.clear()
+            self._hash_index.clear()
+
+    def _record_change(self, changed_key):
+        """
+        Records a reputation change for the specified hashes (the lock must be held by the caller).
+
+        :param changed_key: The cache key of the hashes whose reputation has changed
+        """
+        self._generation += 1
+        for hash_pair in changed_key:
+            self._changed_hashes.pop(hash_pair, None)
+            self._changed_hashes[hash_pair] = self._generation
+        while len(self._changed_hashes) > self.MAX_CHANGED_HASHES:
+            self._forgotten_generation = self._changed_hashes.popitem(last=False)[1]
+
+    def _is_stale(self, key, generation):
+        """
+        Returns whether a reputation change for any of the hashes in the specified key has been applied
+        since the specified generation (the lock must be held by the caller). If the changes are no longer
+        tracked, the reputations are conservatively considered stale.
+
+        :param key: The cache key
+        :param generation: The generation of the cache when the reputations were requested
+        :return: Whether the reputations are stale
+        """
+        if generation == self._generation:
+            return False
+        if generation < self._forgotten_generation:
+            return True
+        return any(self._changed_hashes.get(hash_pair, 0) > generation for hash_pair in key)
+
+    def _hit(self, value, copy_result=True):
+        """
+        Records a cache hit (the lock must be held by the caller).
+
+        :param value: The cached value
+        :param copy_result: Whether to return a copy of the cached value
+        :return: The cached value (or a copy of it)
+        """
+        self._hits += 1
+        if not value:
+            self._negative_hits += 1
+            return {}
+        return copy.deepcopy(value) if copy_result else value
+
+    def _load(self, key, now, generation):
+        """
+        Reads the value for the specified key from the backing store and adds it to the in-memory
+        stores (if it has not expired). The value is discarded if a reputation change for any of the hashes
+        in the key was applied while it was being read (the change may have been applied to the backing
+        store after the value was read).
+
+        :param key: The cache key
+        :param now: The current time
+        :param generation: The :attr:`generation` of the cache before the value was read
+        :return: The value or ``_MISSING`` if the key is not stored, has expired or is stale
+        """
+        entry = self._backing_store.get(key)
+        if entry is None:
+            return _MISSING
+        value, _, fetch_time = entry
+        remaining_ttl = fetch_time + (self._store.ttl if value else self._negative_store.ttl) - now
+        if remaining_ttl <= 0:
+            return _MISSING
+        with self._lock:
+            if self._is_stale(key, generation):
+                return _MISSING
+            self._put(key, value, now, remaining_ttl)
+        return value
+
+    def _put(self, key, value, now, ttl=None):
+        """
+        Stores the value and updates the hash index (the lock must be held by the caller).
+
+        :param key: The cache key
+        :param value: The value to store
+        :param now: The current time
+        :param ttl: The number of seconds the value remains valid (defaults to the store TTL)
+        """
+        store, other_store = (self._store, self._negative_store) if value else \
+            (self._negative_store, self._store)
+        other_store.pop(key)
+        evicted_keys = store.put(key, value, now, ttl)
+        if key in store:
+            for hash_pair in key:
+                self._hash_index.setdefault(hash_pair, set()).add(key)
+        else:
+            self._unindex(key)
+        for evicted_key in evicted_keys:
+            self._unindex(evicted_key)
+        self._evictions += len(evicted_keys)
+
+    def _remove(self, key):
+        """
+        Removes the specified key from the cache (the lock must be held by the caller).
+
+        :param key: The cache key
+        """
+        if self._store.pop(key) or self._negative_store.pop(key):
+            self._unindex(key)
+
+    def _unindex(self, key):
+        """
+        Removes the specified key from the hash index (the lock must be held by the caller).
+
+        :param key: The cache key
+        """
+        for hash_pair in key:
+            keys = self._hash_index.get(hash_pair)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._hash_index[hash_pair]
+
+
+class SqliteReputationStore(object):
+    """
+    A persistent store of reputations, backed by an SQLite database, that can be attached to a
+    :class:`ReputationCache` so that reputations survive process restarts.
+
+    Each stored entry carries the time it was retrieved from the TIE server and the most recent
+    `creation date` of its reputations. Entries are read lazily, the first time a reputation is not found
+    in the in-process cache. The database uses write-ahead logging so that the same store can be shared
+    by multiple processes on a host.
+
+    The store is bounded: every :attr:`PURGE_INTERVAL` writes, the entries older than ``max_age`` (if
+    specified) are removed, followed by the least recently retrieved entries in excess of ``max_size``.
+    The number of entries can therefore exceed ``max_size`` by up to :attr:`PURGE_INTERVAL`.
+
+    **Example Usage**
+
+        .. code-block:: python
+
+            file_cache = ReputationCache(
+                50000, 3600,
+                backing_store=SqliteReputationStore("/var/cache/tie", "file_reputations"))
+            tie_client = TieClient(client, file_reputation_cache=file_cache)
+    """
+
+    #: The default number of seconds to wait for a database lock held by another process
+    DEFAULT_LOCK_TIMEOUT = 30
+    #: The default maximum number of entries held by the store
+    DEFAULT_MAX_SIZE = 1000000
+    #: The number of writes between purges of the store
+    PURGE_INTERVAL = 1000
+
+    def __init__(self, directory, name="reputations", lock_timeout=DEFAULT_LOCK_TIMEOUT,
+                 max_size=DEFAULT_MAX_SIZE, max_age=None):
+        """
+        Constructor parameters:
+
+        :param directory: The directory containing the database file (created if it does not exist)
+        :param name: The name of the database file, without extension (defaults to ``reputations``).
+            Use a distinct name for each cache (for example, one for files and one for certificates).
+        :param lock_timeout: The number of seconds to wait for a database lock held by another process
+            (defaults to ``30``)
+        :param max_size: The maximum number of entries to hold (defaults to ``1000000``)
+        :param max_age: The maximum age (in seconds, measured from the time the reputations were retrieved)
+            of the entries to hold (optional, by default entries are only removed when the store is full)
+        """
+        if max_size < 1:
+            raise ValueError("Maximum size must be greater than 0")
+        if max_age is not None and max_age <= 0:
+            raise ValueError("Maximum age must be greater than 0")
+        self._max_size = max_size
+        self._max_age = max_age
+        # The number of writes since the last purge
+        self._writes = 0
+        try:
+            os.makedirs(directory)
+        except OSError as ex:
+            if ex.errno != errno.EEXIST:
+                raise
+        self._path = os.path.join(directory, name + ".db")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self._path, timeout=lock_timeout,
+                                     check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS reputations ("
+            "key TEXT PRIMARY KEY, reputations TEXT NOT NULL, "
+            "create_date INTEGER, fetch_time REAL NOT NULL)")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS reputations_fetch_time ON reputations (fetch_time)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS reputation_hashes ("
+            "hash TEXT NOT NULL, key TEXT NOT NULL, PRIMARY KEY (hash, key))")
+
+    @property
+    def path(self):
+        """
+        The path of the database file
+        """
+        return self._path
+
+    @staticmethod
+    def _encode_key(key):
+        """
+        Converts a cache key to its stored form
+        :param key: The cache key
+        :return: The stored form of the key
+        """
+        return ",".join(sorted(SqliteReputationStore._encode_hash(hash_pair) for hash_pair in key))
+
+    @staticmethod
+    def _decode_key(stored_key):
+        """
+        Converts the stored form of a key to a cache key
+        :param stored_key: The stored form of the key
+        :return: The cache key
+        """
+        return frozenset(tuple(hash_value.split(":", 1)) for hash_value in stored_key.split(","))
+
+    @staticmethod
+    def _encode_hash(hash_pair):
+        """
+        Converts a (hash type, hash value) pair to its stored form
+        :param hash_pair: The (hash type, hash value) pair
+        :return: The stored form of the pair
+        """
+        return hash_pair[0] + ":" + hash_pair[1]
+
+    def get(self, key):
+        """
+        Returns the stored entry for the specified key.
+
+        :param key: The cache key (see :func:`ReputationCache.make_key`)
+        :return: A tuple containing the reputations ``dict`` (dictionary), the most recent creation date of
+            the reputations and the time the reputations were retrieved (or ``None`` if the key is not stored)
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT reputations, create_date, fetch_time FROM reputations WHERE key = ?",
+                (self._encode_key(key),)).fetchone()
+        if row is None:
+            return None
+        # JSON object keys are always strings, restore the numeric provider identifiers
+        reputations = dict((int(provider_id) if provider_id.isdigit() else provider_id, reputation)
+                           for provider_id, reputation in json.loads(row[0]).items())
+        return reputations, row[1], row[2]
+
+    def put(self, key, reputations, fetch_time):
+        """
+        Stores the reputations for the specified key.
+
+        :param key: The cache key (see :func:`ReputationCache.make_key`)
+        :param reputations: The reputations ``dict`` (dictionary)
+        :param fetch_time: The time the reputations were retrieved
+        """
+        create_dates = [reputation[ReputationProp.CREATE_DATE] for reputation in reputations.values()
+                        if ReputationProp.CREATE_DATE in reputation]
+        stored_key = self._encode_key(key)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO reputations VALUES (?, ?, ?, ?)",
+                    (stored_key, json.dumps(reputations),
+                     max(create_dates) if create_dates else None, fetch_time))
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO reputation_hashes VALUES (?, ?)",
+                    [(self._encode_hash(hash_pair), stored_key) for hash_pair in key])
+                self._writes += 1
+                if self._writes >= self.PURGE_INTERVAL:
+                    self._writes = 0
+                    self._purge(self._max_age)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def delete(self, keys):
+        """
+        Removes the entries for the specified keys.
+
+        :param keys: The cache keys (see :func:`ReputationCache.make_key`)
+        """
+        stored_keys = [(self._encode_key(key),) for key in keys]
+        if not stored_keys:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany("DELETE FROM reputations WHERE key = ?", stored_keys)
+                self._conn.executemany("DELETE FROM reputation_hashes WHERE key = ?", stored_keys)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def find(self, key):
+        """
+        Returns the stored keys that share at least one hash with the specified key.
+
+        :param key: The cache key (see :func:`ReputationCache.make_key`)
+        :return: A ``set`` of cache keys
+        """
+        hash_values = [self._encode_hash(hash_pair) for hash_pair in key]
+        if not hash_values:
+            return set()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT DISTINCT key FROM reputation_hashes WHERE hash IN (" +
+                ",".join("?" * len(hash_values)) + ")", hash_values).fetchall()
+        return set(self._decode_key(row[0]) for row in rows)
+
+    def purge(self, max_age):
+        """
+        Removes the entries that were retrieved more than the specified number of seconds ago.
+
+        :param max_age: The maximum age (in seconds) of the entries to keep
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._purge(max_age)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _purge(self, max_age):
+        """
+        Removes the entries that were retrieved more than the specified number of seconds ago, followed by
+        the least recently retrieved entries in excess of the maximum size (the lock must be held, and a
+        transaction started, by the caller).
+
+        :param max_age: The maximum age (in seconds) of the entries to keep (``None`` to keep entries
+            regardless of their age)
+        """
+        if max_age is not None:
+            min_fetch_time = time.time() - max_age
+            self._conn.execute(
+                "DELETE FROM reputation_hashes WHERE key IN "
+                "(SELECT key FROM reputations WHERE fetch_time < ?)", (min_fetch_time,))
+            self._conn.execute("DELETE FROM reputations WHERE fetch_time < ?", (min_fetch_time,))
+        excess = self._conn.execute("SELECT COUNT(*) FROM reputations").fetchone()[0] - self._max_size
+        if excess > 0:
+            oldest_keys = "(SELECT key FROM reputations ORDER BY fetch_time LIMIT ?)"
+            self._conn.execute("DELETE FROM reputation_hashes WHERE key IN " + oldest_keys, (excess,))
+            self._conn.execute("DELETE FROM reputations WHERE key IN " + oldest_keys, (excess,))
+
+    def close(self):
+        """
+        Closes the database.
+        """
+        with self._lock:
+            self._conn.close()
@@ -5,14 +5,167 @@
 
 from __future__ import absolute_import
 
-from dxlbootstrap.util import MessageUtils
+import collections
+import logging
+import struct
+import tempfile
+import threading
+
 from dxlclient.callbacks import EventCallback
 from dxltieclient import TieClient
+from .codec import get_default_codec
+from .dedupe import EventDeduplicator
+from .hashes import LazyHashes
 from .constants import RepChangeEventProp, FileRepChangeEventProp, CertRepChangeEventProp, \
-    DetectionEventProp, FirstInstanceEventProp
+    DetectionEventProp, FirstInstanceEventProp, ReputationProp, OverflowPolicy
+
+logger = logging.getLogger(__name__)
 
 
-class ReputationChangeCallback(EventCallback):
+class _TieEventCallback(EventCallback):
+    """
+    Base class for the callbacks that receive events from the TIE server. Decodes the JSON payloads of the
+    events using a pluggable codec (see :class:`dxltieclient.codec.JsonCodec`), and discards the events that
+    do not match the filters of the callback (see :class:`dxltieclient.filters.EventFilter`).
+    """
+
+    # The JSON codec used to decode event payloads (None to use the default codec)
+    _codec = None
+    # The filters that events must match to be delivered
+    _filters = ()
+    # Whether hashes are converted when first accessed
+    _lazy_hashes = False
+    # The deduplicator used to discard duplicate events (None to deliver all events)
+    _deduplicator = None
+
+    def __init__(self, codec=None, filters=None, lazy_hashes=False, deduplicator=None):
+        """
+        Constructor parameters:
+
+        :param codec: The JSON codec used to decode the event payloads (optional). If not specified, the
+            codec returned by :func:`dxltieclient.codec.get_default_codec` is used.
+        :param filters: An iterable of :class:`dxltieclient.filters.EventFilter` that events must all match
+            to be delivered (optional). Events are filtered before they are transformed.
+        :param lazy_hashes: Whether the hashes of events are provided as
+            :class:`dxltieclient.hashes.LazyHashes` objects, which are only converted to their `hex`
+            representation when first accessed (defaults to ``False``). A
+            :class:`dxltieclient.hashes.LazyHashes` is not a ``dict``, so events containing them can not be
+            serialized directly (for example, via ``json.dumps``); use ``dict(hashes)`` or
+            :func:`dxltieclient.hashes.LazyHashes.to_dict` first. Certificate `public key` SHA-1 values
+            (``publicKeySha1``) are single values, and are always converted when the event is received.
+        :param deduplicator: The :class:`dxltieclient.dedupe.EventDeduplicator` used to discard duplicate
+            events before they are decoded (optional, reputation change and first instance events only)
+        """
+        super(_TieEventCallback, self).__init__()
+        self._codec = codec
+        self._filters = tuple(filters or ())
+        self._lazy_hashes = lazy_hashes
+        self._deduplicator = deduplicator
+
+    @property
+    def codec(self):
+        """
+        The JSON codec used to decode the event payloads (see :class:`dxltieclient.codec.JsonCodec`)
+        """
+        return self._codec or get_default_codec()
+
+    @codec.setter
+    def codec(self, codec):
+        self._codec = codec
+
+    @property
+    def filters(self):
+        """
+        The ``tuple`` of :class:`dxltieclient.filters.EventFilter` that events must all match to be delivered
+        """
+        return self._filters
+
+    @filters.setter
+    def filters(self, filters):
+        self._filters = tuple(filters or ())
+
+    @property
+    def lazy_hashes(self):
+        """
+        Whether the hashes of events are provided as :class:`dxltieclient.hashes.LazyHashes` objects, which
+        are only converted to their `hex` representation when first accessed
+        """
+        return self._lazy_hashes
+
+    @lazy_hashes.setter
+    def lazy_hashes(self, lazy_hashes):
+        self._lazy_hashes = lazy_hashes
+
+    @property
+    def deduplicator(self):
+        """
+        The :class:`dxltieclient.dedupe.EventDeduplicator` used to discard duplicate events (``None`` if
+        all events are delivered)
+        """
+        return self._deduplicator
+
+    @deduplicator.setter
+    def deduplicator(self, deduplicator):
+        self._deduplicator = deduplicator
+
+    def _make_dedupe_key(self, payload):
+        """
+        Returns the identity of the event with the specified raw payload, used to discard duplicate events
+        :param payload: The payload of the DXL event
+        :return: The identity of the event (``None`` if events of this type are not deduplicated)
+        """
+        return None
+
+    def _is_duplicate(self, payload):
+        """
+        Returns whether the event with the specified raw payload is a duplicate of an event that was
+        recently received
+        :param payload: The payload of the DXL event
+        :return: Whether the event is a duplicate
+        """
+        key = self._make_dedupe_key(payload)
+        return key is not None and self._deduplicator.is_duplicate(key)
+
+    def _transform_hashes(self, hashes):
+        """
+        Transforms the specified list of hashes in standard TIE format to a simplified form (lazily, if
+        applicable)
+        :param hashes: The list of hashes in standard TIE format
+        :return: The hashes in a simplified form (``dict`` or :class:`dxltieclient.hashes.LazyHashes`)
+        """
+        if self._lazy_hashes:
+            return LazyHashes(hashes)
+        return TieClient._transform_hashes(hashes)
+
+    def _accepts_payload(self, payload):
+        """
+        Returns whether the event with the specified raw payload may match the filters of the callback
+        :param payload: The payload of the DXL event
+        :return: ``False`` if the event does not match the filters, ``True`` if it may match
+        """
+        return all(event_filter.matches_payload(payload) for event_filter in self._filters)
+
+    def _decode_payload(self, payload, check_payload=True):
+        """
+        Decodes the specified JSON event payload, unless the event does not match the filters of the callback
+        :param payload: The payload of the DXL event
+        :param check_payload: Whether to check the raw payload against the filters (``False`` if this has
+            already been done)
+        :return: The decoded payload dictionary (``None`` if the event does not match the filters or is
+            a duplicate)
+        """
+        filters = self._filters
+        if filters and check_payload and not self._accepts_payload(payload):
+            return None
+        if self._deduplicator is not None and self._is_duplicate(payload):
+            return None
+        event_dict = (self._codec or get_default_codec()).loads(payload)
+        if filters and not all(event_filter.matches(event_dict) for event_filter in filters):
+            return None
+        return event_dict
+
+
+class ReputationChangeCallback(_TieEventCallback):
     """
     Concrete instances of this class are used to receive "reputation change" events from the TIE
     server when the `reputation` of files or certificates change.
@@ -29,6 +182,15 @@ class ReputationChangeCallback(EventCallback):
             For certificates:
                 :func:`dxltieclient.client.TieClient.add_certificate_reputation_change_callback`
 
+    The constructor accepts optional ``codec`` and ``filters`` parameters. The ``filters`` (see
+    :class:`dxltieclient.filters.EventFilter`) are evaluated before events are transformed, so that
+    events which do not match them are discarded cheaply, without invoking :func:`on_reputation_change`.
+    With ``lazy_hashes=True``, hashes are provided as :class:`dxltieclient.hashes.LazyHashes` objects
+    which are only converted when first accessed (they are not ``dict`` objects, so they must be converted
+    before the event is serialized as JSON). A ``deduplicator`` (see
+    :class:`dxltieclient.dedupe.EventDeduplicator`) discards events that are identical to an event received
+    within its window, without decoding them.
+
     **Example Usage**
 
         .. code-block:: python
@@ -54,6 +216,9 @@ class ReputationChangeCallback(EventCallback):
                 # Register callback with client to receive file reputation change events
                 tie_client.add_file_reputation_change_callback(rep_change_callback)
     """
+    def _make_dedupe_key(self, payload):
+        return EventDeduplicator.make_rep_change_key(payload)
+
     def on_event(self, event):
         """
         Invoked when a DXL event has been received.
@@ -64,26 +229,30 @@ class ReputationChangeCallback(EventCallback):
         :param event: The original DXL event message that was received
         """
         # Decode the event payload
-        rep_change_dict = MessageUtils.json_payload_to_dict(event)
+        rep_change_dict = self._decode_payload(event.payload)
+        if rep_change_dict is None:
+            return
 
         # Transform hashes
         if RepChangeEventProp.HASHES in rep_change_dict:
             rep_change_dict[RepChangeEventProp.HASHES] = \
-                TieClient._transform_hashes(rep_change_dict[RepChangeEventProp.HASHES])
+                self._transform_hashes(rep_change_dict[RepChangeEventProp.HASHES])
 
         # Transform new reputations
         if RepChangeEventProp.NEW_REPUTATIONS in rep_change_dict:
             if "reputations" in rep_change_dict[RepChangeEventProp.NEW_REPUTATIONS]:
                 rep_change_dict[RepChangeEventProp.NEW_REPUTATIONS] = \
                     TieClient._transform_reputations(
-                        rep_change_dict[RepChangeEventProp.NEW_REPUTATIONS]["reputations"])
+                        rep_change_dict[RepChangeEventProp.NEW_REPUTATIONS]["reputations"],
+                        self._transform_hashes)
 
         # Transform old reputations
         if RepChangeEventProp.OLD_REPUTATIONS in rep_change_dict:
             if "reputations" in rep_change_dict[RepChangeEventProp.OLD_REPUTATIONS]:
                 rep_change_dict[RepChangeEventProp.OLD_REPUTATIONS] = \
                     TieClient._transform_reputations(
-                        rep_change_dict[RepChangeEventProp.OLD_REPUTATIONS]["reputations"])
+                        rep_change_dict[RepChangeEventProp.OLD_REPUTATIONS]["reputations"],
+                        self._transform_hashes)
 
         # Transform relationships
         if FileRepChangeEventProp.RELATIONSHIPS in rep_change_dict:
@@ -92,7 +261,8 @@ class ReputationChangeCallback(EventCallback):
                 cert_dict = relationships_dict["certificate"]
                 if "hashes" in cert_dict:
                     cert_dict["hashes"] = \
-                        TieClient._transform_hashes(cert_dict["hashes"])
+                        self._transform_hashes(cert_dict["hashes"])
+                # Public key SHA-1 values are converted even if hashes are lazy (they are single values)
                 if "publicKeySha1" in cert_dict:
                     cert_dict["publicKeySha1"] = \
                         TieClient._base64_to_hex(cert_dict["publicKeySha1"])
@@ -250,7 +420,211 @@ class ReputationChangeCallback(EventCallback):
         raise NotImplementedError("Must be implemented in a child class.")
 
 
-class DetectionCallback(EventCallback):
+class ReputationCacheUpdateCallback(ReputationChangeCallback):
+    """
+    A :class:`ReputationChangeCallback` that keeps a :class:`dxltieclient.cache.ReputationCache` consistent
+    with the reputation changes broadcast by the TIE server.
+
+    When a reputation change event is received, cached entries for the file or certificate are replaced with
+    the new reputations contained in the event (or removed if they can not be replaced). This allows a cache
+    to use a long `time to live` (TTL) without returning stale reputations.
+
+    This callback is typically registered via
+    :func:`dxltieclient.client.TieClient.enable_reputation_cache_updates`, but can also be registered
+    directly:
+
+        For files:
+            :func:`dxltieclient.client.TieClient.add_file_reputation_change_callback`
+        For certificates:
+            :func:`dxltieclient.client.TieClient.add_certificate_reputation_change_callback`
+    """
+    def __init__(self, reputation_cache, codec=None):
+        """
+        Constructor parameters:
+
+        :param reputation_cache: The :class:`dxltieclient.cache.ReputationCache` to update
+        :param codec: The JSON codec used to decode the event payloads (optional)
+        """
+        super(ReputationCacheUpdateCallback, self).__init__(codec)
+        self._reputation_cache = reputation_cache
+
+    @property
+    def reputation_cache(self):
+        """
+        The :class:`dxltieclient.cache.ReputationCache` that is updated by this callback
+        """
+        return self._reputation_cache
+
+    def on_reputation_change(self, rep_change_dict, original_event):
+        """
+        Updates the cache with the details of the reputation change.
+
+        :param rep_change_dict: A Python ``dict`` (dictionary) containing the details of the reputation change
+        :param original_event: The original DXL event message that was received
+        """
+        hashes = dict(rep_change_dict.get(RepChangeEventProp.HASHES, {}))
+        if CertRepChangeEventProp.PUBLIC_KEY_SHA1 in rep_change_dict:
+            hashes[CertRepChangeEventProp.PUBLIC_KEY_SHA1] = \
+                rep_change_dict[CertRepChangeEventProp.PUBLIC_KEY_SHA1]
+        if not hashes:
+            return
+
+        # Only replace cached entries if the event contains (transformed) reputations
+        new_reputations = rep_change_dict.get(RepChangeEventProp.NEW_REPUTATIONS)
+        if not new_reputations or not all(ReputationProp.PROVIDER_ID in reputation
+                                          for reputation in new_reputations.values()):
+            new_reputations = None
+
+        self._reputation_cache.update(hashes, new_reputations)
+
+
+class BatchingReputationChangeCallback(ReputationChangeCallback):
+    """
+    A :class:`ReputationChangeCallback` that delivers reputation changes in batches rather than one at a
+    time, which allows sinks to perform bulk operations (such as database inserts) during large waves of
+    reputation changes.
+
+    Reputation changes are decoded and transformed as they are received (see
+    :func:`ReputationChangeCallback.on_reputation_change` for the format of each change), and accumulated
+    until either ``max_batch_size`` changes are pending or ``max_wait`` seconds have elapsed since the first
+    pending change was received. The pending changes are then delivered as a ``list`` to
+    :func:`on_reputation_changes`.
+
+    Batches are delivered one at a time, in the order the changes were received. A batch that reaches
+    ``max_batch_size`` is delivered on the thread that received the last change (so slow delivery slows the
+    receipt of further events), while a batch that reaches ``max_wait`` is delivered on a timer thread.
+    Exceptions raised while delivering a batch on the timer thread are logged.
+
+    The :func:`close` method should be invoked when the callback is no longer registered, to deliver any
+    pending changes.
+
+    **Example Usage**
+
+        .. code-block:: python
+
+            class MyBatchingReputationChangeCallback(BatchingReputationChangeCallback):
+                def on_reputation_changes(self, batch):
+                    # Insert the reputation changes into a database (single write)
+                    database.insert_many(batch)
+
+            rep_change_callback = MyBatchingReputationChangeCallback(max_batch_size=500, max_wait=0.5)
+
+            # Register callback with client to receive file reputation change events
+            tie_client.add_file_reputation_change_callback(rep_change_callback)
+
+            ...
+
+            tie_client.remove_file_reputation_change_callback(rep_change_callback)
+            rep_change_callback.close()
+    """
+    def __init__(self, max_batch_size=100, max_wait=1.0, codec=None, filters=None, lazy_hashes=False,
+                 deduplicator=None):
+        """
+        Constructor parameters:
+
+        :param max_batch_size: The maximum number of reputation changes delivered in a single batch
+        :param max_wait: The maximum time (in seconds) a reputation change is held before it is delivered
+        :param codec: The JSON codec used to decode the event payloads (optional)
+        :param filters: An iterable of :class:`dxltieclient.filters.EventFilter` that events must all match
+            to be delivered (optional)
+        :param lazy_hashes: Whether the hashes of events are provided as
+            :class:`dxltieclient.hashes.LazyHashes` objects, which are not ``dict`` objects (and can not be
+            serialized directly as JSON) (defaults to ``False``)
+        :param deduplicator: The :class:`dxltieclient.dedupe.EventDeduplicator` used to discard duplicate
+            events (optional)
+        """
+        if max_batch_size < 1:
+            raise ValueError("Maximum batch size must be greater than 0")
+        if max_wait <= 0:
+            raise ValueError("Maximum wait must be greater than 0")
+        super(BatchingReputationChangeCallback, self).__init__(codec, filters, lazy_hashes, deduplicator)
+        self._max_batch_size = max_batch_size
+        self._max_wait = max_wait
+        self._lock = threading.Lock()
+        # Held while a batch is delivered (ensures batches are delivered one at a time, in order)
+        self._delivery_lock = threading.Lock()
+        self._batch = []
+        self._timer = None
+
+    @property
+    def max_batch_size(self):
+        """
+        The maximum number of reputation changes delivered in a single batch
+        """
+        return self._max_batch_size
+
+    @property
+    def max_wait(self):
+        """
+        The maximum time (in seconds) a reputation change is held before it is delivered
+        """
+        return self._max_wait
+
+    def on_reputation_change(self, rep_change_dict, original_event):
+        """
+        Adds the reputation change to the pending batch (delivering the batch if it is full).
+
+        NOTE: This method should not be overridden. Instead, the :func:`on_reputation_changes` method must
+        be overridden.
+
+        :param rep_change_dict: A Python ``dict`` (dictionary) containing the details of the reputation change
+        :param original_event: The original DXL event message that was received
+        """
+        with self._lock:
+            self._batch.append(rep_change_dict)
+            full = len(self._batch) >= self._max_batch_size
+            if not full and self._timer is None:
+                self._timer = threading.Timer(self._max_wait, self._flush_on_timer)
+                self._timer.daemon = True
+                self._timer.start()
+        if full:
+            self.flush()
+
+    def on_reputation_changes(self, batch):
+        """
+        NOTE: This method must be overridden by derived classes.
+
+        Invoked with each batch of reputation changes.
+
+        :param batch: A ``list`` containing a Python ``dict`` (dictionary) for each reputation change, in
+            the order the changes were received. See :func:`ReputationChangeCallback.on_reputation_change`
+            for the format of each ``dict`` (dictionary).
+        """
+        raise NotImplementedError("Must be implemented in a child class.")
+
+    def flush(self):
+        """
+        Delivers the pending reputation changes (if any) to :func:`on_reputation_changes` immediately
+        """
+        with self._delivery_lock:
+            with self._lock:
+                batch = self._batch
+                self._batch = []
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+            if batch:
+                self.on_reputation_changes(batch)
+
+    def close(self):
+        """
+        Delivers the pending reputation changes (if any). Should be invoked once the callback has been
+        unregistered.
+        """
+        self.flush()
+
+    def _flush_on_timer(self):
+        """
+        Delivers the pending reputation changes once the maximum wait has elapsed (invoked on the timer
+        thread)
+        """
+        try:
+            self.flush()
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Error delivering batch of reputation changes")
+
+
+class DetectionCallback(_TieEventCallback):
     """
     Concrete instances of this class are used to receive "detection" events from the DXL fabric
 
@@ -264,6 +638,13 @@ class DetectionCallback(EventCallback):
             For files:
                 :func:`dxltieclient.client.TieClient.add_file_detection_callback`
 
+    The constructor accepts optional ``codec`` and ``filters`` parameters. The ``filters`` (see
+    :class:`dxltieclient.filters.EventFilter`) are evaluated before events are transformed, so that
+    events which do not match them are discarded cheaply, without invoking :func:`on_detection`.
+    With ``lazy_hashes=True``, hashes are provided as :class:`dxltieclient.hashes.LazyHashes` objects
+    which are only converted when first accessed (they are not ``dict`` objects, so they must be converted
+    before the event is serialized as JSON).
+
     **Example Usage**
 
         .. code-block:: python
@@ -298,16 +679,30 @@ class DetectionCallback(EventCallback):
 
         :param event: The original DXL event message that was received
         """
+        # Invoke the detection method
+        detection_dict = self._create_detection_dict(event.payload)
+        if detection_dict is not None:
+            self.on_detection(detection_dict, event)
+
+    def _create_detection_dict(self, payload, check_payload=True):
+        """
+        Decodes and transforms the specified detection event payload
+        :param payload: The payload of the detection event
+        :param check_payload: Whether to check the raw payload against the filters (``False`` if this has
+            already been done)
+        :return: The detection ``dict`` (dictionary) (``None`` if the event does not match the filters)
+        """
         # Decode the event payload
-        detection_dict = MessageUtils.json_payload_to_dict(event)
+        detection_dict = self._decode_payload(payload, check_payload)
+        if detection_dict is None:
+            return None
 
         # Transform hashes
         if DetectionEventProp.HASHES in detection_dict:
             detection_dict[RepChangeEventProp.HASHES] = \
-                TieClient._transform_hashes(detection_dict[DetectionEventProp.HASHES])
+                self._transform_hashes(detection_dict[DetectionEventProp.HASHES])
 
-        # Invoke the detection method
-        self.on_detection(detection_dict, event)
+        return detection_dict
 
     def on_detection(self, detection_dict, original_event):
         """
@@ -355,7 +750,301 @@ class DetectionCallback(EventCallback):
         raise NotImplementedError("Must be implemented in a child class.")
 
 
-class FirstInstanceCallback(EventCallback):
+class _SpillFile(object):
+    """
+    Temporary file holding a first-in, first-out sequence of event payloads (used when a queue overflows
+    to disk). The file is deleted when it is closed.
+    """
+
+    # The format of the length that precedes each payload
+    _LENGTH = struct.Struct(">I")
+
+    def __init__(self, directory=None):
+        """
+        Constructor parameters:
+
+        :param directory: The directory in which the file is created (optional, defaults to the system
+            temporary directory)
+        """
+        self._file = tempfile.TemporaryFile(prefix="dxltieclient-spill-", dir=directory)
+        self._read_offset = 0
+        self._write_offset = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def append(self, payload):
+        """
+        Appends the specified payload to the file
+        :param payload: The payload (``bytes`` or ``str``)
+        """
+        if not isinstance(payload, (bytes, bytearray, memoryview)):
+            payload = payload.encode("utf-8")
+        self._file.seek(self._write_offset)
+        self._file.write(self._LENGTH.pack(len(payload)))
+        self._file.write(payload)
+        self._write_offset = self._file.tell()
+        self._count += 1
+
+    def pop(self):
+        """
+        Removes and returns the oldest payload in the file
+        :return: The payload (``bytes``)
+        """
+        self._file.seek(self._read_offset)
+        length = self._LENGTH.unpack(self._file.read(self._LENGTH.size))[0]
+        payload = self._file.read(length)
+        self._read_offset = self._file.tell()
+        self._count -= 1
+        if not self._count:
+            # Reclaim the disk space once all payloads have been read
+            self._file.seek(0)
+            self._file.truncate()
+            self._read_offset = self._write_offset = 0
+        return payload
+
+    def close(self):
+        """
+        Closes (and deletes) the file
+        """
+        self._file.close()
+
+
+class QueuedDetectionCallback(DetectionCallback):
+    """
+    A :class:`DetectionCallback` that queues detection events and delivers them in batches from a
+    dedicated pool of worker threads, so that a slow handler does not stall the DXL client threads that
+    deliver incoming messages (and therefore every other callback registered with the client).
+
+    Received events are added to a bounded queue. They are decoded and transformed on the worker threads
+    (see :func:`DetectionCallback.on_detection` for the format of each detection) and delivered as a
+    ``list`` to :func:`on_detections`. Each worker takes all of the queued events (up to ``max_batch_size``)
+    when it becomes idle, so batches grow with the event rate. When multiple workers are used, batches may
+    be delivered concurrently (and out of order).
+
+    The handling of events that are received while the queue is full is determined by the
+    `overflow policy`. The list of `overflow policies` can be found in the
+    :class:`dxltieclient.constants.OverflowPolicy` constants class. With ``OverflowPolicy.SPILL``, events are
+    written to a temporary file (whose size is not bounded) until the queue has drained.
+
+    The :attr:`queue_depth`, :attr:`dropped_count` and :attr:`spilled_count` properties can be used to
+    monitor the callback. Exceptions raised by :func:`on_detections`, and events that can not be decoded,
+    are logged.
+
+    The :func:`close` method must be invoked when the callback is no longer registered, to deliver the
+    queued events and stop the worker threads.
+
+    **Example Usage**
+
+        .. code-block:: python
+
+            class MyQueuedDetectionCallback(QueuedDetectionCallback):
+                def on_detections(self, batch):
+                    # Insert the detections into a database (single write)
+                    database.insert_many(batch)
+
+            detection_callback = MyQueuedDetectionCallback(
+                max_queue_size=50000, overflow_policy=OverflowPolicy.DROP_OLDEST, worker_count=2)
+
+            # Register detection callback with the client
+            tie_client.add_file_detection_callback(detection_callback)
+
+            ...
+
+            tie_client.remove_file_detection_callback(detection_callback)
+            detection_callback.close()
+    """
+    def __init__(self, max_queue_size=10000, overflow_policy=OverflowPolicy.BLOCK, worker_count=1,
+                 max_batch_size=100, spill_directory=None, codec=None, filters=None, lazy_hashes=False):
+        """
+        Constructor parameters:
+
+        :param max_queue_size: The maximum number of events held in memory awaiting delivery
+        :param overflow_policy: The handling of events received while the queue is full. The list of
+            `overflow policies` can be found in the :class:`dxltieclient.constants.OverflowPolicy` constants
+            class (defaults to ``OverflowPolicy.BLOCK``).
+        :param worker_count: The number of worker threads delivering batches
+        :param max_batch_size: The maximum number of detections delivered in a single batch
+        :param spill_directory: The directory in which the spill file is created when the overflow policy
+            is ``OverflowPolicy.SPILL`` (optional, defaults to the system temporary directory)
+        :param codec: The JSON codec used to decode the event payloads (optional)
+        :param filters: An iterable of :class:`dxltieclient.filters.EventFilter` that events must all match
+            to be delivered (optional). The raw payloads are checked before events are queued.
+        :param lazy_hashes: Whether the hashes of events are provided as
+            :class:`dxltieclient.hashes.LazyHashes` objects, which are not ``dict`` objects (and can not be
+            serialized directly as JSON) (defaults to ``False``)
+        """
+        if max_queue_size < 1:
+            raise ValueError("Maximum queue size must be greater than 0")
+        if not TieClient.valid_parameter(OverflowPolicy, overflow_policy):
+            raise ValueError("OverflowPolicy was not a valid entry")
+        if worker_count < 1:
+            raise ValueError("Worker count must be greater than 0")
+        if max_batch_size < 1:
+            raise ValueError("Maximum batch size must be greater than 0")
+        super(QueuedDetectionCallback, self).__init__(codec, filters, lazy_hashes)
+        self._max_queue_size = max_queue_size
+        self._overflow_policy = overflow_policy
+        self._max_batch_size = max_batch_size
+        self._condition = threading.Condition()
+        self._queue = collections.deque()
+        self._spill_file = _SpillFile(spill_directory) if overflow_policy == OverflowPolicy.SPILL else None
+        self._dropped_count = 0
+        self._spilled_count = 0
+        self._closed = False
+        self._workers = []
+        for index in range(worker_count):
+            worker = threading.Thread(target=self._run_worker,
+                                      name="QueuedDetectionCallback-" + str(index + 1))
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+
+    @property
+    def overflow_policy(self):
+        """
+        The handling of events received while the queue is full (see
+        :class:`dxltieclient.constants.OverflowPolicy`)
+        """
+        return self._overflow_policy
+
+    @property
+    def queue_depth(self):
+        """
+        The number of events awaiting delivery (including events spilled to disk)
+        """
+        with self._condition:
+            return len(self._queue) + self._spilled_depth()
+
+    @property
+    def dropped_count(self):
+        """
+        The number of events that have been discarded (because the queue was full or the callback was
+        closed)
+        """
+        return self._dropped_count
+
+    @property
+    def spilled_count(self):
+        """
+        The number of events that have been written to disk
+        """
+        return self._spilled_count
+
+    def on_event(self, event):
+        """
+        Invoked when a DXL event has been received. Queues the event for delivery by the worker threads.
+
+        NOTE: This method should not be overridden. Instead, the :func:`on_detections` method must be
+        overridden.
+
+        :param event: The original DXL event message that was received
+        """
+        payload = event.payload
+        if self._filters and not self._accepts_payload(payload):
+            return
+        with self._condition:
+            if self._closed:
+                self._dropped_count += 1
+                return
+            if self._spilled_depth():
+                # Preserve the order of events once some have been spilled
+                self._spill_file.append(payload)
+                self._spilled_count += 1
+                self._condition.notify()
+                return
+            while len(self._queue) >= self._max_queue_size:
+                if self._overflow_policy == OverflowPolicy.DROP_OLDEST:
+                    self._queue.popleft()
+                    self._dropped_count += 1
+                elif self._overflow_policy == OverflowPolicy.SPILL:
+                    self._spill_file.append(payload)
+                    self._spilled_count += 1
+                    self._condition.notify()
+                    return
+                else:
+                    self._condition.wait()
+                    if self._closed:
+                        self._dropped_count += 1
+                        return
+            self._queue.append(payload)
+            self._condition.notify()
+
+    def on_detections(self, batch):
+        """
+        NOTE: This method must be overridden by derived classes.
+
+        Invoked (on a worker thread) with each batch of detections.
+
+        :param batch: A ``list`` containing a Python ``dict`` (dictionary) for each detection. See
+            :func:`DetectionCallback.on_detection` for the format of each ``dict`` (dictionary).
+        """
+        raise NotImplementedError("Must be implemented in a child class.")
+
+    def close(self, timeout=None):
+        """
+        Delivers the queued events and stops the worker threads. Events received once the callback has been
+        closed are discarded.
+
+        :param timeout: The maximum time (in seconds) to wait for each worker thread to finish (optional)
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        for worker in self._workers:
+            worker.join(timeout)
+        if self._spill_file is not None and not any(worker.is_alive() for worker in self._workers):
+            self._spill_file.close()
+
+    def _take_batch(self):
+        """
+        Waits for queued events and removes a batch of them from the queue
+        :return: The ``list`` of event payloads (empty once the callback has been closed and drained)
+        """
+        with self._condition:
+            while not self._queue and not self._spilled_depth() and not self._closed:
+                self._condition.wait()
+            batch = []
+            while len(batch) < self._max_batch_size and self._queue:
+                batch.append(self._queue.popleft())
+            while len(batch) < self._max_batch_size and self._spilled_depth():
+                batch.append(self._spill_file.pop())
+            # Wake producers waiting for room (and other workers)
+            self._condition.notify_all()
+            return batch
+
+    def _spilled_depth(self):
+        """
+        Returns the number of events awaiting delivery in the spill file (the condition must be held)
+        :return: The number of spilled events
+        """
+        return len(self._spill_file) if self._spill_file is not None else 0
+
+    def _run_worker(self):
+        """
+        Delivers batches of detections until the callback is closed
+        """
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                return
+            detections = []
+            for payload in batch:
+                try:
+                    detection_dict = self._create_detection_dict(payload, check_payload=False)
+                    if detection_dict is not None:
+                        detections.append(detection_dict)
+                except Exception:  # pylint: disable=broad-except
+                    logger.exception("Error decoding detection event")
+            try:
+                if detections:
+                    self.on_detections(detections)
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Error delivering batch of detections")
+
+
+class FirstInstanceCallback(_TieEventCallback):
     """
     Concrete instances of this class are used to receive "first instance" events from the DXL fabric.
     The "first instance" event indicates that this is the first time the file has been encountered
@@ -371,6 +1060,15 @@ class FirstInstanceCallback(EventCallback):
             For files:
                 :func:`dxltieclient.client.TieClient.add_file_first_instance_callback`
 
+    The constructor accepts optional ``codec`` and ``filters`` parameters. The ``filters`` (see
+    :class:`dxltieclient.filters.EventFilter`) are evaluated before events are transformed, so that
+    events which do not match them are discarded cheaply, without invoking :func:`on_first_instance`.
+    With ``lazy_hashes=True``, hashes are provided as :class:`dxltieclient.hashes.LazyHashes` objects
+    which are only converted when first accessed (they are not ``dict`` objects, so they must be converted
+    before the event is serialized as JSON). A ``deduplicator`` (see
+    :class:`dxltieclient.dedupe.EventDeduplicator`) discards events with the same system GUID and hashes
+    as an event received within its window, without decoding them.
+
     **Example Usage**
 
         .. code-block:: python
@@ -396,6 +1094,9 @@ class FirstInstanceCallback(EventCallback):
                 # Register first instance callback with the client
                 tie_client.add_file_first_instance_callback(first_instance_callback)
     """
+    def _make_dedupe_key(self, payload):
+        return EventDeduplicator.make_first_instance_key(payload)
+
     def on_event(self, event):
         """
         Invoked when a DXL event has been received.
@@ -406,12 +1107,14 @@ class FirstInstanceCallback(EventCallback):
         :param event: The original DXL event message that was received
         """
         # Decode the event payload
-        first_instance_dict = MessageUtils.json_payload_to_dict(event)
+        first_instance_dict = self._decode_payload(event.payload)
+        if first_instance_dict is None:
+            return
 
         # Transform hashes
         if FirstInstanceEventProp.HASHES in first_instance_dict:
             first_instance_dict[RepChangeEventProp.HASHES] = \
-                TieClient._transform_hashes(first_instance_dict[FirstInstanceEventProp.HASHES])
+                self._transform_hashes(first_instance_dict[FirstInstanceEventProp.HASHES])
 
         # Invoke the first instance method
         self.on_first_instance(first_instance_dict, event)
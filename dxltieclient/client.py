@@ -5,16 +5,20 @@
 
 from __future__ import absolute_import
 
-import base64
-import binascii
-import json
+import copy
+from collections import OrderedDict
 
 from dxlbootstrap.client import Client
-from dxlbootstrap.util import MessageUtils
 from dxlclient import Request, Event
 
+from .batch import DEFAULT_MAX_IN_FLIGHT, LookupResult, LookupResults, _RequestDispatcher, _SingleFlight, \
+    completed_future, send_async_request
+from .cache import ReputationCache
+from .codec import _PayloadTemplate, _iter_json_array, get_default_codec
+from .hashes import FileHashes, _base64_to_hex, _bytes_to_base64, _hex_to_base64
+from .reputation import LazyReputationSet, ReputationSet
 from .constants import FileProvider, ReputationProp, CertProvider, CertReputationProp, CertReputationOverriddenProp, \
-    TrustLevel, FileType
+    TrustLevel, FileType, CertRepChangeEventProp, ResultMode, FileEnterpriseAttrib, CertEnterpriseAttrib, HashType
 
 # Topic used to set the reputation of a file
 TIE_SET_FILE_REPUTATION_TOPIC = "/mcafee/service/tie/file/reputation/set"
@@ -47,6 +51,38 @@ TIE_EVENT_FILE_PREVALENCE_CHANGE_TOPIC = "/mcafee/event/tie/file/prevalence"
 # Topic used to notify that a file reputation has changed
 TIE_EVENT_EXTERNAL_FILE_REPORT_TOPIC = "/mcafee/event/external/file/report"
 
+# Precompiled payload of the request to retrieve the reputations of a file. The scan type is 3 (On Demand
+# Scan) to identify the request as not coming from an endpoint.
+_FILE_REPUTATION_PAYLOAD = _PayloadTemplate({"scanType": 3}, ["hashes"])
+# Precompiled payload of the request to retrieve the systems that have referenced a file
+_FILE_FIRST_REFS_PAYLOAD = _PayloadTemplate({}, ["queryLimit", "hashes"])
+# Precompiled payload of the request to set the "Enterprise" reputation of a file
+_SET_FILE_REPUTATION_PAYLOAD = _PayloadTemplate(
+    {"providerId": FileProvider.ENTERPRISE}, ["trustLevel", "filename", "comment", "hashes"])
+
+# The start of the encoded entry for each hash type in the hashes list of a request payload
+_HASH_PAYLOAD_PREFIXES = {
+    hash_type: ('{"type":"' + hash_type + '","value":"').encode("ascii")
+    for hash_type in (HashType.MD5, HashType.SHA1, HashType.SHA256)
+}
+
+# The attributes exported as columns by default for batch file reputation lookups
+FILE_COLUMN_ATTRIBUTES = {
+    FileProvider.ENTERPRISE: [
+        ("prevalence", FileEnterpriseAttrib.PREVALENCE),
+        ("first_contact", FileEnterpriseAttrib.FIRST_CONTACT),
+        ("detection_count", FileEnterpriseAttrib.DETECTION_COUNT)
+    ]
+}
+
+# The attributes exported as columns by default for batch certificate reputation lookups
+CERT_COLUMN_ATTRIBUTES = {
+    CertProvider.ENTERPRISE: [
+        ("prevalence", CertEnterpriseAttrib.PREVALENCE),
+        ("first_contact", CertEnterpriseAttrib.FIRST_CONTACT)
+    ]
+}
+
 
 class TieClient(Client):
     """
@@ -58,15 +94,176 @@ class TieClient(Client):
     TIE-specific DXL topics and message formats.
     """
 
-    def __init__(self, dxl_client):
+    # The memo table shared by the hash conversions (None if conversions are not memoized)
+    _hash_memo = None
+
+    def __init__(self, dxl_client, file_reputation_cache=None, cert_reputation_cache=None,
+                 result_mode=ResultMode.DICT, codec=None):
         """
         Constructor parameters:
 
         :param dxl_client: The DXL client to use for communication with the TIE DXL service
+        :param file_reputation_cache: An optional :class:`dxltieclient.cache.ReputationCache` used to
+            hold the results of :func:`get_file_reputation`
+        :param cert_reputation_cache: An optional :class:`dxltieclient.cache.ReputationCache` used to
+            hold the results of :func:`get_certificate_reputation`
+        :param result_mode: The form of the reputations returned by the reputation lookup methods. The
+            list of `result modes` can be found in the :class:`dxltieclient.constants.ResultMode`
+            constants class (defaults to ``ResultMode.DICT``).
+        :param codec: The JSON codec used to encode requests and decode responses (optional). See
+            :class:`dxltieclient.codec.JsonCodec`. If not specified, the codec returned by
+            :func:`dxltieclient.codec.get_default_codec` is used.
         """
         self.__dxl_client = dxl_client
+        self._file_reputation_cache = file_reputation_cache
+        self._cert_reputation_cache = cert_reputation_cache
+        self._result_mode = None
+        self.result_mode = result_mode
+        self._codec = codec
+        self._cache_update_callbacks = {}
+        self._cache_updates_enabled = False
+        self._file_reputation_requests = _SingleFlight()
+        self._cert_reputation_requests = _SingleFlight()
         super(TieClient, self).__init__(dxl_client)
 
+    @property
+    def file_reputation_cache(self):
+        """
+        The :class:`dxltieclient.cache.ReputationCache` used to hold the results of
+        :func:`get_file_reputation` (``None`` if file reputations are not cached)
+        """
+        return self._file_reputation_cache
+
+    @file_reputation_cache.setter
+    def file_reputation_cache(self, file_reputation_cache):
+        self._file_reputation_cache = file_reputation_cache
+        if self._cache_updates_enabled:
+            self._register_cache_update_callbacks()
+
+    @property
+    def cert_reputation_cache(self):
+        """
+        The :class:`dxltieclient.cache.ReputationCache` used to hold the results of
+        :func:`get_certificate_reputation` (``None`` if certificate reputations are not cached)
+        """
+        return self._cert_reputation_cache
+
+    @cert_reputation_cache.setter
+    def cert_reputation_cache(self, cert_reputation_cache):
+        self._cert_reputation_cache = cert_reputation_cache
+        if self._cache_updates_enabled:
+            self._register_cache_update_callbacks()
+
+    @property
+    def result_mode(self):
+        """
+        The form of the reputations returned by the reputation lookup methods (:func:`get_file_reputation`,
+        :func:`get_certificate_reputation`, their batch and asynchronous variants). The list of
+        `result modes` can be found in the :class:`dxltieclient.constants.ResultMode` constants class.
+
+        With ``ResultMode.OBJECT``, each lookup returns a :class:`dxltieclient.reputation.ReputationSet`
+        which can be converted back to the ``dict`` (dictionary) form via its ``to_dict`` method.
+
+        With ``ResultMode.LAZY``, each lookup returns a :class:`dxltieclient.reputation.LazyReputationSet`
+        which keeps the raw response payload and only decodes it (and each of its reputations) when
+        accessed. If a reputation cache is in use, the reputations are parsed for the cache and a
+        :class:`dxltieclient.reputation.ReputationSet` is returned instead.
+        """
+        return self._result_mode
+
+    @result_mode.setter
+    def result_mode(self, result_mode):
+        if not self.valid_parameter(ResultMode, result_mode):
+            raise ValueError("ResultMode was not a valid entry")
+        self._result_mode = result_mode
+
+    @property
+    def codec(self):
+        """
+        The JSON codec used to encode requests and decode responses (see
+        :class:`dxltieclient.codec.JsonCodec`). Defaults to the codec returned by
+        :func:`dxltieclient.codec.get_default_codec`, which uses `orjson` or `ujson` when installed.
+        """
+        return self._codec or get_default_codec()
+
+    @codec.setter
+    def codec(self, codec):
+        self._codec = codec
+
+    @staticmethod
+    def set_hash_memo(hash_memo):
+        """
+        Sets the :class:`dxltieclient.hashes.HashMemo` used to memoize the conversions of hash values
+        between their `hex` and `base64` representations. The memo is shared by all
+        :class:`TieClient` instances and event callbacks in the process.
+
+        :param hash_memo: The :class:`dxltieclient.hashes.HashMemo` to use (``None`` to disable
+            memoization)
+        """
+        TieClient._hash_memo = hash_memo
+
+    @staticmethod
+    def get_hash_memo():
+        """
+        Returns the :class:`dxltieclient.hashes.HashMemo` used to memoize hash conversions (``None``
+        if conversions are not memoized). See :func:`set_hash_memo`.
+
+        :return: The :class:`dxltieclient.hashes.HashMemo`
+        """
+        return TieClient._hash_memo
+
+    def enable_reputation_cache_updates(self):
+        """
+        Registers a :class:`dxltieclient.callbacks.ReputationCacheUpdateCallback` for each reputation cache
+        attached to the client. The caches are then updated as reputation change events are broadcast by the
+        TIE server, which allows them to use long `time to live` (TTL) values without returning stale
+        reputations.
+
+        .. note::
+
+            The client must have permission to receive messages on the
+            ``/mcafee/event/tie/file/repchange/broadcast`` and ``/mcafee/event/tie/cert/repchange/broadcast``
+            topics.
+
+        Caches that are attached to the client afterwards (via :attr:`file_reputation_cache` and
+        :attr:`cert_reputation_cache`) are also updated, until :func:`disable_reputation_cache_updates` is
+        invoked.
+        """
+        self._cache_updates_enabled = True
+        self._register_cache_update_callbacks()
+
+    def disable_reputation_cache_updates(self):
+        """
+        Unregisters the callbacks that were registered via :func:`enable_reputation_cache_updates`.
+        """
+        self._cache_updates_enabled = False
+        for topic, callback in list(self._cache_update_callbacks.items()):
+            self.__dxl_client.remove_event_callback(topic, callback)
+            del self._cache_update_callbacks[topic]
+
+    def _register_cache_update_callbacks(self):
+        """
+        Registers a :class:`dxltieclient.callbacks.ReputationCacheUpdateCallback` for each reputation cache
+        currently attached to the client, replacing the callbacks registered for caches that are no longer
+        attached
+        """
+        from .callbacks import ReputationCacheUpdateCallback
+        caches = {
+            TIE_EVENT_FILE_REPUTATION_CHANGE_TOPIC: self._file_reputation_cache,
+            TIE_EVENT_CERT_REPUTATION_CHANGE_TOPIC: self._cert_reputation_cache
+        }
+        for topic, cache in caches.items():
+            callback = self._cache_update_callbacks.get(topic)
+            if callback is not None:
+                if callback.reputation_cache is cache:
+                    continue
+                self.__dxl_client.remove_event_callback(topic, callback)
+                del self._cache_update_callbacks[topic]
+            if cache is not None:
+                callback = ReputationCacheUpdateCallback(cache)
+                self.__dxl_client.add_event_callback(topic, callback)
+                self._cache_update_callbacks[topic] = callback
+
     def add_file_first_instance_callback(self, first_instance_callback):
         """
         Registers a :class:`dxltieclient.callbacks.FirstInstanceCallback` with the client to receive
@@ -177,31 +374,55 @@ class TieClient(Client):
         :param hashes: A ``dict`` (dictionary) of hashes that identify the file to update the reputation for.
             The ``key`` in the dictionary is the `hash type` and the ``value`` is the `hex` representation of the
             hash value. See the :class:`dxltieclient.constants.HashType` class for the list of `hash type`
-            constants.
+            constants. A pre-validated :class:`dxltieclient.hashes.FileHashes` may also be specified.
         :param filename: A file name to associate with the file (optional)
         :param comment: A comment to associate with the file (optional)
         """
-        # Create the request message
-        req = Request(TIE_SET_FILE_REPUTATION_TOPIC)
+        # Send the request
+        self._dxl_sync_request(
+            TieClient._create_set_file_reputation_request(trust_level, hashes, filename, comment, self._codec))
 
-        # Create a dictionary for the payload
-        payload_dict = {
-            "trustLevel": trust_level,
-            "providerId": FileProvider.ENTERPRISE,
-            "filename": filename,
-            "comment": comment,
-            "hashes": []}
+        # Discard cached reputations for the file (if applicable)
+        if self._file_reputation_cache is not None:
+            self._file_reputation_cache.update(hashes)
 
-        for key, value in hashes.items():
-            payload_dict["hashes"].append(
-                {"type": key,
-                 "value": self._hex_to_base64(value)})
+    def set_file_reputation_async(self, trust_level, hashes, filename="", comment=""):
+        """
+        Sets the "Enterprise" reputation (`trust level`) of a specified file (as identified by hashes) without
+        waiting for the TIE server to respond. See :func:`set_file_reputation` for details about the parameters.
 
-        # Set the payload
-        MessageUtils.dict_to_json_payload(req, payload_dict)
+        **Example Usage**
 
-        # Send the request
-        self._dxl_sync_request(req)
+            .. code-block:: python
+
+                future = tie_client.set_file_reputation_async(
+                    TrustLevel.MOST_LIKELY_TRUSTED, {
+                        HashType.MD5: "f2c7bb8acc97f92e987a2d4087d021b1",
+                        HashType.SHA1: "7eb0139d2175739b3ccb0d1110067820be6abd29"
+                    },
+                    filename="notepad.exe",
+                    comment="Reputation set via OpenDXL")
+
+                # Wait for the TIE server to acknowledge the request
+                future.result(timeout=30)
+
+        :param trust_level: The new `trust level` for the file
+        :param hashes: A ``dict`` (dictionary) of hashes that identify the file
+        :param filename: A file name to associate with the file (optional)
+        :param comment: A comment to associate with the file (optional)
+        :return: A :class:`concurrent.futures.Future` that completes with ``None`` once the TIE server has
+            acknowledged the request (or with the exception that :func:`set_file_reputation` would have raised)
+        """
+        def on_response(response):  # pylint: disable=unused-argument
+            # Discard cached reputations for the file (if applicable)
+            if self._file_reputation_cache is not None:
+                self._file_reputation_cache.update(hashes)
+
+        return send_async_request(
+            self._dxl_client,
+            TieClient._create_set_file_reputation_request(trust_level, hashes, filename, comment, self._codec),
+            on_response,
+            self._response_timeout)
 
     def set_external_file_reputation(self, trust_level, hashes, file_type=0, filename="", comment=""):
         """
@@ -242,7 +463,7 @@ class TieClient(Client):
         :param hashes: A ``dict`` (dictionary) of hashes that identify the file to update the reputation for.
             The ``key`` in the dictionary is the `hash type` and the ``value`` is the `hex` representation of the
             hash value. See the :class:`dxltieclient.constants.HashType` class for the list of `hash type`
-            constants.
+            constants. A pre-validated :class:`dxltieclient.hashes.FileHashes` may also be specified.
         :param file_type: A number that represents the file type. The list of allowed `file types` can be found in the
             :class:`dxltieclient.constants.FileType` constants class. (optional)
         :param filename: A file name to associate with the file (optional)
@@ -262,7 +483,7 @@ class TieClient(Client):
         payload_dict = {
             "file": {
                 "type": file_type,
-                "hashes": hashes,
+                "hashes": dict(hashes),
                 "attributes": {
                     "filename": filename
                 },
@@ -277,11 +498,15 @@ class TieClient(Client):
         }
 
         # Set the payload
-        event.payload = json.dumps(payload_dict)
+        event.payload = self.codec.dumps(payload_dict)
 
         # Send the event
         self._dxl_client.send_event(event)
 
+        # Discard cached reputations for the file (if applicable)
+        if self._file_reputation_cache is not None:
+            self._file_reputation_cache.update(hashes)
+
     def get_file_reputation(self, hashes):
         """
         Retrieves the reputations for the specified file (as identified by hashes)
@@ -370,37 +595,105 @@ class TieClient(Client):
         :param hashes: A ``dict`` (dictionary) of hashes that identify the file to retrieve the reputations for.
             The ``key`` in the dictionary is the `hash type` and the ``value`` is the `hex` representation of the
             hash value. See the :class:`dxltieclient.constants.HashType` class for the list of `hash type`
-            constants.
+            constants. A pre-validated :class:`dxltieclient.hashes.FileHashes` may also be specified.
         :return: A ``dict`` (dictionary) where each `value` is a reputation from a particular `reputation provider`
             which is identified by the `key`. The list of `file reputation providers` can be found in the
             :class:`dxltieclient.constants.FileProvider` constants class.
         """
-        # Create the request message
-        req = Request(TIE_GET_FILE_REPUTATION_TOPIC)
+        # Check the cache (if applicable)
+        cache = self._file_reputation_cache
+        cache_key = ReputationCache.make_key(hashes)
+        if cache is not None:
+            reputations_dict = cache.get(cache_key, self._result_mode == ResultMode.DICT)
+            if reputations_dict is not None:
+                return self._to_result(reputations_dict)
+
+        # Send the request (shared with concurrent callers for the same file)
+        return self._file_reputation_requests.call(
+            cache_key,
+            lambda: self._request_reputations(
+                TieClient._create_file_reputation_request(hashes, self._codec), cache_key, cache))
+
+    def get_file_reputation_async(self, hashes):
+        """
+        Retrieves the reputations for the specified file (as identified by hashes) without blocking the
+        calling thread. See :func:`get_file_reputation` for details about the parameters and the
+        reputations that are returned.
 
-        # Create a dictionary for the payload
-        payload_dict = {
-            "hashes": [],
-            "scanType": 3  # Set Scan Type as 3 (On Demand Scan) to identify this request as not coming from an endpoint
-        }
+        The request is sent using the asynchronous request support of the DXL client, so no thread is
+        consumed while waiting for the response. The returned :class:`concurrent.futures.Future` is
+        completed (and its done callbacks are invoked) on the DXL client thread that delivers the response,
+        so done callbacks should not perform blocking operations such as synchronous DXL requests. If the
+        response is not received within the ``response_timeout`` of the client, the future fails with a
+        :class:`dxlclient.exceptions.WaitTimeoutException`. Cancelling the future discards the response.
+        In both cases, the response callback is unregistered from the DXL client.
 
-        for key, value in hashes.items():
-            payload_dict["hashes"].append(
-                {"type": key,
-                 "value": self._hex_to_base64(value)})
+        If the reputations are available in the file reputation cache (if applicable), a future that has
+        already completed is returned.
 
-        # Set the payload
-        MessageUtils.dict_to_json_payload(req, payload_dict)
+        **Example Usage**
 
-        # Send the request
-        response = self._dxl_sync_request(req)
+            .. code-block:: python
 
-        resp_dict = MessageUtils.json_payload_to_dict(response)
+                future = tie_client.get_file_reputation_async({
+                    HashType.MD5: "f2c7bb8acc97f92e987a2d4087d021b1",
+                    HashType.SHA1: "7eb0139d2175739b3ccb0d1110067820be6abd29"
+                })
 
-        # Transform reputations to be simpler to use
-        if "reputations" in resp_dict:
-            return TieClient._transform_reputations(resp_dict["reputations"])
-        return {}
+                # Do other work...
+
+                reputations_dict = future.result(timeout=30)
+
+        :param hashes: A ``dict`` (dictionary) of hashes that identify the file to retrieve the reputations for
+        :return: A :class:`concurrent.futures.Future` that completes with the reputations ``dict`` that
+            :func:`get_file_reputation` would have returned (or with the exception it would have raised)
+        """
+        cache_key = ReputationCache.make_key(hashes)
+        return self._request_reputations_async(
+            lambda: TieClient._create_file_reputation_request(hashes, self._codec),
+            cache_key, self._file_reputation_cache)
+
+    def get_file_reputations(self, hashes_list, max_in_flight=DEFAULT_MAX_IN_FLIGHT):
+        """
+        Retrieves the reputations for each of the specified files (as identified by hashes).
+
+        The requests are sent to the TIE server concurrently, with at most ``max_in_flight`` requests
+        awaiting a response at any point in time. Identical sets of hashes are only requested once, and
+        the file reputation cache (if applicable) is consulted and updated as with :func:`get_file_reputation`.
+
+        **Example Usage**
+
+            .. code-block:: python
+
+                # Determine reputations for a batch of files (identified by hashes)
+                results = tie_client.get_file_reputations([
+                    {HashType.MD5: "f2c7bb8acc97f92e987a2d4087d021b1"},
+                    {HashType.SHA1: "3395856ce81f2b7382dee72602f798b642f14140"}
+                ])
+
+                for result in results:
+                    if result.error:
+                        print("Lookup failed: " + str(result.error))
+                    else:
+                        print(result.value[FileProvider.GTI][ReputationProp.TRUST_LEVEL])
+
+        :param hashes_list: An iterable of ``dict`` (dictionary) of hashes (or
+            :class:`dxltieclient.hashes.FileHashes`), each of which identifies a file. See
+            :func:`get_file_reputation` for the format of each ``dict`` (dictionary).
+        :param max_in_flight: The maximum number of requests awaiting a response at the same time
+            (defaults to ``100``)
+        :return: A :class:`dxltieclient.batch.LookupResults` ``list`` containing a
+            :class:`dxltieclient.batch.LookupResult` for each file, in the order of the specified hashes. The
+            ``value`` of each result is the reputations ``dict`` (dictionary) that :func:`get_file_reputation`
+            would have returned, while the ``error`` is the exception it would have raised. The results can
+            be exported in a columnar form via :func:`dxltieclient.batch.LookupResults.to_columns`.
+        """
+        return LookupResults(
+            self._get_reputations_batch(
+                hashes_list, ReputationCache.make_key,
+                lambda hashes: TieClient._create_file_reputation_request(hashes, self._codec),
+                self._file_reputation_cache, max_in_flight),
+            FileProvider, FILE_COLUMN_ATTRIBUTES)
 
     def get_file_first_references(self, hashes, query_limit=500):
         """
@@ -445,38 +738,73 @@ class TieClient(Client):
         :param hashes: A ``dict`` (dictionary) of hashes that identify the file to lookup.
             The ``key`` in the dictionary is the `hash type` and the ``value`` is the `hex` representation of the
             hash value. See the :class:`dxltieclient.constants.HashType` class for the list of `hash type`
-            constants.
+            constants. A pre-validated :class:`dxltieclient.hashes.FileHashes` may also be specified.
         :param query_limit: The maximum number of results to return
         :return: A ``list`` containing a ``dict`` (dictionary) for each system that has referenced the file. See the
             :class:`dxltieclient.constants.FirstRefProp` constants class for details about the information that
             is available for each system in the ``dict`` (dictionary).
         """
-        # Create the request message
-        req = Request(TIE_GET_FILE_FIRST_REFS)
+        # Send the request
+        response = self._dxl_sync_request(
+            TieClient._create_file_first_refs_request(hashes, query_limit, self._codec))
 
-        # Create a dictionary for the payload
-        payload_dict = {
-            "queryLimit": query_limit,
-            "hashes": []
-        }
+        # Return the agents list
+        return TieClient._parse_agents_response(response, self._codec)
 
-        for key, value in hashes.items():
-            payload_dict["hashes"].append({
-                "type": key,
-                "value": self._hex_to_base64(value)})
+    def iter_file_first_references(self, hashes, query_limit=500):
+        """
+        Retrieves the set of systems which have referenced (typically executed) the specified file (as
+        identified by hashes), and returns them as a generator.
 
-        # Set the payload
-        MessageUtils.dict_to_json_payload(req, payload_dict)
+        The request is sent immediately, and the systems are parsed from the response incrementally as the
+        generator is consumed, rather than building the entire ``list`` returned by
+        :func:`get_file_first_references`. The response payload itself is received (and held) in full, but
+        it is scanned in place and only a small chunk of systems at a time is decoded (by the codec of the
+        client), so the memory used by the decoded systems does not grow with the number of systems for prevalent files and a high
+        ``query_limit``, and processing can start before the full response has been parsed.
 
+        **Example Usage**
+
+            .. code-block:: python
+
+                # Process the systems that have referenced the file
+                for system in tie_client.iter_file_first_references({
+                        HashType.MD5: "f2c7bb8acc97f92e987a2d4087d021b1",
+                        HashType.SHA1: "7eb0139d2175739b3ccb0d1110067820be6abd29"
+                }, query_limit=50000):
+                    print(system[FirstRefProp.SYSTEM_GUID])
+
+        :param hashes: A ``dict`` (dictionary) of hashes that identify the file to lookup. See
+            :func:`get_file_first_references` for details.
+        :param query_limit: The maximum number of results to return
+        :return: A generator of a ``dict`` (dictionary) for each system that has referenced the file. See the
+            :class:`dxltieclient.constants.FirstRefProp` constants class for details about the information that
+            is available for each system in the ``dict`` (dictionary).
+        """
         # Send the request
-        response = self._dxl_sync_request(req)
+        response = self._dxl_sync_request(
+            TieClient._create_file_first_refs_request(hashes, query_limit, self._codec))
 
-        resp_dict = MessageUtils.json_payload_to_dict(response)
+        # Parse the agents incrementally
+        return _iter_json_array(response.payload, "agents", self._codec)
 
-        # Return the agents list
-        if "agents" in resp_dict:
-            return resp_dict["agents"]
-        return []
+    def get_file_first_references_async(self, hashes, query_limit=500):
+        """
+        Retrieves the set of systems which have referenced (typically executed) the specified file (as
+        identified by hashes) without blocking the calling thread. See :func:`get_file_first_references`
+        for details about the parameters and the systems that are returned, and
+        :func:`get_file_reputation_async` for details about how the returned future is completed.
+
+        :param hashes: A ``dict`` (dictionary) of hashes that identify the file to lookup
+        :param query_limit: The maximum number of results to return
+        :return: A :class:`concurrent.futures.Future` that completes with the ``list`` of systems that
+            :func:`get_file_first_references` would have returned (or with the exception it would have raised)
+        """
+        return send_async_request(
+            self._dxl_client,
+            TieClient._create_file_first_refs_request(hashes, query_limit, self._codec),
+            lambda response: TieClient._parse_agents_response(response, self._codec),
+            self._response_timeout)
 
     def add_certificate_reputation_change_callback(self, rep_change_callback):
         """
@@ -539,28 +867,43 @@ class TieClient(Client):
         :param public_key_sha1: The SHA-1 of the certificate's public key (optional)
         :param comment: A comment to associate with the certificate (optional)
         """
-        # Create the request message
-        req = Request(TIE_SET_CERT_REPUTATION_TOPIC)
-
-        # Create a dictionary for the payload
-        payload_dict = {
-            "trustLevel": trust_level,
-            "providerId": CertProvider.ENTERPRISE,
-            "comment": comment,
-            "hashes": [
-                {"type": "sha1", "value": self._hex_to_base64(sha1)}
-            ]}
+        # Send the request
+        self._dxl_sync_request(
+            TieClient._create_set_cert_reputation_request(
+                trust_level, sha1, public_key_sha1, comment, self._codec))
 
-        # Add public key SHA-1 (if specified)
-        if public_key_sha1:
-            payload_dict["publicKeySha1"] = self._hex_to_base64(
-                public_key_sha1)
+        # Discard cached reputations for the certificate (if applicable)
+        if self._cert_reputation_cache is not None:
+            self._cert_reputation_cache.update(
+                TieClient._cert_hashes(sha1, public_key_sha1))
 
-        # Set the payload
-        MessageUtils.dict_to_json_payload(req, payload_dict)
+    def set_certificate_reputation_async(self, trust_level, sha1, public_key_sha1=None, comment=""):
+        """
+        Sets the "Enterprise" reputation (`trust level`) of a specified certificate (as identified by hashes)
+        without waiting for the TIE server to respond. See :func:`set_certificate_reputation` for details
+        about the parameters, and :func:`get_file_reputation_async` for details about how the returned future
+        is completed.
 
-        # Send the request
-        self._dxl_sync_request(req)
+        :param trust_level: The new `trust level` for the certificate
+        :param sha1: The SHA-1 of the certificate
+        :param public_key_sha1: The SHA-1 of the certificate's public key (optional)
+        :param comment: A comment to associate with the certificate (optional)
+        :return: A :class:`concurrent.futures.Future` that completes with ``None`` once the TIE server has
+            acknowledged the request (or with the exception that :func:`set_certificate_reputation` would
+            have raised)
+        """
+        def on_response(response):  # pylint: disable=unused-argument
+            # Discard cached reputations for the certificate (if applicable)
+            if self._cert_reputation_cache is not None:
+                self._cert_reputation_cache.update(
+                    TieClient._cert_hashes(sha1, public_key_sha1))
+
+        return send_async_request(
+            self._dxl_client,
+            TieClient._create_set_cert_reputation_request(
+                trust_level, sha1, public_key_sha1, comment, self._codec),
+            on_response,
+            self._response_timeout)
 
     def get_certificate_reputation(self, sha1, public_key_sha1=None):
         """
@@ -650,32 +993,83 @@ class TieClient(Client):
             which is identified by the `key`. The list of `certificate reputation providers` can be found in the
             :class:`dxltieclient.constants.CertProvider` constants class.
         """
-        # Create the request message
-        req = Request(TIE_GET_CERT_REPUTATION_TOPIC)
+        # Check the cache (if applicable)
+        cache = self._cert_reputation_cache
+        cache_key = ReputationCache.make_key(
+            TieClient._cert_hashes(sha1, public_key_sha1))
+        if cache is not None:
+            reputations_dict = cache.get(cache_key, self._result_mode == ResultMode.DICT)
+            if reputations_dict is not None:
+                return self._to_result(reputations_dict)
+
+        # Send the request (shared with concurrent callers for the same certificate)
+        return self._cert_reputation_requests.call(
+            cache_key,
+            lambda: self._request_reputations(
+                TieClient._create_cert_reputation_request(sha1, public_key_sha1, self._codec), cache_key, cache))
+
+    def get_certificate_reputation_async(self, sha1, public_key_sha1=None):
+        """
+        Retrieves the reputations for the specified certificate (as identified by the SHA-1 of the certificate
+        and optionally the SHA-1 of the certificate's public key) without blocking the calling thread. See
+        :func:`get_certificate_reputation` for details about the parameters and the reputations that are
+        returned, and :func:`get_file_reputation_async` for details about how the returned future is completed.
 
-        # Create a dictionary for the payload
-        payload_dict = {
-            "hashes": [
-                {"type": "sha1", "value": self._hex_to_base64(sha1)}
-            ]}
+        :param sha1: The SHA-1 of the certificate
+        :param public_key_sha1: The SHA-1 of the certificate's public key (optional)
+        :return: A :class:`concurrent.futures.Future` that completes with the reputations ``dict`` that
+            :func:`get_certificate_reputation` would have returned (or with the exception it would have raised)
+        """
+        cache_key = ReputationCache.make_key(
+            TieClient._cert_hashes(sha1, public_key_sha1))
+        return self._request_reputations_async(
+            lambda: TieClient._create_cert_reputation_request(sha1, public_key_sha1, self._codec),
+            cache_key, self._cert_reputation_cache)
 
-        # Add public key SHA-1 (if specified)
-        if public_key_sha1:
-            payload_dict["publicKeySha1"] = self._hex_to_base64(
-                public_key_sha1)
+    def get_certificate_reputations(self, certs, max_in_flight=DEFAULT_MAX_IN_FLIGHT):
+        """
+        Retrieves the reputations for each of the specified certificates (as identified by the SHA-1 of the
+        certificate and optionally the SHA-1 of the certificate's public key).
 
-        # Set the payload
-        MessageUtils.dict_to_json_payload(req, payload_dict)
+        The requests are sent to the TIE server concurrently, with at most ``max_in_flight`` requests
+        awaiting a response at any point in time. Identical certificates are only requested once, and the
+        certificate reputation cache (if applicable) is consulted and updated as with
+        :func:`get_certificate_reputation`.
 
-        # Send the request
-        response = self._dxl_sync_request(req)
+        **Example Usage**
 
-        resp_dict = MessageUtils.json_payload_to_dict(response)
+            .. code-block:: python
 
-        # Transform reputations to be simpler to use
-        if "reputations" in resp_dict:
-            return TieClient._transform_reputations(resp_dict["reputations"])
-        return {}
+                # Determine reputations for a batch of certificates
+                results = tie_client.get_certificate_reputations([
+                    ("6EAE26DB8C13182A7947982991B4321732CC3DE2", "3B87A2D6F39770160364B79A152FCC73BAE27ADF"),
+                    ("1C26E2037C8E205B452CAB3565D696512207D66D", None)
+                ])
+
+                for result in results:
+                    if result.error:
+                        print("Lookup failed: " + str(result.error))
+                    else:
+                        print(result.value[CertProvider.GTI][ReputationProp.TRUST_LEVEL])
+
+        :param certs: An iterable of ``(sha1, public_key_sha1)`` tuples, each of which identifies a certificate.
+            The SHA-1 of the certificate's public key may be ``None``.
+        :param max_in_flight: The maximum number of requests awaiting a response at the same time
+            (defaults to ``100``)
+        :return: A :class:`dxltieclient.batch.LookupResults` ``list`` containing a
+            :class:`dxltieclient.batch.LookupResult` for each certificate, in the order of the specified
+            certificates. The ``value`` of each result is the reputations ``dict`` (dictionary) that
+            :func:`get_certificate_reputation` would have returned, while the ``error`` is the exception it
+            would have raised. The results can be exported in a columnar form via
+            :func:`dxltieclient.batch.LookupResults.to_columns`.
+        """
+        return LookupResults(
+            self._get_reputations_batch(
+                certs,
+                lambda cert: ReputationCache.make_key(TieClient._cert_hashes(*cert)),
+                lambda cert: TieClient._create_cert_reputation_request(cert[0], cert[1], self._codec),
+                self._cert_reputation_cache, max_in_flight),
+            CertProvider, CERT_COLUMN_ATTRIBUTES)
 
     def get_certificate_first_references(self, sha1, public_key_sha1=None, query_limit=500):
         """
@@ -722,34 +1116,361 @@ class TieClient(Client):
             See the :class:`dxltieclient.constants.FirstRefProp` constants class for details about the information that
             is available for each system in the ``dict`` (dictionary).
         """
+        # Send the request
+        response = self._dxl_sync_request(
+            TieClient._create_cert_first_refs_request(
+                sha1, public_key_sha1, query_limit, self._codec))
+
+        # Return the agents list
+        return TieClient._parse_agents_response(response, self._codec)
+
+    def get_certificate_first_references_async(self, sha1, public_key_sha1=None, query_limit=500):
+        """
+        Retrieves the set of systems which have referenced the specified certificate (as identified by
+        hashes) without blocking the calling thread. See :func:`get_certificate_first_references` for
+        details about the parameters and the systems that are returned, and :func:`get_file_reputation_async`
+        for details about how the returned future is completed.
+
+        :param sha1: The SHA-1 of the certificate
+        :param public_key_sha1: The SHA-1 of the certificate's public key (optional)
+        :param query_limit: The maximum number of results to return
+        :return: A :class:`concurrent.futures.Future` that completes with the ``list`` of systems that
+            :func:`get_certificate_first_references` would have returned (or with the exception it would
+            have raised)
+        """
+        return send_async_request(
+            self._dxl_client,
+            TieClient._create_cert_first_refs_request(
+                sha1, public_key_sha1, query_limit, self._codec),
+            lambda response: TieClient._parse_agents_response(response, self._codec),
+            self._response_timeout)
+
+    def _request_reputations(self, request, cache_key, cache):
+        """
+        Sends the specified reputation request, and caches the resulting reputations
+        :param request: The DXL request
+        :param cache_key: The cache key for the reputations
+        :param cache: The :class:`dxltieclient.cache.ReputationCache` to update (``None`` if not applicable)
+        :return: The reputations in the form indicated by the result mode
+        """
+        # Capture the cache generation (reputation changes applied while the request is in flight win)
+        generation = None if cache is None else cache.generation
+
+        # Send the request
+        response = self._dxl_sync_request(request)
+
+        return self._response_to_result(response, cache_key, cache, generation)
+
+    def _response_to_result(self, response, cache_key, cache, generation=None):
+        """
+        Parses the reputations contained in the specified DXL response, and caches them
+        :param response: The DXL response
+        :param cache_key: The cache key for the reputations
+        :param cache: The :class:`dxltieclient.cache.ReputationCache` to update (``None`` if not applicable)
+        :param generation: The generation of the cache when the request was sent (optional)
+        :return: The reputations in the form indicated by the result mode
+        """
+        # Keep the raw payload (the cache requires the reputations to be parsed)
+        if self._result_mode == ResultMode.LAZY and cache is None:
+            return LazyReputationSet(response.payload, self._codec)
+
+        # Transform reputations to be simpler to use
+        reputations_dict = TieClient._parse_reputations_response(response, self._codec)
+
+        # Update the cache (if applicable)
+        if cache is not None:
+            cache.put(cache_key, reputations_dict, generation)
+
+        return self._to_result(reputations_dict)
+
+    def _request_reputations_async(self, create_request, cache_key, cache):
+        """
+        Sends a reputation request asynchronously (unless the reputations are cached), and caches the
+        resulting reputations
+        :param create_request: Function which returns the DXL request
+        :param cache_key: The cache key for the reputations
+        :param cache: The :class:`dxltieclient.cache.ReputationCache` to use (``None`` if not applicable)
+        :return: A :class:`concurrent.futures.Future` that completes with the dictionary of reputations
+        """
+        # Check the cache (if applicable)
+        if cache is not None:
+            reputations_dict = cache.get(cache_key, self._result_mode == ResultMode.DICT)
+            if reputations_dict is not None:
+                return completed_future(self._to_result(reputations_dict))
+
+        generation = None if cache is None else cache.generation
+        return send_async_request(
+            self._dxl_client, create_request(),
+            lambda response: self._response_to_result(response, cache_key, cache, generation),
+            self._response_timeout)
+
+    def _get_reputations_batch(self, items, make_key, create_request, cache, max_in_flight):
+        """
+        Retrieves the reputations for each of the specified items using concurrent asynchronous requests
+        :param items: An iterable of the items to retrieve reputations for
+        :param make_key: Function returning the cache key for an item
+        :param create_request: Function returning the DXL request for an item
+        :param cache: The :class:`dxltieclient.cache.ReputationCache` to use (``None`` if not applicable)
+        :param max_in_flight: The maximum number of requests awaiting a response at the same time
+        :return: A ``list`` containing a :class:`dxltieclient.batch.LookupResult` for each item
+        """
+        results = []
+        # Cache key to the indices of the items awaiting the corresponding request
+        pending = OrderedDict()
+        # The item for which the request of each pending key is created (once it is dispatched)
+        request_items = []
+
+        for index, item in enumerate(items):
+            results.append(None)
+            try:
+                key = make_key(item)
+                if key in pending:
+                    pending[key].append(index)
+                    continue
+                if cache is not None:
+                    reputations_dict = cache.get(key, self._result_mode == ResultMode.DICT)
+                    if reputations_dict is not None:
+                        results[index] = LookupResult(reputations_dict, None)
+                        continue
+                request_items.append(item)
+                pending[key] = [index]
+            except Exception as ex:  # pylint: disable=broad-except
+                results[index] = LookupResult(None, ex)
+
+        # Keep the raw payloads (the cache requires the reputations to be parsed)
+        lazy = self._result_mode == ResultMode.LAZY and cache is None
+        dispatcher = _RequestDispatcher(
+            self._dxl_client,
+            (lambda response: LazyReputationSet(response.payload, self._codec)) if lazy else
+            (lambda response: TieClient._parse_reputations_response(response, self._codec)),
+            max_in_flight, self._response_timeout)
+        generation = None if cache is None else cache.generation
+        for (key, indices), result in zip(pending.items(), dispatcher.dispatch(request_items, create_request)):
+            if cache is not None and result.error is None:
+                cache.put(key, result.value, generation)
+            results[indices[0]] = result
+            for index in indices[1:]:
+                results[index] = LookupResult(copy.deepcopy(result.value), result.error)
+
+        if self._result_mode != ResultMode.DICT and not lazy:
+            results = [LookupResult(self._to_result(result.value), None) if result.error is None else result
+                       for result in results]
+
+        return results
+
+    def _to_result(self, reputations_dict):
+        """
+        Converts the specified reputations to the form indicated by the result mode
+        :param reputations_dict: The dictionary of reputations in a simplified form
+        :return: The reputations in the form indicated by the result mode
+        """
+        if self._result_mode == ResultMode.DICT:
+            return reputations_dict
+        # The reputations may be the (uncopied) value held by the cache: ReputationSet.from_dict copies them
+        return ReputationSet.from_dict(reputations_dict)
+
+    @staticmethod
+    def _create_set_file_reputation_request(trust_level, hashes, filename, comment, codec=None):
+        """
+        Creates the DXL request to set the "Enterprise" reputation of the specified file
+        :param trust_level: The new trust level for the file
+        :param hashes: A dictionary where the hash type is the key and the hex hash value is the value
+        :param filename: A file name to associate with the file
+        :param comment: A comment to associate with the file
+        :param codec: The JSON codec used to encode the payload (optional)
+        :return: The DXL request
+        """
+        # Create the request message
+        req = Request(TIE_SET_FILE_REPUTATION_TOPIC)
+
+        # Set the payload
+        codec = codec or get_default_codec()
+        req.payload = _SET_FILE_REPUTATION_PAYLOAD.render(
+            codec.dumps(trust_level), codec.dumps(filename), codec.dumps(comment),
+            TieClient._encode_hashes_payload(hashes, codec))
+
+        return req
+
+    @staticmethod
+    def _create_file_first_refs_request(hashes, query_limit, codec=None):
+        """
+        Creates the DXL request to retrieve the systems that have referenced the specified file
+        :param hashes: A dictionary where the hash type is the key and the hex hash value is the value
+        :param query_limit: The maximum number of results to return
+        :param codec: The JSON codec used to encode the payload (optional)
+        :return: The DXL request
+        """
+        # Create the request message
+        req = Request(TIE_GET_FILE_FIRST_REFS)
+
+        # Set the payload
+        codec = codec or get_default_codec()
+        req.payload = _FILE_FIRST_REFS_PAYLOAD.render(
+            codec.dumps(query_limit), TieClient._encode_hashes_payload(hashes, codec))
+
+        return req
+
+    @staticmethod
+    def _create_set_cert_reputation_request(trust_level, sha1, public_key_sha1, comment, codec=None):
+        """
+        Creates the DXL request to set the "Enterprise" reputation of the specified certificate
+        :param trust_level: The new trust level for the certificate
+        :param sha1: The SHA-1 of the certificate
+        :param public_key_sha1: The SHA-1 of the certificate's public key (optional)
+        :param comment: A comment to associate with the certificate
+        :param codec: The JSON codec used to encode the payload (optional)
+        :return: The DXL request
+        """
+        # Create the request message
+        req = Request(TIE_SET_CERT_REPUTATION_TOPIC)
+
+        # Create a dictionary for the payload
+        payload_dict = {
+            "trustLevel": trust_level,
+            "providerId": CertProvider.ENTERPRISE,
+            "comment": comment,
+            "hashes": []}
+
+        # Add the SHA-1 and public key SHA-1 (if specified)
+        TieClient._add_cert_hashes_to_payload(payload_dict, sha1, public_key_sha1)
+
+        # Set the payload
+        TieClient._encode_payload(req, payload_dict, codec)
+
+        return req
+
+    @staticmethod
+    def _create_cert_first_refs_request(sha1, public_key_sha1, query_limit, codec=None):
+        """
+        Creates the DXL request to retrieve the systems that have referenced the specified certificate
+        :param sha1: The SHA-1 of the certificate
+        :param public_key_sha1: The SHA-1 of the certificate's public key (optional)
+        :param query_limit: The maximum number of results to return
+        :param codec: The JSON codec used to encode the payload (optional)
+        :return: The DXL request
+        """
         # Create the request message
         req = Request(TIE_GET_CERT_FIRST_REFS)
 
         # Create a dictionary for the payload
         payload_dict = {
             "queryLimit": query_limit,
-            "hashes": [
-                {"type": "sha1", "value": self._hex_to_base64(sha1)}
-            ]}
+            "hashes": []}
 
-        # Add public key SHA-1 (if specified)
-        if public_key_sha1:
-            payload_dict["publicKeySha1"] = self._hex_to_base64(
-                public_key_sha1)
+        # Add the SHA-1 and public key SHA-1 (if specified)
+        TieClient._add_cert_hashes_to_payload(payload_dict, sha1, public_key_sha1)
 
         # Set the payload
-        MessageUtils.dict_to_json_payload(req, payload_dict)
+        TieClient._encode_payload(req, payload_dict, codec)
 
-        # Send the request
-        response = self._dxl_sync_request(req)
+        return req
+
+    @staticmethod
+    def _create_file_reputation_request(hashes, codec=None):
+        """
+        Creates the DXL request to retrieve the reputations for the specified file
+        :param hashes: A dictionary where the hash type is the key and the hex hash value is the value
+        :param codec: The JSON codec used to encode the payload (optional)
+        :return: The DXL request
+        """
+        # Create the request message
+        req = Request(TIE_GET_FILE_REPUTATION_TOPIC)
+
+        # Set the payload (with Scan Type 3, see the template)
+        req.payload = _FILE_REPUTATION_PAYLOAD.render(TieClient._encode_hashes_payload(hashes, codec))
 
-        resp_dict = MessageUtils.json_payload_to_dict(response)
+        return req
+
+    @staticmethod
+    def _create_cert_reputation_request(sha1, public_key_sha1=None, codec=None):
+        """
+        Creates the DXL request to retrieve the reputations for the specified certificate
+        :param sha1: The SHA-1 of the certificate
+        :param public_key_sha1: The SHA-1 of the certificate's public key (optional)
+        :param codec: The JSON codec used to encode the payload (optional)
+        :return: The DXL request
+        """
+        # Create the request message
+        req = Request(TIE_GET_CERT_REPUTATION_TOPIC)
+
+        # Create a dictionary for the payload
+        payload_dict = {
+            "hashes": []}
+
+        # Add the SHA-1 and public key SHA-1 (if specified)
+        TieClient._add_cert_hashes_to_payload(payload_dict, sha1, public_key_sha1)
+
+        # Set the payload
+        TieClient._encode_payload(req, payload_dict, codec)
+
+        return req
+
+    @staticmethod
+    def _encode_payload(message, payload_dict, codec=None):
+        """
+        Sets the payload of the specified DXL message to the JSON representation of the specified dictionary
+        :param message: The DXL message
+        :param payload_dict: The payload dictionary
+        :param codec: The JSON codec used to encode the payload (optional)
+        """
+        message.payload = (codec or get_default_codec()).dumps(payload_dict)
+
+    @staticmethod
+    def _parse_reputations_response(response, codec=None):
+        """
+        Parses the reputations contained in the specified DXL response
+        :param response: The DXL response
+        :param codec: The JSON codec used to decode the payload (optional)
+        :return: The dictionary of reputations in a simplified form
+        """
+        resp_dict = (codec or get_default_codec()).loads(response.payload)
+
+        # Transform reputations to be simpler to use
+        if "reputations" in resp_dict:
+            return TieClient._transform_reputations(resp_dict["reputations"])
+        return {}
+
+    @staticmethod
+    def _parse_agents_response(response, codec=None):
+        """
+        Parses the systems contained in the specified DXL response
+        :param response: The DXL response
+        :param codec: The JSON codec used to decode the payload (optional)
+        :return: The list of systems
+        """
+        resp_dict = (codec or get_default_codec()).loads(response.payload)
 
         # Return the agents list
         if "agents" in resp_dict:
             return resp_dict["agents"]
         return []
 
+    @staticmethod
+    def _cert_hashes(sha1, public_key_sha1=None):
+        """
+        Returns the hashes identifying the specified certificate in the same form as the hashes of a
+        certificate reputation change event (used to key reputation caches)
+        :param sha1: The SHA-1 of the certificate
+        :param public_key_sha1: The SHA-1 of the certificate's public key (optional)
+        :return: A dictionary where the hash type is the key
+        """
+        hashes = {"sha1": sha1}
+        if public_key_sha1:
+            hashes[CertRepChangeEventProp.PUBLIC_KEY_SHA1] = public_key_sha1
+        return hashes
+
+    @staticmethod
+    def _hash_converters():
+        """
+        Returns the functions used to convert hash values, taking the hash memo (if applicable)
+        into account
+        :return: A tuple of the hex to base64 and base64 to hex conversion functions
+        """
+        hash_memo = TieClient._hash_memo
+        if hash_memo is None:
+            return _hex_to_base64, _base64_to_hex
+        return hash_memo.hex_to_base64, hash_memo.base64_to_hex
+
     @staticmethod
     def _base64_to_hex(base64_value):
         """
@@ -757,7 +1478,7 @@ class TieClient(Client):
         :param base64_value: The base64 value
         :return: The corresponding hex string
         """
-        return binascii.hexlify(base64.b64decode(base64_value)).decode("ascii")
+        return TieClient._hash_converters()[1](base64_value)
 
     @staticmethod
     def _hex_to_base64(hex_value):
@@ -766,7 +1487,46 @@ class TieClient(Client):
         :param hex_value: The hex value
         :return: The corresponding base64 string
         """
-        return base64.b64encode(binascii.unhexlify(hex_value)).decode("ascii")
+        return TieClient._hash_converters()[0](hex_value)
+
+    @staticmethod
+    def _encode_hashes_payload(hashes, codec=None):
+        """
+        Encodes the specified dictionary of hashes (where the hash type is the key and the hex hash value
+        is the value) as the JSON list of hashes in standard TIE format.
+        :param hashes: The dictionary of hashes (or :class:`dxltieclient.hashes.FileHashes`)
+        :param codec: The JSON codec used to encode unknown hash types (optional)
+        :return: The JSON list of hashes in standard TIE format (``bytes``)
+        """
+        if isinstance(hashes, FileHashes):
+            # The raw values are already stored
+            values = [(hash_type, _bytes_to_base64(raw_value))
+                      for hash_type, _, raw_value in hashes._hashes]  # pylint: disable=protected-access
+        else:
+            to_base64 = TieClient._hash_converters()[0]
+            values = [(hash_type, to_base64(hex_value)) for hash_type, hex_value in hashes.items()]
+
+        entries = []
+        for hash_type, value in values:
+            prefix = _HASH_PAYLOAD_PREFIXES.get(hash_type)
+            if prefix is None:
+                prefix = b'{"type":' + (codec or get_default_codec()).dumps(hash_type) + b',"value":"'
+            # Base64 values never require escaping
+            entries.append(prefix + value.encode("ascii") + b'"}')
+        return b"[" + b",".join(entries) + b"]"
+
+    @staticmethod
+    def _add_cert_hashes_to_payload(payload_dict, sha1, public_key_sha1=None):
+        """
+        Adds the specified certificate hashes to a request payload in standard TIE format
+        :param payload_dict: The request payload dictionary
+        :param sha1: The SHA-1 of the certificate
+        :param public_key_sha1: The SHA-1 of the certificate's public key (optional)
+        """
+        to_base64 = TieClient._hash_converters()[0]
+        if public_key_sha1:
+            payload_dict["publicKeySha1"] = to_base64(public_key_sha1)
+        payload_dict["hashes"] = [{"type": "sha1", "value": to_base64(sha1)}]
 
     @staticmethod
     def _transform_hashes(hashes):
@@ -776,19 +1536,20 @@ class TieClient(Client):
         :param hashes: The list of hashes in standard TIE format
         :return: The hashes in a simplified form that is a dictionary where the hash type is the key.
         """
-        hashes_dict = {}
-        for hash_value in hashes:
-            hashes_dict[hash_value["type"]] = TieClient._base64_to_hex(hash_value["value"])
-        return hashes_dict
+        to_hex = TieClient._hash_converters()[1]
+        return {hash_value["type"]: to_hex(hash_value["value"]) for hash_value in hashes}
 
     @staticmethod
-    def _transform_reputations(reputations):
+    def _transform_reputations(reputations, transform_hashes=None):
         """
         Transforms the specified dictionary of reputations from the standard TIE format to a simplified
         form (hex vs base64 hashes, etc.)
         :param reputations: The dictionary of reputation in the standard TIE format
+        :param transform_hashes: The function used to transform the hashes of overridden files (optional,
+            defaults to :func:`_transform_hashes`)
         :return: The dictionary of reputations in a simplified form
         """
+        transform_hashes = transform_hashes or TieClient._transform_hashes
         reputations_dict = {}
 
         for reputation in reputations:
@@ -801,7 +1562,7 @@ class TieClient(Client):
                     reputation[CertReputationProp.OVERRIDDEN][CertReputationOverriddenProp.FILES]
                 for file_dict in overridden_files:
                     if "hashes" in file_dict:
-                        file_dict["hashes"] = TieClient._transform_hashes(file_dict["hashes"])
+                        file_dict["hashes"] = transform_hashes(file_dict["hashes"])
 
         return reputations_dict
 
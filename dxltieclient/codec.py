@@ -0,0 +1,331 @@
+# -*- coding: utf-8 -*-
+################################################################################
+# Copyright (c) 2017 McAfee LLC - All Rights Reserved.
+################################################################################
+
+from __future__ import absolute_import
+
+import json
+import re
+import sys
+
+# Whether the standard json module can parse bytes directly (Python 2 and Python 3.6+)
+_JSON_LOADS_BYTES = sys.version_info[0] == 2 or sys.version_info >= (3, 6)
+
+
+def _strip_payload(payload):
+    """
+    Removes the trailing NUL characters that some DXL clients append to payloads. Binary payloads are
+    not copied: if NUL characters are present, a ``memoryview`` of the remainder of the payload is returned.
+    :param payload: The payload (``bytes``, ``bytearray``, ``memoryview`` or ``str``)
+    :return: The payload without trailing NUL characters
+    """
+    if isinstance(payload, (bytes, bytearray, memoryview)):
+        end = len(payload)
+        while end and payload[end - 1:end] == b"\0":
+            end -= 1
+        if end == len(payload):
+            return payload
+        return memoryview(payload)[:end]
+    return payload.rstrip(u"\0")
+
+
+def _payload_to_bytes(payload):
+    """
+    Returns the specified payload as an object that can be parsed by JSON libraries that do not support
+    ``memoryview`` objects (copying the payload only if it is a ``memoryview``)
+    :param payload: The payload (``bytes``, ``bytearray``, ``memoryview`` or ``str``)
+    :return: The payload (``bytes``, ``bytearray`` or ``str``)
+    """
+    return payload.tobytes() if isinstance(payload, memoryview) else payload
+
+
+# Matches JSON whitespace
+_WHITESPACE = re.compile(br"[ \t\n\r]*")
+# Matches the JSON strings and structural characters (the tokens that determine the structure of a payload)
+_STRUCTURE = re.compile(br'(?P<string>"(?:[^"\\]|\\.)*")|(?P<char>[][{},:])')
+# Matches an array element that does not contain nested objects or arrays (a flat object, a string or
+# another scalar), and the delimiter that follows it
+_FLAT_ELEMENT = re.compile(
+    br'[ \t\n\r]*(?:\{(?:[^][{}"]|"(?:[^"\\]|\\.)*")*\}|"(?:[^"\\]|\\.)*"|[^][{}",]+)[ \t\n\r]*([,\]])')
+# The approximate number of bytes of the payload that are decoded at once by _iter_json_array
+_CHUNK_SIZE = 65536
+
+
+def _find_array(payload, name):
+    """
+    Returns the position of the first element of the array with the specified name in a JSON object payload
+    :param payload: The JSON object payload (``bytes`` or ``memoryview``)
+    :param name: The name of the array property
+    :return: The position following the opening bracket of the array (``None`` if the property is not
+        present, or is not an array)
+    """
+    index = _WHITESPACE.match(payload).end()
+    if payload[index:index + 1] != b"{":
+        raise ValueError("Expecting '{' at position " + str(index))
+    depth = 0
+    # The last string at the top level of the object (the name of the property, when followed by ":")
+    last_string = None
+    for match in _STRUCTURE.finditer(payload, index):
+        if match.lastgroup == "string":
+            if depth == 1:
+                last_string = match
+            continue
+        char = match.group("char")
+        if char == b":":
+            if depth == 1 and json.loads(last_string.group("string").decode("utf-8")) == name:
+                index = _WHITESPACE.match(payload, match.end()).end()
+                if payload[index:index + 1] == b"[":
+                    return index + 1
+        elif char in (b"{", b"["):
+            depth += 1
+        elif char in (b"}", b"]"):
+            depth -= 1
+            if depth == 0:
+                return None
+    raise ValueError("Unterminated object")
+
+
+def _find_element_end(payload, index):
+    """
+    Returns the position of the delimiter following the array element (which may contain nested objects
+    and arrays) at the specified position
+    :param payload: The JSON payload (``bytes`` or ``memoryview``)
+    :param index: The position of the element
+    :return: The position of the delimiter (``,`` or ``]``)
+    """
+    depth = 0
+    for match in _STRUCTURE.finditer(payload, index):
+        if match.lastgroup == "string":
+            continue
+        char = match.group("char")
+        if char in (b"{", b"["):
+            depth += 1
+        elif char in (b"}", b"]"):
+            if depth == 0:
+                return match.start()
+            depth -= 1
+        elif char == b"," and depth == 0:
+            return match.start()
+    raise ValueError("Unterminated array")
+
+
+def _decode_elements(payload, elements, codec):
+    """
+    Decodes the array elements at the specified positions of a JSON payload. The elements are decoded
+    together (as an array) when possible, otherwise individually (so that the elements preceding a
+    malformed element are returned before the error is raised).
+    :param payload: The JSON payload (``bytes`` or ``memoryview``)
+    :param elements: A ``list`` of the (start, end) positions of consecutive elements
+    :param codec: The JSON codec
+    :return: A generator of the decoded elements
+    """
+    try:
+        values = codec.loads(b"".join((b"[", payload[elements[0][0]:elements[-1][1]], b"]")))
+    except ValueError:
+        values = (codec.loads(payload[start:end]) for start, end in elements)
+    for value in values:
+        yield value
+
+
+def _iter_json_array(payload, name, codec=None):
+    """
+    Parses the array with the specified name from a JSON object payload incrementally, yielding each
+    element of the array as soon as it has been parsed (without building the array). The payload is
+    scanned in place (it is not decoded as a whole), and the elements are decoded by the codec in chunks
+    of approximately ``_CHUNK_SIZE`` bytes, so that memory usage does not grow with the size of the array.
+    Properties that follow the array are not parsed.
+    :param payload: The JSON object payload (``bytes``, ``bytearray``, ``memoryview`` or ``str``)
+    :param name: The name of the array property
+    :param codec: The JSON codec used to decode the elements (optional, defaults to the default codec)
+    :return: A generator of the elements of the array (empty if the property is not present)
+    """
+    codec = codec or get_default_codec()
+    payload = _strip_payload(payload)
+    if not isinstance(payload, (bytes, bytearray, memoryview)):
+        payload = payload.encode("utf-8")
+    if sys.version_info[0] > 2:
+        # Slices of the payload (the chunks of elements) are views, rather than copies
+        payload = memoryview(payload)
+    else:
+        payload = _payload_to_bytes(payload)
+
+    index = _find_array(payload, name)
+    if index is None:
+        return
+    next_index = _WHITESPACE.match(payload, index).end()
+    if payload[next_index:next_index + 1] == b"]":
+        return
+
+    # The (start, end) positions of the elements of the current chunk
+    elements = []
+    while True:
+        match = _FLAT_ELEMENT.match(payload, index)
+        if match is not None:
+            end, delimiter, next_index = match.start(1), match.group(1), match.end()
+        else:
+            try:
+                end = _find_element_end(payload, index)
+            except ValueError:
+                # Decode the preceding elements before reporting the error
+                for value in _decode_elements(payload, elements + [(index, len(payload))], codec):
+                    yield value
+                raise
+            delimiter, next_index = payload[end:end + 1], end + 1
+            if not isinstance(delimiter, bytes):
+                delimiter = delimiter.tobytes()
+        elements.append((index, end))
+        if delimiter == b"]" or end - elements[0][0] >= _CHUNK_SIZE:
+            for value in _decode_elements(payload, elements, codec):
+                yield value
+            elements = []
+        if delimiter == b"]":
+            return
+        index = next_index
+
+
+class JsonCodec(object):
+    """
+    Encodes and decodes the JSON payloads of the DXL messages exchanged with the TIE server using the
+    standard ``json`` module.
+
+    The :class:`OrjsonCodec` and :class:`UjsonCodec` classes provide faster implementations based on the
+    optional `orjson` and `ujson` packages. By default, the :class:`dxltieclient.client.TieClient` and the
+    event callbacks use the fastest codec that is installed (see :func:`get_default_codec`).
+
+    **Example Usage**
+
+        .. code-block:: python
+
+            tie_client = TieClient(dxl_client, codec=JsonCodec())
+    """
+
+    #: The name of the codec
+    name = "json"
+
+    def dumps(self, value):
+        """
+        Encodes the specified value as JSON
+
+        :param value: The value to encode
+        :return: The UTF-8 encoded JSON (``bytes``)
+        """
+        return json.dumps(value).encode("utf-8")
+
+    def loads(self, payload):
+        """
+        Decodes the specified JSON payload. The standard ``json`` module decodes binary payloads to a
+        ``str`` (a copy of the payload) before parsing them; :class:`OrjsonCodec` parses them in place.
+
+        :param payload: The JSON payload (``bytes``, ``bytearray``, ``memoryview`` or ``str``)
+        :return: The decoded value
+        """
+        payload = _strip_payload(payload)
+        if isinstance(payload, memoryview):
+            # The json module does not accept memoryview objects. Decoding the buffer to str copies the
+            # payload once, which is the same copy json.loads makes when it decodes bytes (converting
+            # to bytes first would copy it twice).
+            payload = str(payload, "utf-8") if sys.version_info[0] > 2 else payload.tobytes()
+        elif not _JSON_LOADS_BYTES and isinstance(payload, (bytes, bytearray)):
+            payload = payload.decode("utf-8")
+        return json.loads(payload)
+
+    def __repr__(self):
+        return type(self).__name__ + "()"
+
+
+class OrjsonCodec(JsonCodec):
+    """
+    JSON codec based on the `orjson` package (which must be installed).
+    """
+
+    name = "orjson"
+
+    def __init__(self):
+        import orjson  # pylint: disable=import-error
+        self._orjson = orjson
+
+    def dumps(self, value):
+        return self._orjson.dumps(value)
+
+    def loads(self, payload):
+        return self._orjson.loads(_strip_payload(payload))
+
+
+class UjsonCodec(JsonCodec):
+    """
+    JSON codec based on the `ujson` package (which must be installed).
+    """
+
+    name = "ujson"
+
+    def __init__(self):
+        import ujson  # pylint: disable=import-error
+        self._ujson = ujson
+
+    def dumps(self, value):
+        return self._ujson.dumps(value).encode("utf-8")
+
+    def loads(self, payload):
+        return self._ujson.loads(_payload_to_bytes(_strip_payload(payload)))
+
+
+class _PayloadTemplate(object):
+    """
+    Precompiled JSON payload for a DXL request. The constant properties of the payload are serialized once,
+    when the template is created, and the (already encoded) variable properties are spliced in when the
+    template is rendered.
+    """
+
+    def __init__(self, constants, fields):
+        """
+        Constructor parameters:
+
+        :param constants: A ``dict`` (dictionary) of the properties that are the same for every request
+        :param fields: The names of the variable properties, in the order their values are specified when
+            rendering the template
+        """
+        # The serialized constant properties, without the closing brace
+        self._prefix = json.dumps(constants, separators=(",", ":"), sort_keys=True).encode("utf-8")[:-1]
+        separators = [b","] * len(fields)
+        if not constants and fields:
+            separators[0] = b""
+        self._keys = [separator + json.dumps(name).encode("utf-8") + b":"
+                      for separator, name in zip(separators, fields)]
+
+    def render(self, *values):
+        """
+        Returns the payload containing the specified values
+        :param values: The JSON encoded (``bytes``) value of each variable property
+        :return: The payload (``bytes``)
+        """
+        parts = [self._prefix]
+        for key, value in zip(self._keys, values):
+            parts.append(key)
+            parts.append(value)
+        parts.append(b"}")
+        return b"".join(parts)
+
+
+# The codec returned by get_default_codec (determined on first use)
+_default_codec = None
+
+
+def get_default_codec():
+    """
+    Returns the default JSON codec, which is the fastest codec that is installed (:class:`OrjsonCodec`,
+    :class:`UjsonCodec` or :class:`JsonCodec`, in that order)
+
+    :return: The default JSON codec
+    """
+    global _default_codec  # pylint: disable=global-statement
+    if _default_codec is None:
+        for codec_class in (OrjsonCodec, UjsonCodec):
+            try:
+                _default_codec = codec_class()
+                break
+            except ImportError:
+                pass
+        else:
+            _default_codec = JsonCodec()
+    return _default_codec
@@ -639,6 +639,7 @@ class FirstRefProp(EpochMixin):
 
         For files:
             :func:`dxltieclient.client.TieClient.get_file_first_references`
+            :func:`dxltieclient.client.TieClient.iter_file_first_references`
 
         For certificates:
             :func:`dxltieclient.client.TieClient.get_certificate_first_references`
@@ -833,3 +834,49 @@ class FileType(object):
     APK = 1073741824
     CLASS = 2147483648
     JAR = 4328554496
+
+
+class ResultMode(object):
+    """
+    Constants that are used to indicate the form of the `reputations` returned by the
+    :class:`dxltieclient.client.TieClient` (see the ``result_mode`` property).
+
+        +--------+-------------------------------------------------------------------------------+
+        | Mode   | Description                                                                   |
+        +========+===============================================================================+
+        | DICT   | Reputations are returned as nested ``dict`` (dictionary) objects (default).   |
+        +--------+-------------------------------------------------------------------------------+
+        | OBJECT | Reputations are returned as :class:`dxltieclient.reputation.ReputationSet`    |
+        |        | objects containing compact :class:`dxltieclient.reputation.Reputation`        |
+        |        | objects.                                                                      |
+        +--------+-------------------------------------------------------------------------------+
+        | LAZY   | Reputations are returned as                                                   |
+        |        | :class:`dxltieclient.reputation.LazyReputationSet` objects which keep the raw |
+        |        | response payload and only decode the reputations that are accessed.           |
+        +--------+-------------------------------------------------------------------------------+
+    """
+    DICT = "dict"
+    OBJECT = "object"
+    LAZY = "lazy"
+
+
+class OverflowPolicy(object):
+    """
+    Constants that are used to indicate how a :class:`dxltieclient.callbacks.QueuedDetectionCallback`
+    handles events that are received while its queue is full.
+
+        +-------------+--------------------------------------------------------------------------+
+        | Policy      | Description                                                              |
+        +=============+==========================================================================+
+        | BLOCK       | The thread delivering the event waits until there is room in the queue   |
+        |             | (default).                                                               |
+        +-------------+--------------------------------------------------------------------------+
+        | DROP_OLDEST | The oldest event in the queue is discarded to make room for the event.   |
+        +-------------+--------------------------------------------------------------------------+
+        | SPILL       | The event is written to a temporary file on disk and delivered once the  |
+        |             | events that precede it have been delivered.                              |
+        +-------------+--------------------------------------------------------------------------+
+    """
+    BLOCK = "block"
+    DROP_OLDEST = "dropOldest"
+    SPILL = "spill"
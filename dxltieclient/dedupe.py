@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+################################################################################
+# Copyright (c) 2017 McAfee LLC - All Rights Reserved.
+################################################################################
+
+from __future__ import absolute_import
+
+import hashlib
+import re
+import threading
+import time
+
+from .cache import _LruTtlStore, _MISSING
+from .codec import _strip_payload
+from .filters import _SYSTEM_GUID_PATTERN, _to_bytes
+
+# Matches the (base64) value of a hash in a raw event payload
+_HASH_VALUE_PATTERN = re.compile(br'"value"\s*:\s*"([^"]*)"')
+
+
+def _hash_values(payload):
+    """
+    Returns the set of hash values contained in the specified raw event payload
+    :param payload: The raw event payload (``bytes``)
+    :return: A ``frozenset`` of the `base64` hash values (without escaped "/" characters)
+    """
+    return frozenset(value.replace(b"\\/", b"/") for value in _HASH_VALUE_PATTERN.findall(payload))
+
+
+class EventDeduplicator(object):
+    """
+    A bounded, time-limited record of the events recently delivered to the event callbacks, which is used
+    to discard duplicate events (for example, the same event received through multiple brokers). See the
+    ``deduplicator`` constructor parameter of :class:`dxltieclient.callbacks.ReputationChangeCallback` and
+    :class:`dxltieclient.callbacks.FirstInstanceCallback`.
+
+    Events are identified from their raw payloads, so that duplicates are discarded without being decoded:
+
+        * `Reputation change` events are identified by a digest of their entire payload, so that only
+          events that are byte-for-byte identical are considered duplicates (distinct changes to the same
+          file, even within the same second, are always delivered).
+        * `First instance` events are identified by their system GUID and hashes.
+
+    An event is a duplicate if an event with the same identity was seen within the ``window`` (in
+    seconds). When ``max_size`` identities are held, the least recently seen identity is forgotten.
+    Events whose identity can not be determined (for example, `first instance` events without a system
+    GUID) are always delivered.
+
+    A single deduplicator can be shared by multiple callbacks.
+
+    **Example Usage**
+
+        .. code-block:: python
+
+            # Discard reputation changes received again within 2 minutes
+            rep_change_callback = MyReputationChangeCallback(deduplicator=EventDeduplicator(120))
+
+            tie_client.add_file_reputation_change_callback(rep_change_callback)
+
+            print("duplicates: {0}".format(rep_change_callback.deduplicator.duplicates))
+    """
+
+    #: The default number of seconds an event identity is remembered
+    DEFAULT_WINDOW = 60
+    #: The default maximum number of event identities remembered
+    DEFAULT_MAX_SIZE = 10000
+
+    def __init__(self, window=DEFAULT_WINDOW, max_size=DEFAULT_MAX_SIZE):
+        """
+        Constructor parameters:
+
+        :param window: The number of seconds an event identity is remembered (defaults to ``60``)
+        :param max_size: The maximum number of event identities remembered (defaults to ``10000``)
+        """
+        if max_size < 1:
+            raise ValueError("Maximum size must be greater than 0")
+        self._lock = threading.Lock()
+        self._store = _LruTtlStore(max_size, window)
+        self._duplicates = 0
+
+    @staticmethod
+    def make_rep_change_key(payload):
+        """
+        Returns the identity of the `reputation change` event with the specified raw payload
+
+        :param payload: The raw event payload
+        :return: The identity of the event (a digest of the payload, without trailing NUL characters)
+        """
+        payload = _strip_payload(payload)
+        if not isinstance(payload, (bytes, bytearray, memoryview)):
+            payload = payload.encode("utf-8")
+        return hashlib.sha1(payload).digest()
+
+    @staticmethod
+    def make_first_instance_key(payload):
+        """
+        Returns the identity of the `first instance` event with the specified raw payload
+
+        :param payload: The raw event payload
+        :return: The identity of the event (``None`` if it can not be determined)
+        """
+        payload = _to_bytes(payload)
+        system_guid = _SYSTEM_GUID_PATTERN.search(payload)
+        if system_guid is None:
+            return None
+        return system_guid.group(1).lower(), _hash_values(payload)
+
+    @property
+    def window(self):
+        """
+        The number of seconds an event identity is remembered
+        """
+        return self._store.ttl
+
+    @property
+    def max_size(self):
+        """
+        The maximum number of event identities remembered
+        """
+        return self._store.max_size
+
+    @property
+    def size(self):
+        """
+        The number of event identities currently remembered (including expired identities that have not
+        been purged yet)
+        """
+        with self._lock:
+            return len(self._store)
+
+    @property
+    def duplicates(self):
+        """
+        The number of duplicate events that have been discarded
+        """
+        return self._duplicates
+
+    def is_duplicate(self, key):
+        """
+        Returns whether an event with the specified identity was seen within the window. If not, the
+        identity is remembered.
+
+        :param key: The identity of the event (see :func:`make_rep_change_key` and
+            :func:`make_first_instance_key`)
+        :return: Whether the event is a duplicate
+        """
+        now = time.time()
+        with self._lock:
+            seen, _ = self._store.get(key, now)
+            if seen is not _MISSING:
+                self._duplicates += 1
+                return True
+            self._store.put(key, True, now)
+            return False
+
+    def clear(self):
+        """
+        Forgets all of the event identities
+        """
+        with self._lock:
+            self._store.clear()
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+################################################################################
+# Copyright (c) 2017 McAfee LLC - All Rights Reserved.
+################################################################################
+
+from __future__ import absolute_import
+
+import re
+
+from .constants import DetectionEventProp, RepChangeEventProp, ReputationProp
+from .hashes import _hex_to_base64
+
+# Matches the value of a local reputation or trust level property in a raw event payload
+_TRUST_LEVEL_PATTERN = re.compile(br'"(?:localReputation|trustLevel)"\s*:\s*(-?\d+)')
+# Matches the value of a system GUID property in a raw event payload
+_SYSTEM_GUID_PATTERN = re.compile(br'"agentGuid"\s*:\s*"([^"]*)"')
+
+
+def _to_bytes(payload):
+    """
+    Returns the specified raw event payload as ``bytes``
+    :param payload: The payload (``bytes``, ``bytearray``, ``memoryview`` or ``str``)
+    :return: The payload as ``bytes`` (or ``bytearray``)
+    """
+    if isinstance(payload, (bytes, bytearray)):
+        return payload
+    if isinstance(payload, memoryview):
+        return payload.tobytes()
+    return payload.encode("utf-8")
+
+
+class EventFilter(object):
+    """
+    Base class for the declarative filters that can be attached to the event callbacks (see the ``filters``
+    constructor parameter of :class:`dxltieclient.callbacks.ReputationChangeCallback`,
+    :class:`dxltieclient.callbacks.DetectionCallback` and :class:`dxltieclient.callbacks.FirstInstanceCallback`).
+
+    An event is only delivered if it matches all of the filters attached to the callback. Filters are
+    evaluated in two stages, so that rejected events are discarded as cheaply as possible:
+
+        * :func:`matches_payload` scans the raw (undecoded) event payload. It returns ``False`` if the event
+          can not match, and ``True`` if it may match.
+        * :func:`matches` examines the decoded event, before any transformations (such as the conversion of
+          hashes from `base64` to `hex`) are performed.
+    """
+
+    def matches_payload(self, payload):
+        """
+        Returns whether the event with the specified raw payload may match the filter
+
+        :param payload: The raw event payload (``bytes``)
+        :return: ``False`` if the event does not match the filter, ``True`` if it may match
+        """
+        return True
+
+    def matches(self, event_dict):
+        """
+        Returns whether the specified decoded event matches the filter
+
+        :param event_dict: The decoded event in standard TIE format (hashes are `base64` encoded, and
+            reputations are in a ``list``)
+        :return: Whether the event matches the filter
+        """
+        raise NotImplementedError("Must be implemented in a child class.")
+
+
+class TrustLevelFilter(EventFilter):
+    """
+    Filter matching events by `trust level` (see :class:`dxltieclient.constants.TrustLevel`).
+
+    For detection events, the `local reputation` of the file is compared. For reputation change events, the
+    `trust level` of the new reputations is compared (only the reputation from the specified `provider` if
+    ``provider_id`` is specified). The event matches if any of the compared values is within the range.
+
+    **Example Usage**
+
+        .. code-block:: python
+
+            # Only deliver detections of files that are at most "might be malicious"
+            detection_callback = MyDetectionCallback(
+                filters=[TrustLevelFilter(max_trust_level=TrustLevel.MIGHT_BE_MALICIOUS)])
+    """
+
+    def __init__(self, min_trust_level=None, max_trust_level=None, provider_id=None):
+        """
+        Constructor parameters:
+
+        :param min_trust_level: The minimum `trust level` (inclusive, optional)
+        :param max_trust_level: The maximum `trust level` (inclusive, optional)
+        :param provider_id: The `provider` whose new reputation is compared for reputation change events
+            (optional, defaults to any provider)
+        """
+        if min_trust_level is None and max_trust_level is None:
+            raise ValueError("A minimum or maximum trust level must be specified")
+        self._min_trust_level = min_trust_level
+        self._max_trust_level = max_trust_level
+        self._provider_id = provider_id
+
+    def _in_range(self, trust_level):
+        """
+        Returns whether the specified trust level is within the range of the filter
+        :param trust_level: The trust level
+        :return: Whether the trust level is within the range
+        """
+        return (self._min_trust_level is None or trust_level >= self._min_trust_level) and \
+            (self._max_trust_level is None or trust_level <= self._max_trust_level)
+
+    def matches_payload(self, payload):
+        return any(self._in_range(int(value))
+                   for value in _TRUST_LEVEL_PATTERN.findall(_to_bytes(payload)))
+
+    def matches(self, event_dict):
+        if DetectionEventProp.LOCAL_REPUTATION in event_dict:
+            return self._in_range(int(event_dict[DetectionEventProp.LOCAL_REPUTATION]))
+        new_reputations = event_dict.get(RepChangeEventProp.NEW_REPUTATIONS) or {}
+        return any(self._in_range(int(reputation.get(ReputationProp.TRUST_LEVEL, 0)))
+                   for reputation in new_reputations.get("reputations", [])
+                   if self._provider_id is None or
+                   reputation.get(ReputationProp.PROVIDER_ID) == self._provider_id)
+
+
+class HashFilter(EventFilter):
+    """
+    Filter matching events for the files (or certificates) identified by a set of hash values (an
+    `allowlist`). The event matches if any of its hashes is in the set.
+
+    **Example Usage**
+
+        .. code-block:: python
+
+            # Only deliver reputation changes for notepad.exe
+            rep_change_callback = MyReputationChangeCallback(
+                filters=[HashFilter(["f2c7bb8acc97f92e987a2d4087d021b1"])])
+    """
+
+    def __init__(self, hashes):
+        """
+        Constructor parameters:
+
+        :param hashes: An iterable of the `hex` representation of the hash values (of any `hash type`)
+        """
+        # Hashes are carried in base64 form by the events (some encoders escape the "/" character)
+        self._values = frozenset(_hex_to_base64(hex_value.lower()) for hex_value in hashes)
+        self._pattern = re.compile(b"|".join(
+            re.escape(pattern.encode("ascii")) for value in sorted(self._values)
+            for pattern in set([value, value.replace("/", "\\/")])))
+
+    def matches_payload(self, payload):
+        return self._pattern.search(_to_bytes(payload)) is not None
+
+    def matches(self, event_dict):
+        return any(hash_value.get("value") in self._values
+                   for hash_value in event_dict.get(RepChangeEventProp.HASHES, []))
+
+
+class SystemGuidFilter(EventFilter):
+    """
+    Filter matching detection and first instance events by the GUID of the system on which they occurred.
+    GUIDs are compared without regard to case.
+
+    **Example Usage**
+
+        .. code-block:: python
+
+            # Only deliver detections from specific systems
+            detection_callback = MyDetectionCallback(
+                filters=[SystemGuidFilter(["{68125cd6-a5d8-11e6-348e-000c29663178}"])])
+    """
+
+    def __init__(self, system_guids):
+        """
+        Constructor parameters:
+
+        :param system_guids: An iterable of system GUIDs
+        """
+        self._system_guids = frozenset(system_guid.lower() for system_guid in system_guids)
+
+    def matches_payload(self, payload):
+        return any(system_guid.decode("utf-8").lower() in self._system_guids
+                   for system_guid in _SYSTEM_GUID_PATTERN.findall(_to_bytes(payload)))
+
+    def matches(self, event_dict):
+        system_guid = event_dict.get(DetectionEventProp.SYSTEM_GUID)
+        return system_guid is not None and system_guid.lower() in self._system_guids
@@ -0,0 +1,412 @@
+# -*- coding: utf-8 -*-
+################################################################################
+# Copyright (c) 2017 McAfee LLC - All Rights Reserved.
+################################################################################
+
+from __future__ import absolute_import
+
+import binascii
+import threading
+from collections import OrderedDict
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping  # pylint: disable=deprecated-class
+
+from .constants import HashType
+
+# The length (in bytes) of the value for each supported hash type
+_HASH_LENGTHS = {
+    HashType.MD5: 16,
+    HashType.SHA1: 20,
+    HashType.SHA256: 32
+}
+
+
+def _bytes_to_base64(raw_value):
+    """
+    Converts from a raw (binary) hash value to a base64 string
+    :param raw_value: The raw value (``bytes``)
+    :return: The corresponding base64 string
+    """
+    # Strip the trailing newline appended by the encoder
+    return binascii.b2a_base64(raw_value)[:-1].decode("ascii")
+
+
+def _hex_to_base64(hex_value):
+    """
+    Converts from a hex string to a base64 string
+    :param hex_value: The hex value
+    :return: The corresponding base64 string
+    """
+    return _bytes_to_base64(binascii.unhexlify(hex_value))
+
+
+def _base64_to_hex(base64_value):
+    """
+    Converts from a base64 value to a hex string
+    :param base64_value: The base64 value
+    :return: The corresponding hex string
+    """
+    return binascii.hexlify(binascii.a2b_base64(base64_value)).decode("ascii")
+
+
+class HashMemo(object):
+    """
+    Bounded memo table for the conversions of hash values between their `hex` representation (used by the
+    client API) and their `base64` representation (used by the TIE server).
+
+    Once registered via :func:`dxltieclient.client.TieClient.set_hash_memo`, the memo is shared by all
+    request builders and event callbacks, so that repeated conversions of the same hash values are
+    satisfied by a dictionary lookup. When a conversion table is full, the oldest entry is discarded.
+
+    The :attr:`hits`, :attr:`misses` and :attr:`hit_rate` properties can be used to size the memo.
+    Hits are counted without locking, so the statistics may be slightly approximate when the memo is
+    used heavily from multiple threads.
+
+    **Example Usage**
+
+        .. code-block:: python
+
+            hash_memo = HashMemo(max_size=50000)
+            TieClient.set_hash_memo(hash_memo)
+
+            ...
+
+            print("Hash memo hit rate: {0:.1%}".format(hash_memo.hit_rate))
+    """
+
+    def __init__(self, max_size=100000):
+        """
+        Constructor parameters:
+
+        :param max_size: The maximum number of conversions held for each direction (hex to base64
+            and base64 to hex)
+        """
+        if max_size < 1:
+            raise ValueError("Maximum size must be greater than 0")
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        self._to_base64 = OrderedDict()
+        self._to_hex = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+    @property
+    def max_size(self):
+        """
+        The maximum number of conversions held for each direction
+        """
+        return self._max_size
+
+    @property
+    def size(self):
+        """
+        The number of conversions currently held by the memo
+        """
+        return len(self._to_base64) + len(self._to_hex)
+
+    @property
+    def hits(self):
+        """
+        The number of conversions that were satisfied by the memo
+        """
+        return self._hits
+
+    @property
+    def misses(self):
+        """
+        The number of conversions that had to be computed
+        """
+        return self._misses
+
+    @property
+    def hit_rate(self):
+        """
+        The fraction of conversions that were satisfied by the memo (``0.0`` if no conversions have
+        been performed)
+        """
+        total = self._hits + self._misses
+        return float(self._hits) / total if total else 0.0
+
+    def hex_to_base64(self, hex_value):
+        """
+        Converts from a hex string to a base64 string
+
+        :param hex_value: The hex value
+        :return: The corresponding base64 string
+        """
+        result = self._to_base64.get(hex_value)
+        if result is None:
+            return self._convert(self._to_base64, hex_value, _hex_to_base64)
+        self._hits += 1
+        return result
+
+    def base64_to_hex(self, base64_value):
+        """
+        Converts from a base64 value to a hex string
+
+        :param base64_value: The base64 value
+        :return: The corresponding hex string
+        """
+        result = self._to_hex.get(base64_value)
+        if result is None:
+            return self._convert(self._to_hex, base64_value, _base64_to_hex)
+        self._hits += 1
+        return result
+
+    def clear(self):
+        """
+        Removes all conversions from the memo and resets its statistics
+        """
+        with self._lock:
+            self._to_base64.clear()
+            self._to_hex.clear()
+            self._hits = 0
+            self._misses = 0
+
+    def _convert(self, table, value, convert):
+        """
+        Converts the specified value and stores the result in the specified table
+        :param table: The conversion table
+        :param value: The value to convert
+        :param convert: The conversion function
+        :return: The converted value
+        """
+        # Invalid values raise here and are not stored
+        result = convert(value)
+        with self._lock:
+            self._misses += 1
+            if value not in table:
+                if len(table) >= self._max_size:
+                    table.popitem(last=False)
+                table[value] = result
+        return result
+
+
+class FileHashes(Mapping):
+    """
+    Immutable set of hashes that identify a file.
+
+    The hashes are validated and normalized once, when the object is constructed: `hash types` and `hex`
+    values are converted to lower case, the length of each value is checked against its `hash type`
+    (see :class:`dxltieclient.constants.HashType`), and the raw bytes of each value are stored.
+
+    A :class:`FileHashes` object is a read-only ``dict``-like mapping of `hash type` to `hex` value, so it
+    can be passed to every :class:`dxltieclient.client.TieClient` method in place of a hashes ``dict``
+    (dictionary). It is also hashable, so it can be used as a ``dict`` key or ``set`` member. Requests and
+    cache lookups for a :class:`FileHashes` object reuse its stored bytes and cache key rather than parsing
+    the hashes again.
+
+    **Example Usage**
+
+        .. code-block:: python
+
+            notepad_hashes = FileHashes({
+                HashType.MD5: "f2c7bb8acc97f92e987a2d4087d021b1",
+                HashType.SHA1: "7eb0139d2175739b3ccb0d1110067820be6abd29"
+            })
+
+            reputations_dict = tie_client.get_file_reputation(notepad_hashes)
+    """
+    # Instances have no per-instance __dict__ on Python 3 only: on Python 2, collections.Mapping does not
+    # define __slots__, so the slots do not reduce the size of instances
+    __slots__ = ("_hashes", "_key")
+
+    def __init__(self, hashes=None, md5=None, sha1=None, sha256=None):
+        """
+        Constructor parameters:
+
+        :param hashes: A ``dict`` (dictionary) of hashes where the ``key`` is the `hash type` and the
+            ``value`` is the `hex` representation of the hash value (optional)
+        :param md5: The `hex` representation of the MD5 hash value (optional)
+        :param sha1: The `hex` representation of the SHA-1 hash value (optional)
+        :param sha256: The `hex` representation of the SHA-256 hash value (optional)
+        """
+        if isinstance(hashes, FileHashes) and md5 is None and sha1 is None and sha256 is None:
+            # Already validated
+            self._hashes = hashes._hashes
+            self._key = hashes._key
+            return
+
+        parsed = {}
+        for hash_type, hex_value in list(hashes.items() if hashes else []) + \
+                [(HashType.MD5, md5), (HashType.SHA1, sha1), (HashType.SHA256, sha256)]:
+            if hex_value is None:
+                continue
+            hash_type, hex_value, raw_value = FileHashes._parse(hash_type, hex_value)
+            if parsed.get(hash_type, (hex_value,))[0] != hex_value:
+                raise ValueError("Conflicting values for hash type: " + hash_type)
+            parsed[hash_type] = (hex_value, raw_value)
+
+        if not parsed:
+            raise ValueError("File hashes were not specified")
+
+        # Tuple of (hash type, hex value, raw value), ordered by hash type
+        self._hashes = tuple((hash_type,) + parsed[hash_type] for hash_type in sorted(parsed))
+        self._key = frozenset((hash_type, hex_value) for hash_type, hex_value, _ in self._hashes)
+
+    @staticmethod
+    def _parse(hash_type, hex_value):
+        """
+        Validates and normalizes the specified hash
+        :param hash_type: The hash type
+        :param hex_value: The hex hash value
+        :return: A tuple of the normalized hash type, normalized hex value, and raw value
+        """
+        normalized_type = str(hash_type).lower()
+        length = _HASH_LENGTHS.get(normalized_type)
+        if length is None:
+            raise ValueError("Unsupported hash type: " + str(hash_type))
+        try:
+            if len(hex_value) != 2 * length:
+                raise ValueError()
+            raw_value = binascii.unhexlify(hex_value)
+        except (TypeError, ValueError):
+            raise ValueError("Invalid " + normalized_type + " hash value: " + repr(hex_value))
+        return normalized_type, binascii.hexlify(raw_value).decode("ascii"), raw_value
+
+    def __getitem__(self, hash_type):
+        try:
+            normalized_type = hash_type.lower()
+        except AttributeError:
+            raise KeyError(hash_type)
+        for entry in self._hashes:
+            if entry[0] == normalized_type:
+                return entry[1]
+        raise KeyError(hash_type)
+
+    def __iter__(self):
+        return iter([entry[0] for entry in self._hashes])
+
+    def __len__(self):
+        return len(self._hashes)
+
+    def __hash__(self):
+        return hash(self._key)
+
+    def __eq__(self, other):
+        if isinstance(other, FileHashes):
+            return self._key == other._key
+        return Mapping.__eq__(self, other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __reduce__(self):
+        return FileHashes, (self.to_dict(),)
+
+    def __repr__(self):
+        return "FileHashes(" + repr(self.to_dict()) + ")"
+
+    @property
+    def md5(self):
+        """
+        The `hex` representation of the MD5 hash value (``None`` if not specified)
+        """
+        return self.get(HashType.MD5)
+
+    @property
+    def sha1(self):
+        """
+        The `hex` representation of the SHA-1 hash value (``None`` if not specified)
+        """
+        return self.get(HashType.SHA1)
+
+    @property
+    def sha256(self):
+        """
+        The `hex` representation of the SHA-256 hash value (``None`` if not specified)
+        """
+        return self.get(HashType.SHA256)
+
+    @property
+    def cache_key(self):
+        """
+        The key identifying these hashes in a :class:`dxltieclient.cache.ReputationCache`
+        """
+        return self._key
+
+    def get_bytes(self, hash_type):
+        """
+        Returns the raw bytes of the value for the specified `hash type`
+
+        :param hash_type: The `hash type`
+        :return: The raw bytes of the hash value (``None`` if not specified)
+        """
+        normalized_type = hash_type.lower()
+        for entry in self._hashes:
+            if entry[0] == normalized_type:
+                return entry[2]
+        return None
+
+    def to_dict(self):
+        """
+        Returns the hashes as a ``dict`` (dictionary) where the ``key`` is the `hash type` and the
+        ``value`` is the `hex` representation of the hash value
+
+        :return: The hashes ``dict`` (dictionary)
+        """
+        return {hash_type: hex_value for hash_type, hex_value, _ in self._hashes}
+
+
+class LazyHashes(Mapping):
+    """
+    Read-only ``dict``-like mapping of `hash type` to `hex` value for hashes received in an event, which are
+    only converted from their `base64` representation (used by the TIE server) when first accessed.
+
+    Instances are provided in place of the hashes ``dict`` (dictionary) objects by the event callbacks when
+    ``lazy_hashes`` is enabled (see :class:`dxltieclient.callbacks.ReputationChangeCallback`), so that
+    handlers which do not read the hashes do not pay for their conversion. As a :class:`LazyHashes` object
+    is not a ``dict``, it must be converted (via ``dict(hashes)`` or :func:`to_dict`) before being
+    serialized (for example, as JSON).
+    """
+    # As for FileHashes, the slots only avoid a per-instance __dict__ on Python 3
+    __slots__ = ("_payload", "_hashes")
+
+    def __init__(self, hashes_payload):
+        """
+        Constructor parameters:
+
+        :param hashes_payload: The list of hashes in standard TIE format (``type`` and `base64` ``value``)
+        """
+        self._payload = hashes_payload
+        self._hashes = None
+
+    def _get_hashes(self):
+        """
+        Returns the converted hashes, converting them if necessary
+        :return: The ``dict`` (dictionary) of hashes
+        """
+        hashes = self._hashes
+        if hashes is None:
+            from .client import TieClient
+            hashes = self._hashes = TieClient._transform_hashes(self._payload)
+            # The payload is no longer needed once converted
+            self._payload = None
+        return hashes
+
+    def __getitem__(self, hash_type):
+        return self._get_hashes()[hash_type]
+
+    def __iter__(self):
+        return iter(self._get_hashes())
+
+    def __len__(self):
+        return len(self._get_hashes())
+
+    def __reduce__(self):
+        return dict, (self._get_hashes(),)
+
+    def __repr__(self):
+        return "LazyHashes(" + repr(self._get_hashes()) + ")"
+
+    def to_dict(self):
+        """
+        Returns the hashes as a ``dict`` (dictionary) where the ``key`` is the `hash type` and the ``value``
+        is the `hex` representation of the hash value
+
+        :return: The hashes ``dict`` (dictionary)
+        """
+        return dict(self._get_hashes())
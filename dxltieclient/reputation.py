@@ -0,0 +1,348 @@
+# -*- coding: utf-8 -*-
+################################################################################
+# Copyright (c) 2017 McAfee LLC - All Rights Reserved.
+################################################################################
+
+from __future__ import absolute_import
+
+import copy
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping  # pylint: disable=deprecated-class
+
+try:
+    from sys import intern as _intern
+except ImportError:
+    _intern = intern  # pylint: disable=undefined-variable,invalid-name
+
+from .codec import get_default_codec
+from .constants import ReputationProp, TrustLevel, CertReputationProp, CertReputationOverriddenProp
+
+# The standard reputation properties which are held in dedicated slots
+_STANDARD_PROPS = frozenset([
+    ReputationProp.PROVIDER_ID,
+    ReputationProp.TRUST_LEVEL,
+    ReputationProp.CREATE_DATE,
+    ReputationProp.ATTRIBUTES
+])
+
+
+class Reputation(object):
+    """
+    Compact representation of a single `reputation` from a particular `reputation provider`.
+
+    Instances are returned (within a :class:`ReputationSet`) when the `result mode` of the
+    :class:`dxltieclient.client.TieClient` is :attr:`dxltieclient.constants.ResultMode.OBJECT`.
+
+    The `provider`, `trust level` and `creation date` are held as ``int`` values. The provider-specific
+    attributes are held in a compact form and are only decoded when they are accessed, using the constants
+    from the :class:`dxltieclient.constants.FileEnterpriseAttrib`, :class:`dxltieclient.constants.FileGtiAttrib`,
+    :class:`dxltieclient.constants.CertEnterpriseAttrib`, :class:`dxltieclient.constants.CertGtiAttrib` or
+    :class:`dxltieclient.constants.AtdAttrib` constants classes.
+
+    **Example Usage**
+
+        .. code-block:: python
+
+            ent_rep = reputation_set[FileProvider.ENTERPRISE]
+            trust_level = ent_rep.trust_level
+            prevalence = ent_rep.get_int_attribute(FileEnterpriseAttrib.PREVALENCE)
+    """
+    __slots__ = ("provider_id", "trust_level", "create_date", "_attributes", "_extra")
+
+    def __init__(self, provider_id, trust_level=TrustLevel.NOT_SET, create_date=0, attributes=None, extra=None):
+        """
+        Constructor parameters:
+
+        :param provider_id: The identifier of the `reputation provider`
+        :param trust_level: The `trust level` (see :class:`dxltieclient.constants.TrustLevel`)
+        :param create_date: The creation date of the reputation (epoch seconds)
+        :param attributes: A ``dict`` (dictionary) of provider-specific attributes (optional)
+        :param extra: A ``dict`` (dictionary) of additional properties, such as the overridden files of
+            a certificate reputation (optional)
+        """
+        #: The identifier of the `reputation provider`
+        self.provider_id = int(provider_id)
+        #: The `trust level` (see :class:`dxltieclient.constants.TrustLevel`)
+        self.trust_level = int(trust_level)
+        #: The creation date of the reputation (epoch seconds)
+        self.create_date = int(create_date)
+        # Attribute names and values, flattened into a single tuple
+        self._attributes = tuple(
+            item for name, value in (attributes or {}).items() for item in (_intern(str(name)), value))
+        self._extra = extra or None
+
+    @staticmethod
+    def from_dict(reputation_dict):
+        """
+        Creates a :class:`Reputation` from a reputation ``dict`` (dictionary) as returned by
+        :func:`dxltieclient.client.TieClient.get_file_reputation`
+
+        :param reputation_dict: The reputation ``dict`` (dictionary)
+        :return: The :class:`Reputation`
+        """
+        extra = {name: value for name, value in reputation_dict.items() if name not in _STANDARD_PROPS}
+        return Reputation(
+            reputation_dict[ReputationProp.PROVIDER_ID],
+            reputation_dict.get(ReputationProp.TRUST_LEVEL, TrustLevel.NOT_SET),
+            reputation_dict.get(ReputationProp.CREATE_DATE, 0),
+            reputation_dict.get(ReputationProp.ATTRIBUTES),
+            copy.deepcopy(extra) if extra else None)
+
+    @staticmethod
+    def _from_payload(reputation_dict):
+        """
+        Creates a :class:`Reputation` from a reputation in standard TIE format, keeping its attributes
+        ``dict`` (dictionary) as is
+        :param reputation_dict: The reputation in standard TIE format
+        :return: The :class:`Reputation`
+        """
+        from .client import TieClient
+
+        reputation = Reputation.__new__(Reputation)
+        reputation.provider_id = int(reputation_dict[ReputationProp.PROVIDER_ID])
+        reputation.trust_level = int(reputation_dict.get(ReputationProp.TRUST_LEVEL, TrustLevel.NOT_SET))
+        reputation.create_date = int(reputation_dict.get(ReputationProp.CREATE_DATE, 0))
+        reputation._attributes = reputation_dict.get(ReputationProp.ATTRIBUTES) or {}
+        extra = {name: value for name, value in reputation_dict.items() if name not in _STANDARD_PROPS}
+        # Transform file overrides (if applicable). The decoded payload may be shared by concurrent
+        # accesses, so the transformed overrides are copies rather than modified in place.
+        overridden = extra.get(CertReputationProp.OVERRIDDEN)
+        if overridden and CertReputationOverriddenProp.FILES in overridden:
+            overridden = dict(overridden)
+            overridden[CertReputationOverriddenProp.FILES] = [
+                dict(file_dict, hashes=TieClient._transform_hashes(file_dict["hashes"]))
+                if "hashes" in file_dict else file_dict
+                for file_dict in overridden[CertReputationOverriddenProp.FILES]]
+            extra[CertReputationProp.OVERRIDDEN] = overridden
+        reputation._extra = extra or None
+        return reputation
+
+    @property
+    def attributes(self):
+        """
+        A ``dict`` (dictionary) containing the provider-specific attributes of the reputation
+        """
+        attributes = self._attributes
+        if isinstance(attributes, dict):
+            return dict(attributes)
+        return dict(zip(attributes[::2], attributes[1::2]))
+
+    def get_attribute(self, attrib, default=None):
+        """
+        Returns the value of the specified provider-specific attribute
+
+        :param attrib: The attribute (for example, ``FileEnterpriseAttrib.PREVALENCE``)
+        :param default: The value to return if the attribute is not present
+        :return: The (string) value of the attribute
+        """
+        attributes = self._attributes
+        if isinstance(attributes, dict):
+            return attributes.get(attrib, default)
+        for index in range(0, len(attributes), 2):
+            if attributes[index] == attrib:
+                return attributes[index + 1]
+        return default
+
+    def get_int_attribute(self, attrib, default=None):
+        """
+        Returns the value of the specified provider-specific attribute as an ``int``
+
+        :param attrib: The attribute (for example, ``FileEnterpriseAttrib.PREVALENCE``)
+        :param default: The value to return if the attribute is not present
+        :return: The ``int`` value of the attribute
+        """
+        value = self.get_attribute(attrib)
+        return default if value is None else int(value)
+
+    def get_property(self, prop, default=None):
+        """
+        Returns the value of an additional reputation property, such as
+        :attr:`dxltieclient.constants.CertReputationProp.OVERRIDDEN`
+
+        :param prop: The property
+        :param default: The value to return if the property is not present
+        :return: The value of the property
+        """
+        return self._extra.get(prop, default) if self._extra else default
+
+    def to_dict(self):
+        """
+        Returns the reputation in the ``dict`` (dictionary) form returned by
+        :func:`dxltieclient.client.TieClient.get_file_reputation`
+
+        :return: The reputation ``dict`` (dictionary)
+        """
+        reputation_dict = copy.deepcopy(self._extra) if self._extra else {}
+        reputation_dict[ReputationProp.PROVIDER_ID] = self.provider_id
+        reputation_dict[ReputationProp.TRUST_LEVEL] = self.trust_level
+        reputation_dict[ReputationProp.CREATE_DATE] = self.create_date
+        reputation_dict[ReputationProp.ATTRIBUTES] = self.attributes
+        return reputation_dict
+
+    def __eq__(self, other):
+        if not isinstance(other, Reputation):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "Reputation(provider_id={0}, trust_level={1}, create_date={2})".format(
+            self.provider_id, self.trust_level, self.create_date)
+
+
+class ReputationSet(Mapping):
+    """
+    The `reputations` of a file or certificate, as a read-only mapping of `provider` identifier to
+    :class:`Reputation`.
+
+    Instances are returned when the `result mode` of the :class:`dxltieclient.client.TieClient` is
+    :attr:`dxltieclient.constants.ResultMode.OBJECT`.
+
+    **Example Usage**
+
+        .. code-block:: python
+
+            tie_client.result_mode = ResultMode.OBJECT
+            reputation_set = tie_client.get_file_reputation(hashes)
+
+            # Trust level of the Enterprise reputation (if present)
+            trust_level = reputation_set.get_trust_level(FileProvider.ENTERPRISE)
+
+            # Convert to the standard dict form
+            reputations_dict = reputation_set.to_dict()
+    """
+    # The slots only avoid a per-instance __dict__ on Python 3 (collections.Mapping does not define
+    # __slots__ on Python 2)
+    __slots__ = ("_reputations",)
+
+    def __init__(self, reputations=()):
+        """
+        Constructor parameters:
+
+        :param reputations: An iterable of :class:`Reputation` (optional)
+        """
+        self._reputations = tuple(sorted(reputations, key=lambda reputation: reputation.provider_id))
+
+    @staticmethod
+    def from_dict(reputations_dict):
+        """
+        Creates a :class:`ReputationSet` from a reputations ``dict`` (dictionary) as returned by
+        :func:`dxltieclient.client.TieClient.get_file_reputation`
+
+        :param reputations_dict: The reputations ``dict`` (dictionary)
+        :return: The :class:`ReputationSet`
+        """
+        return ReputationSet(Reputation.from_dict(reputation) for reputation in reputations_dict.values())
+
+    def __getitem__(self, provider_id):
+        for reputation in self._reputations:
+            if reputation.provider_id == provider_id:
+                return reputation
+        raise KeyError(provider_id)
+
+    def __iter__(self):
+        return iter([reputation.provider_id for reputation in self._reputations])
+
+    def __len__(self):
+        return len(self._reputations)
+
+    def __repr__(self):
+        return type(self).__name__ + "(" + repr([self[provider_id] for provider_id in self]) + ")"
+
+    def get_trust_level(self, provider_id, default=TrustLevel.NOT_SET):
+        """
+        Returns the `trust level` of the reputation from the specified `provider`
+
+        :param provider_id: The identifier of the `reputation provider`
+        :param default: The value to return if there is no reputation from the provider
+        :return: The `trust level`
+        """
+        reputation = self.get(provider_id)
+        return default if reputation is None else reputation.trust_level
+
+    def to_dict(self):
+        """
+        Returns the reputations in the ``dict`` (dictionary) form returned by
+        :func:`dxltieclient.client.TieClient.get_file_reputation`
+
+        :return: The reputations ``dict`` (dictionary)
+        """
+        return {reputation.provider_id: reputation.to_dict() for reputation in self._reputations}
+
+
+class LazyReputationSet(ReputationSet):
+    """
+    A :class:`ReputationSet` that is decoded from the raw response payload on first access.
+
+    Instances are returned when the `result mode` of the :class:`dxltieclient.client.TieClient` is
+    :attr:`dxltieclient.constants.ResultMode.LAZY`. The payload is only decoded when the set is first
+    accessed, each :class:`Reputation` is only created when it is first accessed, and the attributes of
+    a reputation are kept as received. :func:`get_trust_level` reads the `trust level` without creating
+    a :class:`Reputation`.
+    """
+    __slots__ = ("_payload", "_codec", "_entries")
+
+    def __init__(self, payload, codec=None):
+        """
+        Constructor parameters:
+
+        :param payload: The raw (JSON) payload of the reputations response
+        :param codec: The JSON codec used to decode the payload (optional)
+        """
+        # pylint: disable=super-init-not-called
+        self._reputations = ()
+        self._payload = payload
+        self._codec = codec
+        self._entries = None
+
+    def _get_entries(self):
+        """
+        Returns the reputation entries, decoding the payload if necessary
+        :return: A ``dict`` (dictionary) of provider identifier to reputation in standard TIE format (or
+            :class:`Reputation` once accessed)
+        """
+        entries = self._entries
+        if entries is None:
+            payload = self._payload
+            if payload is None:
+                # Decoded by another thread in the meantime (the entries are set before the payload is
+                # released)
+                return self._entries
+            resp_dict = (self._codec or get_default_codec()).loads(payload)
+            entries = {reputation[ReputationProp.PROVIDER_ID]: reputation
+                       for reputation in resp_dict.get("reputations", [])}
+            self._entries = entries
+            # The payload is no longer needed once decoded
+            self._payload = None
+        return entries
+
+    def __getitem__(self, provider_id):
+        entries = self._get_entries()
+        entry = entries[provider_id]
+        if not isinstance(entry, Reputation):
+            entry = entries[provider_id] = Reputation._from_payload(entry)
+        return entry
+
+    def __iter__(self):
+        return iter(sorted(self._get_entries()))
+
+    def __len__(self):
+        return len(self._get_entries())
+
+    def get_trust_level(self, provider_id, default=TrustLevel.NOT_SET):
+        entry = self._get_entries().get(provider_id)
+        if entry is None:
+            return default
+        if isinstance(entry, Reputation):
+            return entry.trust_level
+        return int(entry.get(ReputationProp.TRUST_LEVEL, TrustLevel.NOT_SET))
+
+    def to_dict(self):
+        return {provider_id: self[provider_id].to_dict() for provider_id in self}
@@ -0,0 +1,113 @@
+# This sample compares the JSON codecs that can be used by the McAfee Threat
+# Intelligence Exchange (TIE) client (see dxltieclient.codec). For each of the
+# installed codecs, it measures the time taken to retrieve the reputation of a
+# file from the TIE DXL service (which includes encoding the request and
+# decoding the response), and the time taken by a reputation change callback to
+# decode a reputation change event.
+
+from __future__ import absolute_import
+from __future__ import print_function
+import os
+import sys
+import time
+
+from dxlclient.client import DxlClient
+from dxlclient.client_config import DxlClientConfig
+from dxlclient.message import Event
+from dxltieclient import TieClient, ReputationChangeCallback, JsonCodec, OrjsonCodec, UjsonCodec
+from dxltieclient.constants import HashType
+
+# Import common logging and configuration
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/..")
+from common import *
+
+# Configure local logger
+logging.getLogger().setLevel(logging.ERROR)
+logger = logging.getLogger(__name__)
+
+# Create DXL configuration from file
+config = DxlClientConfig.create_dxl_config_from_file(CONFIG_FILE)
+
+# The number of times each operation is measured
+ITERATIONS = 100
+
+# Hashes for the file to look up (notepad.exe)
+# These can be replaced by a file which is known to have run within the
+# enterprise for better results
+FILE_MD5 = "f2c7bb8acc97f92e987a2d4087d021b1"
+FILE_SHA1 = "7eb0139d2175739b3ccb0d1110067820be6abd29"
+FILE_SHA256 = "142e1d688ef0568370c37187fd9f2351d7ddeda574f8bfa9b0fa4ef42db85aa2"
+
+# A reputation change event for the file, as sent by the TIE DXL service
+# (the hashes are base64 encoded)
+REP_CHANGE_EVENT = {
+    "hashes": [
+        {"type": "md5", "value": "8se7isyX+S6Yei1Ah9AhsQ=="},
+        {"type": "sha1", "value": "frATnSF1c5s8yw0REAZ4IL5qvSk="},
+        {"type": "sha256", "value": "FC4daI7wVoNww3GH/Z8jUdfd7aV0+L+psPpO9C24WqI="}
+    ],
+    "newReputations": {
+        "reputations": [
+            {"attributes": {"2120340": "2139160704"}, "createDate": 1480455704,
+             "providerId": 1, "trustLevel": 99}
+        ]
+    },
+    "oldReputations": {
+        "reputations": [
+            {"attributes": {"2120340": "2139160704"}, "createDate": 1480455704,
+             "providerId": 1, "trustLevel": 85}
+        ]
+    },
+    "updateTime": 1481219581
+}
+
+
+class BenchmarkReputationChangeCallback(ReputationChangeCallback):
+    """
+    Reputation change callback that discards the (decoded) reputation changes
+    """
+    def on_reputation_change(self, rep_change_dict, original_event):
+        pass
+
+
+def measure(func, *args):
+    """
+    Returns the average time taken by the specified function (invoked with the
+    specified arguments), in microseconds
+    """
+    start = time.time()
+    for _ in range(ITERATIONS):
+        func(*args)
+    return (time.time() - start) / ITERATIONS * 1e6
+
+# Create the client
+with DxlClient(config) as client:
+
+    # Connect to the fabric
+    client.connect()
+
+    print("{0:<10}{1:>20}{2:>20}".format("Codec", "Reputation (us)", "Event (us)"))
+
+    for codec_class in (JsonCodec, OrjsonCodec, UjsonCodec):
+        try:
+            codec = codec_class()
+        except ImportError:
+            print(codec_class.__name__ + " is not available (package not installed)")
+            continue
+
+        # Create the McAfee Threat Intelligence Exchange (TIE) client using the codec
+        tie_client = TieClient(client, codec=codec)
+
+        # Create a reputation change callback using the codec
+        rep_change_callback = BenchmarkReputationChangeCallback(codec)
+        event = Event("/mcafee/event/tie/file/repchange/broadcast")
+        event.payload = codec.dumps(REP_CHANGE_EVENT)
+
+        print("{0:<10}{1:>20.2f}{2:>20.2f}".format(
+            codec.name,
+            measure(tie_client.get_file_reputation, {
+                HashType.MD5: FILE_MD5,
+                HashType.SHA1: FILE_SHA1,
+                HashType.SHA256: FILE_SHA256
+            }),
+            measure(rep_change_callback.on_event, event)))
@@ -67,14 +67,18 @@ setup(
     # Requirements
     install_requires=[
         "dxlbootstrap>=0.2.0",
-        "dxlclient>=4.1.0.184"
+        "dxlclient>=4.1.0.184",
+        "futures; python_version == '2.7'"
     ],
 
     tests_require=TEST_REQUIREMENTS,
 
     extras_require={
         "dev": DEV_REQUIREMENTS,
-        "test": TEST_REQUIREMENTS
+        "test": TEST_REQUIREMENTS,
+        "numpy": ["numpy"],
+        "orjson": ["orjson"],
+        "ujson": ["ujson"]
     },
 
     test_suite="nose.collector",
@@ -0,0 +1,138 @@
+"""
+Unit tests for the dxltieclient asyncio facade
+"""
+
+import sys
+from unittest import TestCase, skipIf
+
+from dxlclient.exceptions import WaitTimeoutException
+
+from dxltieclient import TieClient, ReputationCache
+from dxltieclient.batch import LookupResults
+from dxltieclient.client import TIE_GET_FILE_REPUTATION_TOPIC
+from tests import test_batch
+from tests.test_value_constants import *
+
+if sys.version_info >= (3, 5):
+    import asyncio  # pylint: disable=import-error
+    from dxltieclient.aio import AsyncTieClient
+
+
+@skipIf(sys.version_info < (3, 5), "asyncio facade requires Python 3.5 or later")
+class TestAsyncTieClient(TestCase):
+
+    @staticmethod
+    def run_loop(tie_client, func):
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(func(AsyncTieClient(tie_client, loop=loop)))
+        finally:
+            loop.close()
+
+    def test_getfilerep(self):
+        dxl_client = test_batch.FakeAsyncDxlClient(
+            create_response=test_batch.TestGetFileReputations.create_response)
+        tie_client = TieClient(dxl_client, file_reputation_cache=ReputationCache())
+
+        def lookup(async_tie_client):
+            return asyncio.gather(
+                async_tie_client.get_file_reputation(FILE_NOTEPAD_EXE_HASH_DICT),
+                async_tie_client.get_file_reputation(FILE_INVALID_HASH_DICT),
+                return_exceptions=True)
+
+        results = self.run_loop(tie_client, lookup)
+        self.assertEqual(
+            results[0][FileProvider.GTI][ReputationProp.TRUST_LEVEL],
+            TrustLevel.KNOWN_TRUSTED
+        )
+        self.assertIn("Could not find reputation", str(results[1]))
+
+        # Cached reputations are also delivered through the loop
+        results = self.run_loop(
+            tie_client,
+            lambda async_tie_client: async_tie_client.get_file_reputation(FILE_NOTEPAD_EXE_HASH_DICT))
+        self.assertIn(FileProvider.GTI, results)
+        self.assertEqual(len(dxl_client.requests), 2)
+
+    def test_timeout(self):
+        dxl_client = test_batch.FakeAsyncDxlClient(ignore_topic=TIE_GET_FILE_REPUTATION_TOPIC)
+        tie_client = TieClient(dxl_client)
+        tie_client._response_timeout = 0.05
+
+        with self.assertRaises(WaitTimeoutException):
+            self.run_loop(
+                tie_client,
+                lambda async_tie_client: async_tie_client.get_file_reputation(FILE_NOTEPAD_EXE_HASH_DICT))
+        # The response callback is unregistered
+        self.assertEqual(dxl_client.callback_count, 0)
+
+    def test_cancel(self):
+        dxl_client = test_batch.FakeAsyncDxlClient(ignore_topic=TIE_GET_FILE_REPUTATION_TOPIC)
+        futures = []
+
+        def lookup(async_tie_client):
+            futures.append(async_tie_client.get_file_reputation(FILE_NOTEPAD_EXE_HASH_DICT))
+            return asyncio.wait_for(futures[0], 0.05)
+
+        with self.assertRaises(asyncio.TimeoutError):
+            self.run_loop(TieClient(dxl_client), lookup)
+        self.assertTrue(futures[0].cancelled())
+        self.assertEqual(dxl_client.callback_count, 0)
+
+    def test_getfilereps(self):
+        dxl_client = test_batch.FakeAsyncDxlClient(
+            create_response=test_batch.TestGetFileReputations.create_response)
+        tie_client = TieClient(dxl_client)
+        hashes_list = [FILE_NOTEPAD_EXE_HASH_DICT, {HashType.MD5: "not a hash"}, FILE_INVALID_HASH_DICT,
+                       FILE_NOTEPAD_EXE_HASH_DICT, FILE_EICAR_HASH_DICT]
+
+        results = self.run_loop(
+            tie_client,
+            lambda async_tie_client: async_tie_client.get_file_reputations(hashes_list, max_in_flight=2))
+
+        self.assertIsInstance(results, LookupResults)
+        self.assertEqual(len(results), 5)
+        self.assertEqual(
+            results[0].value[FileProvider.GTI][ReputationProp.TRUST_LEVEL],
+            TrustLevel.KNOWN_TRUSTED
+        )
+        self.assertEqual(results[3].value, results[0].value)
+        self.assertIsNotNone(results[1].error)
+        self.assertIn("Could not find reputation", str(results[2].error))
+        self.assertIn("Could not find reputation", str(results[4].error))
+        # Identical hashes are only requested once, with at most max_in_flight requests outstanding
+        self.assertEqual(len(dxl_client.requests), 3)
+        self.assertLessEqual(dxl_client.max_outstanding, 2)
+        self.assertEqual(dxl_client.callback_count, 0)
+
+    def test_getcertreps(self):
+        dxl_client = test_batch.FakeAsyncDxlClient(
+            create_response=test_batch.TestGetCertReputations.create_response)
+        tie_client = TieClient(dxl_client)
+
+        results = self.run_loop(
+            tie_client,
+            lambda async_tie_client: async_tie_client.get_certificate_reputations([
+                (CERT_CERT1_SHA1, CERT_CERT1_PUBLIC_KEY_SHA1),
+                (CERT_INVALID_SHA1, None)
+            ]))
+
+        self.assertIn(CertProvider.ENTERPRISE, results[0].value)
+        self.assertIn("Could not find reputation", str(results[1].error))
+        self.assertEqual(len(results), 2)
+
+    def test_getfilereps_cancel(self):
+        dxl_client = test_batch.FakeAsyncDxlClient(ignore_topic=TIE_GET_FILE_REPUTATION_TOPIC)
+        futures = []
+
+        def lookup(async_tie_client):
+            futures.append(async_tie_client.get_file_reputations(
+                [FILE_NOTEPAD_EXE_HASH_DICT, FILE_EICAR_HASH_DICT, FILE_INVALID_HASH_DICT], max_in_flight=2))
+            return asyncio.wait_for(futures[0], 0.05)
+
+        with self.assertRaises(asyncio.TimeoutError):
+            self.run_loop(TieClient(dxl_client), lookup)
+        # The outstanding lookups are cancelled (and no further lookups are started)
+        self.assertTrue(futures[0].cancelled())
+        self.assertEqual(len(dxl_client.requests), 2)
+        self.assertEqual(dxl_client.callback_count, 0)
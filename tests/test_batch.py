@@ -0,0 +1,496 @@
+"""
+Unit tests for dxltieclient batch lookups
+"""
+
+import array
+import gc
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+from unittest import TestCase
+
+from mock import patch
+
+from dxlbootstrap.util import MessageUtils
+from dxlclient import Request, Response, ErrorResponse
+from dxlclient._request_manager import RequestManager
+from dxlclient.exceptions import WaitTimeoutException
+
+from dxltieclient import TieClient, ReputationCache
+from dxltieclient.batch import _FutureResponseCallback, _RequestDispatcher, _SingleFlight, _TimeoutScheduler, \
+    _timeout_scheduler, LookupResult, LookupResults
+from dxltieclient.client import TIE_GET_CERT_REPUTATION_TOPIC, FILE_COLUMN_ATTRIBUTES
+from dxltieclient.reputation import ReputationSet
+from tests.test_value_constants import *
+
+
+class FakeAsyncDxlClient(object):
+    """
+    Fake DXL client that answers asynchronous requests from separate threads, echoing the request
+    payload (or responding with an error for requests to the ``/error`` topic). Response callbacks are
+    registered with a DXL request manager, as with the real client.
+    """
+
+    def __init__(self, ignore_topic=None, create_response=None):
+        self.ignore_topic = ignore_topic
+        self.create_response = create_response
+        self.requests = []
+        self.max_outstanding = 0
+        self._outstanding = 0
+        self._lock = threading.Lock()
+        self._request_manager = RequestManager(self)
+
+    def add_response_callback(self, topic, response_callback):
+        pass
+
+    @property
+    def callback_count(self):
+        return self._request_manager._get_async_callback_count()
+
+    def async_request(self, request, response_callback):
+        with self._lock:
+            self.requests.append(request)
+            self._outstanding += 1
+            self.max_outstanding = max(self.max_outstanding, self._outstanding)
+        self._request_manager.register_async_callback(request, response_callback)
+        if request.destination_topic == self.ignore_topic:
+            return
+        thread = threading.Thread(target=self._respond, args=(request, response_callback))
+        thread.daemon = True
+        thread.start()
+
+    def _respond(self, request, response_callback):
+        time.sleep(0.01)
+        if self.create_response:
+            response = self.create_response(request)
+        elif request.destination_topic == "/error":
+            response = ErrorResponse(request, error_code=0, error_message="Failure")
+        else:
+            response = Response(request)
+            response.payload = request.payload
+        with self._lock:
+            self._outstanding -= 1
+        response_callback = self._request_manager.unregister_async_callback(request.message_id)
+        if response_callback is not None:
+            response_callback.on_response(response)
+
+
+class TestRequestDispatcher(TestCase):
+
+    @staticmethod
+    def create_request(topic, value):
+        request = Request(topic)
+        MessageUtils.dict_to_json_payload(request, {"value": value})
+        return request
+
+    def test_dispatch(self):
+        dxl_client = FakeAsyncDxlClient()
+        dispatcher = _RequestDispatcher(
+            dxl_client,
+            lambda response: MessageUtils.json_payload_to_dict(response)["value"],
+            max_in_flight=3,
+            timeout=5)
+
+        results = dispatcher.dispatch(
+            self.create_request("/error" if value == 5 else TEST_TOPIC, value)
+            for value in range(10))
+
+        self.assertEqual(len(results), 10)
+        self.assertLessEqual(dxl_client.max_outstanding, 3)
+        for value, result in enumerate(results):
+            if value == 5:
+                self.assertIsNone(result.value)
+                self.assertIn("Failure", str(result.error))
+            else:
+                self.assertEqual(result, LookupResult(value, None))
+
+    def test_dispatch_create(self):
+        dxl_client = FakeAsyncDxlClient()
+        dispatcher = _RequestDispatcher(
+            dxl_client,
+            lambda response: MessageUtils.json_payload_to_dict(response)["value"],
+            max_in_flight=2,
+            timeout=5)
+
+        def create_request(value):
+            if value == 3:
+                raise ValueError("Invalid")
+            # Requests are only created once a slot is available
+            self.assertLessEqual(dxl_client.callback_count, 1)
+            return self.create_request(TEST_TOPIC, value)
+
+        results = dispatcher.dispatch(range(5), create_request)
+
+        self.assertEqual([0, 1, 2, 4], [result.value for result in results if result.error is None])
+        self.assertIsInstance(results[3].error, ValueError)
+
+    def test_dispatch_timeout(self):
+        dxl_client = FakeAsyncDxlClient(ignore_topic="/ignore")
+        dispatcher = _RequestDispatcher(
+            dxl_client,
+            lambda response: MessageUtils.json_payload_to_dict(response)["value"],
+            max_in_flight=1,
+            timeout=0.2)
+
+        results = dispatcher.dispatch([
+            self.create_request("/ignore", 0),
+            self.create_request(TEST_TOPIC, 1)
+        ])
+
+        self.assertIsInstance(results[0].error, WaitTimeoutException)
+        self.assertEqual(results[1], LookupResult(1, None))
+        # The callbacks of timed out requests are unregistered
+        self.assertEqual(dxl_client.callback_count, 0)
+
+
+class TestGetFileReputations(TestCase):
+
+    NOTEPAD_REPUTATIONS = [
+        {
+            ReputationProp.PROVIDER_ID: FileProvider.GTI,
+            ReputationProp.TRUST_LEVEL: TrustLevel.KNOWN_TRUSTED,
+            ReputationProp.CREATE_DATE: 1451502875,
+            ReputationProp.ATTRIBUTES: {}
+        }
+    ]
+
+    @staticmethod
+    def create_response(request):
+        hashes = TieClient._transform_hashes(
+            MessageUtils.json_payload_to_dict(request)["hashes"])
+        if hashes.get(HashType.MD5) == FILE_NOTEPAD_EXE_HASH_DICT[HashType.MD5]:
+            response = Response(request)
+            MessageUtils.dict_to_json_payload(
+                response, {"reputations": TestGetFileReputations.NOTEPAD_REPUTATIONS})
+            return response
+        return ErrorResponse(request, error_code=0, error_message="Could not find reputation")
+
+    def test_getfilereps(self):
+        dxl_client = FakeAsyncDxlClient(create_response=self.create_response)
+        tie_client = TieClient(dxl_client, file_reputation_cache=ReputationCache())
+
+        results = tie_client.get_file_reputations([
+            FILE_NOTEPAD_EXE_HASH_DICT,
+            {HashType.MD5: "not a hash"},
+            FILE_INVALID_HASH_DICT,
+            FILE_NOTEPAD_EXE_HASH_DICT
+        ])
+
+        self.assertEqual(
+            results[0].value[FileProvider.GTI][ReputationProp.TRUST_LEVEL],
+            TrustLevel.KNOWN_TRUSTED
+        )
+        self.assertIsNotNone(results[1].error)
+        self.assertIn("Could not find reputation", str(results[2].error))
+        self.assertDictEqual(results[3].value, results[0].value)
+        self.assertIsNot(results[3].value, results[0].value)
+        # Duplicate and invalid hashes are not sent
+        self.assertEqual(len(dxl_client.requests), 2)
+
+        # Subsequent lookups are satisfied by the cache
+        results = tie_client.get_file_reputations([FILE_NOTEPAD_EXE_HASH_DICT])
+        self.assertIsNone(results[0].error)
+        self.assertEqual(len(dxl_client.requests), 2)
+
+
+class TestLookupResults(TestCase):
+
+    REPUTATIONS_DICT = {
+        FileProvider.GTI: {
+            ReputationProp.PROVIDER_ID: FileProvider.GTI,
+            ReputationProp.TRUST_LEVEL: TrustLevel.KNOWN_TRUSTED,
+            ReputationProp.CREATE_DATE: 1451502875,
+            ReputationProp.ATTRIBUTES: {}
+        },
+        FileProvider.ENTERPRISE: {
+            ReputationProp.PROVIDER_ID: FileProvider.ENTERPRISE,
+            ReputationProp.TRUST_LEVEL: TrustLevel.NOT_SET,
+            ReputationProp.CREATE_DATE: 1476902802,
+            ReputationProp.ATTRIBUTES: {
+                FileEnterpriseAttrib.PREVALENCE: "52",
+                FileEnterpriseAttrib.FIRST_CONTACT: "1476902802",
+                FileEnterpriseAttrib.DETECTION_COUNT: "not a number"
+            }
+        }
+    }
+
+    def create_results(self, value):
+        return LookupResults(
+            [LookupResult(value, None), LookupResult(None, Exception("Failure"))],
+            FileProvider, FILE_COLUMN_ATTRIBUTES)
+
+    def check_columns(self, columns):
+        self.assertEqual(list(columns["error"]), [0, 1])
+        self.assertEqual(list(columns["gti_trust_level"]), [TrustLevel.KNOWN_TRUSTED, -1])
+        self.assertEqual(list(columns["gti_create_date"]), [1451502875, -1])
+        self.assertEqual(list(columns["enterprise_trust_level"]), [TrustLevel.NOT_SET, -1])
+        self.assertEqual(list(columns["enterprise_prevalence"]), [52, -1])
+        self.assertEqual(list(columns["enterprise_first_contact"]), [1476902802, -1])
+        self.assertEqual(list(columns["enterprise_detection_count"]), [-1, -1])
+        self.assertEqual(list(columns["atd_trust_level"]), [-1, -1])
+
+    def test_tocolumns(self):
+        self.check_columns(self.create_results(self.REPUTATIONS_DICT).to_columns())
+        self.check_columns(
+            self.create_results(ReputationSet.from_dict(self.REPUTATIONS_DICT)).to_columns())
+
+    def test_tocolumns_nonumpy(self):
+        with patch("dxltieclient.batch.numpy", None):
+            columns = self.create_results(self.REPUTATIONS_DICT).to_columns()
+        self.assertIsInstance(columns["gti_trust_level"], array.array)
+        self.check_columns(columns)
+
+    def test_tocolumns_selected(self):
+        columns = self.create_results(self.REPUTATIONS_DICT).to_columns(
+            providers=[FileProvider.ENTERPRISE],
+            attributes={FileProvider.ENTERPRISE: [FileEnterpriseAttrib.PREVALENCE]},
+            missing=0)
+        self.assertEqual(
+            list(columns.keys()),
+            ["error", "enterprise_trust_level", "enterprise_create_date",
+             "enterprise_" + FileEnterpriseAttrib.PREVALENCE]
+        )
+        self.assertEqual(list(columns["enterprise_create_date"]), [1476902802, 0])
+
+    def test_getfilereps_columns(self):
+        dxl_client = FakeAsyncDxlClient(create_response=TestGetFileReputations.create_response)
+        tie_client = TieClient(dxl_client)
+
+        results = tie_client.get_file_reputations([FILE_NOTEPAD_EXE_HASH_DICT, FILE_INVALID_HASH_DICT])
+        self.assertIsInstance(results, LookupResults)
+        columns = results.to_columns()
+        self.assertEqual(list(columns["gti_trust_level"]), [TrustLevel.KNOWN_TRUSTED, -1])
+        self.assertEqual(len(columns["enterprise_prevalence"]), 2)
+
+
+class TestGetCertReputations(TestCase):
+
+    CERT1_REPUTATIONS = [
+        {
+            ReputationProp.PROVIDER_ID: CertProvider.ENTERPRISE,
+            ReputationProp.TRUST_LEVEL: TrustLevel.NOT_SET,
+            ReputationProp.CREATE_DATE: 1476318514,
+            ReputationProp.ATTRIBUTES: {},
+            CertReputationProp.OVERRIDDEN: {
+                CertReputationOverriddenProp.FILES: [
+                    {
+                        RepChangeEventProp.HASHES: SAMPLE_NOTEPAD_HASHES_PAYLOAD_DICT
+                    }
+                ]
+            }
+        }
+    ]
+
+    @staticmethod
+    def create_response(request):
+        hashes = TieClient._transform_hashes(
+            MessageUtils.json_payload_to_dict(request)["hashes"])
+        if hashes[HashType.SHA1] == CERT_CERT1_SHA1:
+            response = Response(request)
+            MessageUtils.dict_to_json_payload(
+                response, {"reputations": TestGetCertReputations.CERT1_REPUTATIONS})
+            return response
+        return ErrorResponse(request, error_code=0, error_message="Could not find reputation")
+
+    def test_getcertreps(self):
+        dxl_client = FakeAsyncDxlClient(create_response=self.create_response)
+        tie_client = TieClient(dxl_client, cert_reputation_cache=ReputationCache())
+
+        results = tie_client.get_certificate_reputations([
+            (CERT_CERT1_SHA1, CERT_CERT1_PUBLIC_KEY_SHA1),
+            (CERT_INVALID_SHA1, None),
+            (CERT_CERT1_SHA1.upper(), CERT_CERT1_PUBLIC_KEY_SHA1)
+        ])
+
+        overridden_files = \
+            results[0].value[CertProvider.ENTERPRISE][CertReputationProp.OVERRIDDEN][
+                CertReputationOverriddenProp.FILES]
+        self.assertDictEqual(
+            overridden_files[0][RepChangeEventProp.HASHES],
+            FILE_NOTEPAD_EXE_HASH_DICT
+        )
+        self.assertIn("Could not find reputation", str(results[1].error))
+        self.assertDictEqual(results[2].value, results[0].value)
+        self.assertEqual(len(dxl_client.requests), 2)
+        self.assertEqual(tie_client.cert_reputation_cache.size, 1)
+
+
+class TestAsyncRequests(TestCase):
+
+    def test_getfilerep_async(self):
+        dxl_client = FakeAsyncDxlClient(create_response=TestGetFileReputations.create_response)
+        tie_client = TieClient(dxl_client, file_reputation_cache=ReputationCache())
+
+        future = tie_client.get_file_reputation_async(FILE_NOTEPAD_EXE_HASH_DICT)
+        reputations_dict = future.result(timeout=5)
+        self.assertEqual(
+            reputations_dict[FileProvider.GTI][ReputationProp.TRUST_LEVEL],
+            TrustLevel.KNOWN_TRUSTED
+        )
+
+        # Subsequent lookups complete immediately from the cache
+        future = tie_client.get_file_reputation_async(FILE_NOTEPAD_EXE_HASH_DICT)
+        self.assertTrue(future.done())
+        self.assertDictEqual(future.result(), reputations_dict)
+        self.assertEqual(len(dxl_client.requests), 1)
+
+        # Setting the reputation invalidates the cached reputations
+        future = tie_client.set_file_reputation_async(
+            TrustLevel.MIGHT_BE_TRUSTED, FILE_NOTEPAD_EXE_HASH_DICT)
+        self.assertIsNone(future.result(timeout=5))
+        self.assertEqual(tie_client.file_reputation_cache.size, 0)
+
+    def test_getfilerep_async_error(self):
+        dxl_client = FakeAsyncDxlClient(create_response=TestGetFileReputations.create_response)
+        tie_client = TieClient(dxl_client)
+
+        future = tie_client.get_file_reputation_async(FILE_INVALID_HASH_DICT)
+        with self.assertRaises(Exception) as context:
+            future.result(timeout=5)
+        self.assertIn("Could not find reputation", str(context.exception))
+
+    def test_getfirstrefs_async(self):
+        def create_response(request):
+            response = Response(request)
+            MessageUtils.dict_to_json_payload(
+                response, {"agents": [{FirstRefProp.SYSTEM_GUID: "{guid}"}]})
+            return response
+
+        dxl_client = FakeAsyncDxlClient(create_response=create_response)
+        tie_client = TieClient(dxl_client)
+
+        futures = [
+            tie_client.get_file_first_references_async(FILE_NOTEPAD_EXE_HASH_DICT),
+            tie_client.get_certificate_first_references_async(CERT_CERT1_SHA1)
+        ]
+        for future in futures:
+            self.assertEqual(
+                future.result(timeout=5),
+                [{FirstRefProp.SYSTEM_GUID: "{guid}"}]
+            )
+
+    def test_getcertrep_async_cancel(self):
+        dxl_client = FakeAsyncDxlClient(ignore_topic=TIE_GET_CERT_REPUTATION_TOPIC)
+        tie_client = TieClient(dxl_client)
+
+        future = tie_client.get_certificate_reputation_async(CERT_CERT1_SHA1)
+        self.assertFalse(future.done())
+        self.assertEqual(dxl_client.callback_count, 1)
+        self.assertTrue(future.cancel())
+        self.assertTrue(future.cancelled())
+        # The response callback is unregistered
+        self.assertEqual(dxl_client.callback_count, 0)
+
+    def test_getcertrep_async_timeout(self):
+        dxl_client = FakeAsyncDxlClient(ignore_topic=TIE_GET_CERT_REPUTATION_TOPIC)
+        tie_client = TieClient(dxl_client)
+        tie_client._response_timeout = 0.05
+
+        future = tie_client.get_certificate_reputation_async(CERT_CERT1_SHA1)
+        with self.assertRaises(WaitTimeoutException):
+            future.result(timeout=5)
+        self.assertEqual(dxl_client.callback_count, 0)
+
+        # Responses received after the timeout are discarded
+        future = Future()
+        response_callback = _FutureResponseCallback(future, lambda response: response.payload)
+        response_callback.on_timeout("1234")
+        response_callback.on_response(Response(Request(TEST_TOPIC)))
+        self.assertIsInstance(future.exception(), WaitTimeoutException)
+
+
+    def test_getfilerep_async_release(self):
+        dxl_client = FakeAsyncDxlClient(create_response=TestGetFileReputations.create_response)
+        tie_client = TieClient(dxl_client)
+        size = _timeout_scheduler.size
+
+        future = tie_client.get_file_reputation_async(FILE_NOTEPAD_EXE_HASH_DICT)
+        self.assertEqual(size + 1, _timeout_scheduler.size)
+        future.result(timeout=5)
+        # The completed future is not retained by the timeout scheduler until its deadline
+        self.assertEqual(size, _timeout_scheduler.size)
+        future_ref = weakref.ref(future)
+        del future
+        gc.collect()
+        self.assertIsNone(future_ref())
+
+
+class TestTimeoutScheduler(TestCase):
+
+    def test_schedule(self):
+        scheduler = _TimeoutScheduler()
+        called = threading.Event()
+        handles = [scheduler.schedule(60, lambda: None) for _ in range(_TimeoutScheduler.MIN_COMPACT_SIZE)]
+        scheduler.schedule(0.01, called.set)
+        self.assertTrue(called.wait(5))
+        self.assertEqual(_TimeoutScheduler.MIN_COMPACT_SIZE, scheduler.size)
+
+        # Cancelled functions are released, and their entries removed once they make up half the queue
+        for handle in handles[:_TimeoutScheduler.MIN_COMPACT_SIZE // 2 + 1]:
+            handle.cancel()
+        self.assertIsNone(handles[0].func)
+        self.assertEqual(_TimeoutScheduler.MIN_COMPACT_SIZE // 2 - 1, scheduler.size)
+        self.assertEqual(scheduler.size, len(scheduler._entries))
+
+    def test_schedule_error(self):
+        scheduler = _TimeoutScheduler()
+        called = threading.Event()
+
+        def fail():
+            raise ValueError("Failure")
+
+        with patch("dxltieclient.batch.logger") as logger:
+            scheduler.schedule(0, fail)
+            scheduler.schedule(0.01, called.set)
+            self.assertTrue(called.wait(5))
+        # Errors raised by the functions are logged, and do not stop the scheduler
+        self.assertEqual(1, logger.exception.call_count)
+
+
+class TestSingleFlight(TestCase):
+
+    def test_call(self):
+        single_flight = _SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        invocations = []
+        results = []
+
+        def func():
+            invocations.append(1)
+            started.set()
+            release.wait()
+            return {"value": 1}
+
+        def caller():
+            results.append(single_flight.call("key", func))
+
+        leader = threading.Thread(target=caller)
+        leader.start()
+        started.wait()
+        followers = [threading.Thread(target=caller) for _ in range(5)]
+        for follower in followers:
+            follower.start()
+        # Give the followers time to join the call in progress
+        time.sleep(0.1)
+        release.set()
+        for thread in [leader] + followers:
+            thread.join()
+
+        self.assertEqual(len(invocations), 1)
+        self.assertEqual(results, [{"value": 1}] * 6)
+        # Each caller receives its own copy
+        self.assertEqual(len(set(id(result) for result in results)), 6)
+
+        # Subsequent calls are performed again
+        single_flight.call("key", func)
+        self.assertEqual(len(invocations), 2)
+
+    def test_call_error(self):
+        single_flight = _SingleFlight()
+
+        def func():
+            raise ValueError("failure")
+
+        self.assertRaises(ValueError, single_flight.call, "key", func)
@@ -0,0 +1,401 @@
+"""
+Unit tests for the dxltieclient reputation cache
+"""
+
+import copy
+import json
+import shutil
+import tempfile
+import time
+from unittest import TestCase
+
+from mock import MagicMock, patch
+
+from dxlclient import Request, Response
+from dxltieclient import TieClient
+from dxltieclient.cache import ReputationCache, SqliteReputationStore
+from tests.test_value_constants import *
+
+
+SAMPLE_REPUTATIONS_DICT = {
+    FileProvider.GTI: {
+        ReputationProp.PROVIDER_ID: FileProvider.GTI,
+        ReputationProp.TRUST_LEVEL: TrustLevel.KNOWN_TRUSTED,
+        ReputationProp.ATTRIBUTES: {}
+    }
+}
+
+
+class TestReputationCache(TestCase):
+
+    def test_makekey(self):
+        upper_hash_dict = dict(
+            (hash_type.upper(), hash_value.upper())
+            for hash_type, hash_value in FILE_NOTEPAD_EXE_HASH_DICT.items())
+
+        self.assertEqual(
+            ReputationCache.make_key(FILE_NOTEPAD_EXE_HASH_DICT),
+            ReputationCache.make_key(upper_hash_dict)
+        )
+        self.assertNotEqual(
+            ReputationCache.make_key(FILE_NOTEPAD_EXE_HASH_DICT),
+            ReputationCache.make_key(FILE_EICAR_HASH_DICT)
+        )
+
+    def test_getput(self):
+        cache = ReputationCache()
+        key = ReputationCache.make_key(FILE_NOTEPAD_EXE_HASH_DICT)
+        reputations_dict = {
+            FileProvider.GTI: {
+                ReputationProp.PROVIDER_ID: FileProvider.GTI,
+                ReputationProp.TRUST_LEVEL: TrustLevel.KNOWN_TRUSTED,
+                ReputationProp.ATTRIBUTES: {}
+            }
+        }
+
+        self.assertIsNone(cache.get(key))
+        cache.put(key, reputations_dict)
+        cached_dict = cache.get(key)
+
+        self.assertDictEqual(cached_dict, reputations_dict)
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(cache.misses, 1)
+        self.assertEqual(cache.size, 1)
+
+        # Modifying the returned reputations must not affect the cache
+        cached_dict[FileProvider.GTI][ReputationProp.TRUST_LEVEL] = TrustLevel.KNOWN_MALICIOUS
+        self.assertEqual(
+            cache.get(key)[FileProvider.GTI][ReputationProp.TRUST_LEVEL],
+            TrustLevel.KNOWN_TRUSTED
+        )
+
+        # The cached reputations themselves are returned if no copy is requested
+        self.assertIs(cache.get(key, copy_result=False), cache.get(key, copy_result=False))
+        self.assertEqual(cache.hits, 4)
+
+    def test_lrueviction(self):
+        cache = ReputationCache(max_size=2)
+        notepad_key = ReputationCache.make_key(FILE_NOTEPAD_EXE_HASH_DICT)
+        eicar_key = ReputationCache.make_key(FILE_EICAR_HASH_DICT)
+        unknown_key = ReputationCache.make_key(FILE_UNKNOWN_HASH_DICT)
+
+        cache.put(notepad_key, SAMPLE_REPUTATIONS_DICT)
+        cache.put(eicar_key, SAMPLE_REPUTATIONS_DICT)
+        # Use notepad so that EICAR becomes the least recently used entry
+        cache.get(notepad_key)
+        cache.put(unknown_key, SAMPLE_REPUTATIONS_DICT)
+
+        self.assertEqual(cache.size, 2)
+        self.assertEqual(cache.evictions, 1)
+        self.assertIsNotNone(cache.get(notepad_key))
+        self.assertIsNone(cache.get(eicar_key))
+        self.assertIsNotNone(cache.get(unknown_key))
+
+    def test_ttlexpiration(self):
+        cache = ReputationCache(ttl=10)
+        key = ReputationCache.make_key(FILE_NOTEPAD_EXE_HASH_DICT)
+
+        with patch("dxltieclient.cache.time.time", return_value=1000):
+            cache.put(key, SAMPLE_REPUTATIONS_DICT)
+        with patch("dxltieclient.cache.time.time", return_value=1009):
+            self.assertIsNotNone(cache.get(key))
+        with patch("dxltieclient.cache.time.time", return_value=1010):
+            self.assertIsNone(cache.get(key))
+
+        self.assertEqual(cache.expirations, 1)
+        self.assertEqual(cache.size, 0)
+
+    def test_invalidateclear(self):
+        cache = ReputationCache()
+        notepad_key = ReputationCache.make_key(FILE_NOTEPAD_EXE_HASH_DICT)
+        eicar_key = ReputationCache.make_key(FILE_EICAR_HASH_DICT)
+
+        cache.put(notepad_key, {})
+        cache.put(eicar_key, {})
+        cache.invalidate(notepad_key)
+
+        self.assertIsNone(cache.get(notepad_key))
+        self.assertIsNotNone(cache.get(eicar_key))
+
+        cache.clear()
+        self.assertEqual(cache.size, 0)
+
+    def test_update(self):
+        cache = ReputationCache()
+        sha256_key = ReputationCache.make_key(
+            {HashType.SHA256: FILE_NOTEPAD_EXE_HASH_DICT[HashType.SHA256]})
+        md5_other_key = ReputationCache.make_key({
+            HashType.MD5: FILE_NOTEPAD_EXE_HASH_DICT[HashType.MD5],
+            HashType.SHA1: FILE_EICAR_HASH_DICT[HashType.SHA1]
+        })
+        eicar_key = ReputationCache.make_key(FILE_EICAR_HASH_DICT)
+        new_reputations_dict = {
+            FileProvider.ENTERPRISE: {
+                ReputationProp.PROVIDER_ID: FileProvider.ENTERPRISE,
+                ReputationProp.TRUST_LEVEL: TrustLevel.KNOWN_MALICIOUS
+            }
+        }
+
+        cache.put(sha256_key, {})
+        cache.put(md5_other_key, {})
+        cache.put(eicar_key, {})
+        cache.update(FILE_NOTEPAD_EXE_HASH_DICT, new_reputations_dict)
+
+        # Entries identified by a subset of the hashes are replaced
+        self.assertDictEqual(cache.get(sha256_key), new_reputations_dict)
+        # Entries that only partially match are removed
+        self.assertIsNone(cache.get(md5_other_key))
+        # Unrelated entries are left untouched
+        self.assertDictEqual(cache.get(eicar_key), {})
+        self.assertEqual(cache.invalidations, 2)
+
+        # Without reputations, all matching entries are removed
+        cache.update(FILE_NOTEPAD_EXE_HASH_DICT)
+        self.assertIsNone(cache.get(sha256_key))
+
+    def test_certoverrides(self):
+        cache = ReputationCache()
+        key = ReputationCache.make_key({
+            HashType.SHA1: CERT_CERT1_SHA1,
+            CertRepChangeEventProp.PUBLIC_KEY_SHA1: CERT_CERT1_PUBLIC_KEY_SHA1
+        })
+        reputations_dict = {
+            CertProvider.ENTERPRISE: {
+                ReputationProp.PROVIDER_ID: CertProvider.ENTERPRISE,
+                ReputationProp.TRUST_LEVEL: TrustLevel.NOT_SET,
+                CertReputationProp.OVERRIDDEN: {
+                    CertReputationOverriddenProp.FILES: [
+                        {
+                            RepChangeEventProp.HASHES: FILE_NOTEPAD_EXE_HASH_DICT
+                        }
+                    ]
+                }
+            }
+        }
+
+        cache.put(key, reputations_dict)
+
+        self.assertDictEqual(cache.get(key), reputations_dict)
+
+    def test_negative(self):
+        cache = ReputationCache(max_size=1, negative_max_size=1, negative_ttl=5)
+        notepad_key = ReputationCache.make_key(FILE_NOTEPAD_EXE_HASH_DICT)
+        eicar_key = ReputationCache.make_key(FILE_EICAR_HASH_DICT)
+        unknown_key = ReputationCache.make_key(FILE_UNKNOWN_HASH_DICT)
+
+        with patch("dxltieclient.cache.time.time", return_value=1000):
+            cache.put(notepad_key, SAMPLE_REPUTATIONS_DICT)
+            cache.put(eicar_key, {})
+            # Empty results do not displace known reputations
+            self.assertEqual(cache.size, 1)
+            self.assertEqual(cache.negative_size, 1)
+            self.assertDictEqual(cache.get(eicar_key), {})
+            self.assertEqual(cache.negative_hits, 1)
+
+            # Empty results are limited separately
+            cache.put(unknown_key, {})
+            self.assertEqual(cache.negative_size, 1)
+            self.assertIsNone(cache.get(eicar_key))
+            self.assertIsNotNone(cache.get(notepad_key))
+
+        # Empty results use their own TTL
+        with patch("dxltieclient.cache.time.time", return_value=1005):
+            self.assertIsNone(cache.get(unknown_key))
+            self.assertIsNotNone(cache.get(notepad_key))
+
+    def test_negative_update(self):
+        cache = ReputationCache()
+        notepad_key = ReputationCache.make_key(FILE_NOTEPAD_EXE_HASH_DICT)
+
+        cache.put(notepad_key, {})
+        cache.update(FILE_NOTEPAD_EXE_HASH_DICT, SAMPLE_REPUTATIONS_DICT)
+
+        self.assertDictEqual(cache.get(notepad_key), SAMPLE_REPUTATIONS_DICT)
+        self.assertEqual(cache.negative_size, 0)
+
+    def test_negative_disabled(self):
+        cache = ReputationCache(negative_max_size=0)
+        key = ReputationCache.make_key(FILE_UNKNOWN_HASH_DICT)
+
+        cache.put(key, {})
+
+        self.assertIsNone(cache.get(key))
+
+    def test_stale_put(self):
+        cache = ReputationCache()
+        key = ReputationCache.make_key(FILE_NOTEPAD_EXE_HASH_DICT)
+        new_reputations_dict = {
+            FileProvider.ENTERPRISE: {
+                ReputationProp.PROVIDER_ID: FileProvider.ENTERPRISE,
+                ReputationProp.TRUST_LEVEL: TrustLevel.KNOWN_MALICIOUS
+            }
+        }
+
+        # A change applied while the reputations were being retrieved wins
+        generation = cache.generation
+        cache.update(FILE_NOTEPAD_EXE_HASH_DICT, new_reputations_dict)
+        cache.put(key, SAMPLE_REPUTATIONS_DICT, generation)
+        self.assertIsNone(cache.get(key))
+        self.assertEqual(cache.stale_puts, 1)
+
+        # Changes to other files do not prevent the reputations from being stored
+        generation = cache.generation
+        cache.update(FILE_EICAR_HASH_DICT)
+        cache.put(key, SAMPLE_REPUTATIONS_DICT, generation)
+        self.assertDictEqual(cache.get(key), SAMPLE_REPUTATIONS_DICT)
+
+    def test_stale_put_forgotten(self):
+        cache = ReputationCache()
+        key = ReputationCache.make_key(FILE_NOTEPAD_EXE_HASH_DICT)
+        generation = cache.generation
+        with patch.object(ReputationCache, "MAX_CHANGED_HASHES", 1):
+            cache.update(FILE_EICAR_HASH_DICT)
+        # The changes since the generation are no longer tracked
+        cache.put(key, SAMPLE_REPUTATIONS_DICT, generation)
+        self.assertIsNone(cache.get(key))
+
+
+class TestClientCacheUpdates(TestCase):
+
+    def test_update_during_request(self):
+        cache = ReputationCache()
+        tie_client = TieClient(None, file_reputation_cache=cache)
+
+        def sync_request(request):
+            # A reputation change event arrives while the request is in flight
+            cache.update(FILE_NOTEPAD_EXE_HASH_DICT, {})
+            response = Response(request)
+            response.payload = json.dumps({"reputations": list(SAMPLE_REPUTATIONS_DICT.values())})
+            return response
+
+        with patch.object(tie_client, "_dxl_sync_request", side_effect=sync_request):
+            reputations_dict = tie_client.get_file_reputation(FILE_NOTEPAD_EXE_HASH_DICT)
+        self.assertIn(FileProvider.GTI, reputations_dict)
+        # The stale response is not cached (the next lookup retrieves the changed reputations)
+        self.assertIsNone(cache.get(ReputationCache.make_key(FILE_NOTEPAD_EXE_HASH_DICT)))
+        self.assertEqual(cache.stale_puts, 1)
+
+    def test_hit_copy(self):
+        cache = ReputationCache()
+        cache.put(ReputationCache.make_key(FILE_NOTEPAD_EXE_HASH_DICT), SAMPLE_REPUTATIONS_DICT)
+        tie_client = TieClient(None, file_reputation_cache=cache)
+        with patch("dxltieclient.cache.copy.deepcopy", side_effect=copy.deepcopy) as deepcopy:
+            reputations_dict = tie_client.get_file_reputation(FILE_NOTEPAD_EXE_HASH_DICT)
+            self.assertEqual(1, deepcopy.call_count)
+            # The cached reputations are not copied for the result modes that build new objects
+            tie_client.result_mode = ResultMode.OBJECT
+            reputation_set = tie_client.get_file_reputation(FILE_NOTEPAD_EXE_HASH_DICT)
+            self.assertEqual(1, deepcopy.call_count)
+        self.assertEqual(TrustLevel.KNOWN_TRUSTED, reputation_set.get_trust_level(FileProvider.GTI))
+        self.assertIn(FileProvider.GTI, reputations_dict)
+
+    def test_replace_cache(self):
+        dxl_client = MagicMock()
+        tie_client = TieClient(dxl_client, file_reputation_cache=ReputationCache())
+        tie_client.enable_reputation_cache_updates()
+        self.assertEqual(1, dxl_client.add_event_callback.call_count)
+
+        # Caches attached afterwards are also updated
+        cache = ReputationCache()
+        tie_client.file_reputation_cache = cache
+        tie_client.cert_reputation_cache = ReputationCache()
+        self.assertEqual(1, dxl_client.remove_event_callback.call_count)
+        self.assertEqual(3, dxl_client.add_event_callback.call_count)
+        topic, callback = dxl_client.add_event_callback.call_args_list[1][0]
+        self.assertEqual("/mcafee/event/tie/file/repchange/broadcast", topic)
+        self.assertIs(cache, callback.reputation_cache)
+
+        tie_client.disable_reputation_cache_updates()
+        self.assertEqual(3, dxl_client.remove_event_callback.call_count)
+        tie_client.file_reputation_cache = ReputationCache()
+        self.assertEqual(3, dxl_client.add_event_callback.call_count)
+
+
+class TestSqliteReputationStore(TestCase):
+
+    def setUp(self):
+        self.store_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.store_dir)
+
+    def test_warmcache(self):
+        key = ReputationCache.make_key(FILE_NOTEPAD_EXE_HASH_DICT)
+        reputations_dict = {
+            FileProvider.GTI: {
+                ReputationProp.PROVIDER_ID: FileProvider.GTI,
+                ReputationProp.TRUST_LEVEL: TrustLevel.KNOWN_TRUSTED,
+                ReputationProp.CREATE_DATE: 1451502875
+            },
+            FileProvider.ENTERPRISE: {
+                ReputationProp.PROVIDER_ID: FileProvider.ENTERPRISE,
+                ReputationProp.TRUST_LEVEL: TrustLevel.NOT_SET,
+                ReputationProp.CREATE_DATE: 1451504331
+            }
+        }
+
+        with patch("dxltieclient.cache.time.time", return_value=1000):
+            ReputationCache(backing_store=SqliteReputationStore(self.store_dir)).put(
+                key, reputations_dict)
+
+        # A new cache (as after a restart) is warmed from the store
+        store = SqliteReputationStore(self.store_dir)
+        self.assertEqual(store.get(key), (reputations_dict, 1451504331, 1000))
+
+        cache = ReputationCache(ttl=60, backing_store=store)
+        with patch("dxltieclient.cache.time.time", return_value=1030):
+            self.assertDictEqual(cache.get(key), reputations_dict)
+            self.assertEqual(cache.backing_store_hits, 1)
+            self.assertEqual(cache.size, 1)
+
+        # The TTL is measured from the time the reputations were retrieved
+        cache = ReputationCache(ttl=60, backing_store=store)
+        with patch("dxltieclient.cache.time.time", return_value=1060):
+            self.assertIsNone(cache.get(key))
+
+    def test_update(self):
+        store = SqliteReputationStore(self.store_dir, "file_reputations")
+        sha256_key = ReputationCache.make_key(
+            {HashType.SHA256: FILE_NOTEPAD_EXE_HASH_DICT[HashType.SHA256]})
+        eicar_key = ReputationCache.make_key(FILE_EICAR_HASH_DICT)
+        store.put(sha256_key, {}, 1000)
+        store.put(eicar_key, {}, 1000)
+
+        ReputationCache(backing_store=store).update(
+            FILE_NOTEPAD_EXE_HASH_DICT, SAMPLE_REPUTATIONS_DICT)
+        self.assertDictEqual(store.get(sha256_key)[0], SAMPLE_REPUTATIONS_DICT)
+
+        ReputationCache(backing_store=store).update(FILE_NOTEPAD_EXE_HASH_DICT)
+        self.assertIsNone(store.get(sha256_key))
+        self.assertIsNotNone(store.get(eicar_key))
+
+    def test_load_stale(self):
+        store = SqliteReputationStore(self.store_dir)
+        key = ReputationCache.make_key(FILE_NOTEPAD_EXE_HASH_DICT)
+        store.put(key, SAMPLE_REPUTATIONS_DICT, time.time())
+        cache = ReputationCache(backing_store=store)
+        get = store.get
+
+        def get_during_update(stored_key):
+            # The stored reputations are read before a concurrent reputation change is applied
+            entry = get(stored_key)
+            cache.update(FILE_NOTEPAD_EXE_HASH_DICT)
+            return entry
+
+        with patch.object(store, "get", side_effect=get_during_update):
+            self.assertIsNone(cache.get(key))
+        self.assertEqual(0, cache.size)
+        self.assertIsNone(store.get(key))
+
+    def test_max_size(self):
+        self.assertRaises(ValueError, SqliteReputationStore, self.store_dir, max_size=0)
+        store = SqliteReputationStore(self.store_dir, max_size=2, max_age=100)
+        keys = [ReputationCache.make_key({HashType.MD5: "{0:032x}".format(index)}) for index in range(4)]
+        with patch.object(SqliteReputationStore, "PURGE_INTERVAL", 2), \
+                patch("dxltieclient.cache.time.time", return_value=1150):
+            for fetch_time, key in zip([1000, 1100, 1120, 1110], keys):
+                store.put(key, SAMPLE_REPUTATIONS_DICT, fetch_time)
+        # Entries older than the maximum age are removed, followed by the least recently retrieved
+        # entries in excess of the maximum size
+        self.assertEqual([False, False, True, True], [store.get(key) is not None for key in keys])
+        self.assertEqual(set(), store.find(keys[1]))
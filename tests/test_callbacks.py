@@ -3,9 +3,14 @@ Unit tests for dxltieclient built-in callbacks
 """
 
 import json
+import threading
 
 from unittest import TestCase
+from mock import patch
 from dxlclient import Event
+from dxltieclient import TieClient
+from dxltieclient.hashes import LazyHashes
+from dxltieclient.cache import ReputationCache
 from dxltieclient.callbacks import *
 from tests.test_value_constants import *
 
@@ -171,6 +176,148 @@ class TestReputationChangeCallback(TestCase):
             test_event
         )
 
+    def test_lazy_hashes(self):
+
+        class MyReputationChangeCallback(ReputationChangeCallback):
+
+            def __init__(self):
+                super(MyReputationChangeCallback, self).__init__(lazy_hashes=True)
+                self.rep_change_dict_received = None
+
+            def on_reputation_change(self, rep_change_dict, original_event):
+                self.rep_change_dict_received = rep_change_dict
+
+        test_event = Event(TEST_TOPIC)
+        test_event.payload = json.dumps({
+            RepChangeEventProp.HASHES: SAMPLE_NOTEPAD_HASHES_PAYLOAD_DICT,
+            RepChangeEventProp.NEW_REPUTATIONS: {
+                "reputations": [{ReputationProp.TRUST_LEVEL: TrustLevel.KNOWN_TRUSTED,
+                                 ReputationProp.PROVIDER_ID: FileProvider.ENTERPRISE}]
+            },
+            FileRepChangeEventProp.RELATIONSHIPS: {
+                "certificate": {
+                    RepChangeEventProp.HASHES: [{"value": "rB/QkipKKm5XeazdYodHwoOUsLk=", "type": HashType.SHA1}],
+                    "publicKeySha1": "Q139Rw9ydDfHy08Hy6H5ofQnJlY="
+                }
+            },
+            CertRepChangeEventProp.PUBLIC_KEY_SHA1: "Q139Rw9ydDfHy08Hy6H5ofQnJlY="
+        }).encode(encoding="UTF-8")
+
+        rep_change_callback = MyReputationChangeCallback()
+        self.assertTrue(rep_change_callback.lazy_hashes)
+        with patch.object(TieClient, "_transform_hashes", wraps=TieClient._transform_hashes) as transform:
+            rep_change_callback.on_event(test_event)
+            rep_change_dict = rep_change_callback.rep_change_dict_received
+            new_reputations = rep_change_dict[RepChangeEventProp.NEW_REPUTATIONS]
+            self.assertEqual(TrustLevel.KNOWN_TRUSTED,
+                             new_reputations[FileProvider.ENTERPRISE][ReputationProp.TRUST_LEVEL])
+            # Hashes that are not accessed are not converted
+            self.assertEqual(0, transform.call_count)
+
+            # Public key SHA-1 values are always converted
+            cert_dict = rep_change_dict[FileRepChangeEventProp.RELATIONSHIPS]["certificate"]
+            self.assertEqual("435dfd470f727437c7cb4f07cba1f9a1f4272656", cert_dict["publicKeySha1"])
+            self.assertEqual("435dfd470f727437c7cb4f07cba1f9a1f4272656",
+                             rep_change_dict[CertRepChangeEventProp.PUBLIC_KEY_SHA1])
+
+            # Lazy hashes must be converted before the event is serialized
+            self.assertRaises(TypeError, json.dumps, rep_change_dict)
+
+            hashes = rep_change_dict[RepChangeEventProp.HASHES]
+            self.assertIsInstance(hashes, LazyHashes)
+            self.assertEqual(FILE_NOTEPAD_EXE_HASH_DICT[HashType.MD5], hashes[HashType.MD5])
+            self.assertEqual(FILE_NOTEPAD_EXE_HASH_DICT, hashes)
+            self.assertEqual(1, transform.call_count)
+
+            cert_hashes = rep_change_dict[FileRepChangeEventProp.RELATIONSHIPS]["certificate"]["hashes"]
+            self.assertEqual({HashType.SHA1: "ac1fd0922a4a2a6e5779acdd628747c28394b0b9"}, cert_hashes.to_dict())
+            self.assertEqual(2, transform.call_count)
+
+
+class TestReputationCacheUpdateCallback(TestCase):
+
+    def test_cacheupdatecallback(self):
+        cache = ReputationCache()
+        notepad_key = ReputationCache.make_key(FILE_NOTEPAD_EXE_HASH_DICT)
+        cache.put(notepad_key, {})
+
+        rep_change_event_payload = {
+            RepChangeEventProp.HASHES: SAMPLE_NOTEPAD_HASHES_PAYLOAD_DICT,
+            RepChangeEventProp.NEW_REPUTATIONS: {
+                "reputations": [
+                    {
+                        ReputationProp.TRUST_LEVEL: TrustLevel.KNOWN_MALICIOUS,
+                        ReputationProp.PROVIDER_ID: FileProvider.ENTERPRISE,
+                        ReputationProp.CREATE_DATE: 1409783001,
+                        ReputationProp.ATTRIBUTES: {}
+                    }
+                ]
+            },
+            RepChangeEventProp.UPDATE_TIME: 1409851328
+        }
+
+        test_event = Event(TEST_TOPIC)
+        test_event.payload = json.dumps(rep_change_event_payload)\
+            .encode(encoding="UTF-8")
+
+        ReputationCacheUpdateCallback(cache).on_event(test_event)
+
+        self.assertEqual(
+            cache.get(notepad_key)[FileProvider.ENTERPRISE][ReputationProp.TRUST_LEVEL],
+            TrustLevel.KNOWN_MALICIOUS
+        )
+
+
+class TestBatchingReputationChangeCallback(TestCase):
+
+    class MyBatchingReputationChangeCallback(BatchingReputationChangeCallback):
+
+        def __init__(self, **kwargs):
+            super(TestBatchingReputationChangeCallback.MyBatchingReputationChangeCallback, self).__init__(
+                **kwargs)
+            self.batches = []
+            self.delivered = threading.Event()
+
+        def on_reputation_changes(self, batch):
+            self.batches.append(batch)
+            self.delivered.set()
+
+    @staticmethod
+    def create_event(update_time):
+        event = Event(TEST_TOPIC)
+        event.payload = json.dumps({
+            RepChangeEventProp.HASHES: SAMPLE_NOTEPAD_HASHES_PAYLOAD_DICT,
+            RepChangeEventProp.UPDATE_TIME: update_time
+        }).encode(encoding="UTF-8")
+        return event
+
+    def test_batch_size(self):
+        callback = self.MyBatchingReputationChangeCallback(max_batch_size=2, max_wait=60)
+        for update_time in range(5):
+            callback.on_event(self.create_event(update_time))
+
+        self.assertEqual([[0, 1], [2, 3]],
+                         [[change[RepChangeEventProp.UPDATE_TIME] for change in batch]
+                          for batch in callback.batches])
+        self.assertEqual(FILE_NOTEPAD_EXE_HASH_DICT, callback.batches[0][0][RepChangeEventProp.HASHES])
+
+        callback.close()
+        self.assertEqual(4, callback.batches[2][0][RepChangeEventProp.UPDATE_TIME])
+        callback.flush()
+        self.assertEqual(3, len(callback.batches))
+
+    def test_max_wait(self):
+        callback = self.MyBatchingReputationChangeCallback(max_batch_size=100, max_wait=0.05)
+        callback.on_event(self.create_event(1))
+        callback.on_event(self.create_event(2))
+        self.assertTrue(callback.delivered.wait(5))
+        self.assertEqual(1, len(callback.batches))
+        self.assertEqual(2, len(callback.batches[0]))
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, BatchingReputationChangeCallback, max_batch_size=0)
+        self.assertRaises(ValueError, BatchingReputationChangeCallback, max_wait=0)
+
 
 class TestDetectionCallback(TestCase):
 
@@ -240,6 +387,118 @@ class TestDetectionCallback(TestCase):
         )
 
 
+class TestQueuedDetectionCallback(TestCase):
+
+    class MyQueuedDetectionCallback(QueuedDetectionCallback):
+
+        def __init__(self, **kwargs):
+            super(TestQueuedDetectionCallback.MyQueuedDetectionCallback, self).__init__(**kwargs)
+            self.batches = []
+            self.gate = threading.Event()
+            self.started = threading.Event()
+
+        def on_detections(self, batch):
+            self.started.set()
+            self.gate.wait(5)
+            self.batches.append([detection[DetectionEventProp.DETECTION_TIME] for detection in batch])
+
+    @staticmethod
+    def create_event(detection_time):
+        event = Event(TEST_TOPIC)
+        event.payload = json.dumps({
+            DetectionEventProp.HASHES: SAMPLE_NOTEPAD_HASHES_PAYLOAD_DICT,
+            DetectionEventProp.DETECTION_TIME: detection_time
+        }).encode(encoding="UTF-8")
+        return event
+
+    def block_worker(self, callback):
+        # Deliver an initial event and hold the worker in the handler
+        callback.on_event(self.create_event(0))
+        self.assertTrue(callback.started.wait(5))
+
+    def delivered(self, callback):
+        return sorted(detection_time for batch in callback.batches for detection_time in batch)
+
+    def test_batches(self):
+        callback = self.MyQueuedDetectionCallback(max_queue_size=100, max_batch_size=3)
+        self.block_worker(callback)
+        for detection_time in range(1, 6):
+            callback.on_event(self.create_event(detection_time))
+        self.assertEqual(5, callback.queue_depth)
+        callback.gate.set()
+        callback.close()
+        self.assertEqual([[0], [1, 2, 3], [4, 5]], callback.batches)
+        self.assertEqual(0, callback.queue_depth)
+        self.assertEqual(0, callback.dropped_count)
+
+    def test_detection_dict(self):
+        detections = []
+
+        class MyCallback(QueuedDetectionCallback):
+            def on_detections(self, batch):
+                detections.extend(batch)
+
+        callback = MyCallback()
+        callback.on_event(self.create_event(1))
+        callback.close()
+        self.assertEqual(FILE_NOTEPAD_EXE_HASH_DICT, detections[0][DetectionEventProp.HASHES])
+
+    def test_drop_oldest(self):
+        callback = self.MyQueuedDetectionCallback(
+            max_queue_size=2, overflow_policy=OverflowPolicy.DROP_OLDEST)
+        self.block_worker(callback)
+        for detection_time in range(1, 6):
+            callback.on_event(self.create_event(detection_time))
+        self.assertEqual(2, callback.queue_depth)
+        self.assertEqual(3, callback.dropped_count)
+        callback.gate.set()
+        callback.close()
+        self.assertEqual([0, 4, 5], self.delivered(callback))
+
+    def test_block(self):
+        callback = self.MyQueuedDetectionCallback(max_queue_size=1)
+        self.block_worker(callback)
+        callback.on_event(self.create_event(1))
+        producer = threading.Thread(target=callback.on_event, args=(self.create_event(2),))
+        producer.start()
+        producer.join(0.1)
+        # The producer waits for room in the queue
+        self.assertTrue(producer.is_alive())
+        callback.gate.set()
+        producer.join(5)
+        self.assertFalse(producer.is_alive())
+        callback.close()
+        self.assertEqual([0, 1, 2], self.delivered(callback))
+        self.assertEqual(0, callback.dropped_count)
+
+    def test_spill(self):
+        callback = self.MyQueuedDetectionCallback(
+            max_queue_size=2, overflow_policy=OverflowPolicy.SPILL, max_batch_size=10)
+        self.block_worker(callback)
+        for detection_time in range(1, 8):
+            callback.on_event(self.create_event(detection_time))
+        self.assertEqual(7, callback.queue_depth)
+        self.assertEqual(5, callback.spilled_count)
+        callback.gate.set()
+        callback.close()
+        self.assertEqual([[0], [1, 2, 3, 4, 5, 6, 7]], callback.batches)
+        self.assertEqual(0, callback.dropped_count)
+
+    def test_closed(self):
+        callback = self.MyQueuedDetectionCallback()
+        callback.gate.set()
+        callback.close()
+        callback.on_event(self.create_event(1))
+        self.assertEqual(1, callback.dropped_count)
+        self.assertEqual([], callback.batches)
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, QueuedDetectionCallback, max_queue_size=0)
+        self.assertRaises(ValueError, QueuedDetectionCallback, overflow_policy="invalid")
+        self.assertRaises(ValueError, QueuedDetectionCallback, worker_count=0)
+        self.assertRaises(ValueError, QueuedDetectionCallback, max_batch_size=0)
+
+
 class TestFirstInstanceCallback(TestCase):
 
     def test_firstinstancecallback(self):
@@ -53,6 +53,29 @@ class TestSubscribeUnsubscribe(BaseClientTest):
 
             dxl_client.disconnect()
 
+    def test_cacheupdates(self):
+        file_reputation_change_topic = "/mcafee/event/tie/file/repchange/broadcast"
+        cert_reputation_change_topic = "/mcafee/event/tie/cert/repchange/broadcast"
+
+        with self.create_client(max_retries=0) as dxl_client:
+            tie_client = TieClient(dxl_client, file_reputation_cache=ReputationCache())
+            dxl_client.connect()
+
+            tie_client.enable_reputation_cache_updates()
+            self.assertIn(file_reputation_change_topic, dxl_client.subscriptions)
+            self.assertNotIn(cert_reputation_change_topic, dxl_client.subscriptions)
+            tie_client.disable_reputation_cache_updates()
+
+            tie_client.cert_reputation_cache = ReputationCache()
+            tie_client.enable_reputation_cache_updates()
+            self.assertIn(cert_reputation_change_topic, dxl_client.subscriptions)
+
+            tie_client.disable_reputation_cache_updates()
+            self.assertNotIn(file_reputation_change_topic, dxl_client.subscriptions)
+            self.assertNotIn(cert_reputation_change_topic, dxl_client.subscriptions)
+
+            dxl_client.disconnect()
+
 
 class TestGetFileReputation(BaseClientTest):
 
@@ -90,6 +113,50 @@ class TestGetFileReputation(BaseClientTest):
 
             dxl_client.disconnect()
 
+    def test_getfilerep_cached(self):
+        with self.create_client(max_retries=0) as dxl_client:
+            # Set up client, and register mock service
+            tie_client = TieClient(dxl_client, file_reputation_cache=ReputationCache())
+            dxl_client.connect()
+            with MockTieServer(dxl_client):
+                reputations_dict = \
+                    tie_client.get_file_reputation(FILE_NOTEPAD_EXE_HASH_DICT)
+                cached_reputations_dict = \
+                    tie_client.get_file_reputation(FILE_NOTEPAD_EXE_HASH_DICT)
+
+                self.assertDictEqual(cached_reputations_dict, reputations_dict)
+                self.assertEqual(tie_client.file_reputation_cache.misses, 1)
+                self.assertEqual(tie_client.file_reputation_cache.hits, 1)
+
+            dxl_client.disconnect()
+
+    def test_getfilereps(self):
+        with self.create_client(max_retries=0) as dxl_client:
+            # Set up client, and register mock service
+            tie_client = TieClient(dxl_client)
+            dxl_client.connect()
+            with MockTieServer(dxl_client):
+                results = tie_client.get_file_reputations([
+                    FILE_NOTEPAD_EXE_HASH_DICT,
+                    FILE_INVALID_HASH_DICT,
+                    FILE_EICAR_HASH_DICT
+                ])
+
+                self.assertEqual(
+                    results[0].value[FileProvider.GTI][ReputationProp.TRUST_LEVEL],
+                    TrustLevel.KNOWN_TRUSTED
+                )
+                self.assertIn(
+                    "Error: Could not find reputation (0)",
+                    str(results[1].error)
+                )
+                self.assertEqual(
+                    results[2].value[FileProvider.GTI][ReputationProp.TRUST_LEVEL],
+                    TrustLevel.KNOWN_MALICIOUS
+                )
+
+            dxl_client.disconnect()
+
     def test_getfilerep_invalid(self):
         with self.create_client(max_retries=0) as dxl_client:
             # Set up client, and register mock service
@@ -195,6 +262,50 @@ class TestGetCertReputation(BaseClientTest):
 
             dxl_client.disconnect()
 
+    def test_getcertrep_cached(self):
+        with self.create_client(max_retries=0) as dxl_client:
+            # Set up client, and register mock service
+            tie_client = TieClient(dxl_client, cert_reputation_cache=ReputationCache())
+            dxl_client.connect()
+            with MockTieServer(dxl_client):
+                reputations_dict = \
+                    tie_client.get_certificate_reputation(
+                        CERT_CERT1_SHA1,
+                        CERT_CERT1_PUBLIC_KEY_SHA1
+                    )
+                cached_reputations_dict = \
+                    tie_client.get_certificate_reputation(
+                        CERT_CERT1_SHA1.upper(),
+                        CERT_CERT1_PUBLIC_KEY_SHA1.upper()
+                    )
+
+                self.assertDictEqual(cached_reputations_dict, reputations_dict)
+                self.assertEqual(tie_client.cert_reputation_cache.hits, 1)
+
+            dxl_client.disconnect()
+
+    def test_getcertreps(self):
+        with self.create_client(max_retries=0) as dxl_client:
+            # Set up client, and register mock service
+            tie_client = TieClient(dxl_client)
+            dxl_client.connect()
+            with MockTieServer(dxl_client):
+                results = tie_client.get_certificate_reputations([
+                    (CERT_CERT1_SHA1, CERT_CERT1_PUBLIC_KEY_SHA1),
+                    (CERT_INVALID_SHA1, CERT_INVALID_SHA1)
+                ])
+
+                self.assertEqual(
+                    results[0].value[CertProvider.GTI][ReputationProp.TRUST_LEVEL],
+                    TrustLevel.KNOWN_TRUSTED
+                )
+                self.assertIn(
+                    "Error: Could not find reputation (0)",
+                    str(results[1].error)
+                )
+
+            dxl_client.disconnect()
+
     def test_getcertrep_invalid(self):
         with self.create_client(max_retries=0) as dxl_client:
             # Set up client, and register mock service
@@ -0,0 +1,227 @@
+"""
+Unit tests for the dxltieclient JSON codecs
+"""
+
+import json
+from unittest import TestCase
+
+from mock import patch
+
+from dxlclient import Event, Request, Response
+from dxltieclient import TieClient
+from dxltieclient.callbacks import DetectionCallback
+from dxltieclient.codec import JsonCodec, OrjsonCodec, UjsonCodec, get_default_codec, _PayloadTemplate, \
+    _iter_json_array, _strip_payload
+from dxltieclient.constants import HashType, FileProvider, ReputationProp, TrustLevel, FirstRefProp
+from dxltieclient.hashes import FileHashes, HashMemo, _hex_to_base64
+
+
+def create_codecs():
+    codecs = [JsonCodec()]
+    for codec_class in (OrjsonCodec, UjsonCodec):
+        try:
+            codecs.append(codec_class())
+        except ImportError:
+            pass
+    return codecs
+
+
+class RecordingCodec(JsonCodec):
+
+    def __init__(self):
+        self.calls = []
+
+    def dumps(self, value):
+        self.calls.append("dumps")
+        return super(RecordingCodec, self).dumps(value)
+
+    def loads(self, payload):
+        self.calls.append("loads")
+        return super(RecordingCodec, self).loads(payload)
+
+
+class TestPayloadTemplate(TestCase):
+
+    def test_render(self):
+        template = _PayloadTemplate({"scanType": 3, "name": "x"}, ["hashes", "limit"])
+        self.assertEqual({"scanType": 3, "name": "x", "hashes": [1, 2], "limit": 5},
+                         json.loads(template.render(b"[1,2]", b"5").decode("utf-8")))
+        template = _PayloadTemplate({}, ["hashes"])
+        self.assertEqual(b'{"hashes":[]}', template.render(b"[]"))
+        self.assertEqual(b'{}', _PayloadTemplate({}, []).render())
+
+    def test_file_requests(self):
+        hashes_list = [
+            {HashType.MD5: "f2c7bb8acc97f92e987a2d4087d021b1",
+             HashType.SHA1: "7eb0139d2175739b3ccb0d1110067820be6abd29"},
+            FileHashes(sha256="142e1d688ef0568370c37187fd9f2351d7ddeda574f8bfa9b0fa4ef42db85aa2"),
+            {"Custom\"Type": "f2c7bb8acc97f92e987a2d4087d021b1"}
+        ]
+        for hash_memo in (None, HashMemo()):
+            TieClient.set_hash_memo(hash_memo)
+            try:
+                for hashes in hashes_list:
+                    expected_hashes = [{"type": hash_type, "value": _hex_to_base64(hex_value)}
+                                       for hash_type, hex_value in hashes.items()]
+                    self.assertEqual(
+                        {"hashes": expected_hashes, "scanType": 3},
+                        JsonCodec().loads(TieClient._create_file_reputation_request(hashes).payload))
+                    self.assertEqual(
+                        {"hashes": expected_hashes, "queryLimit": 10},
+                        JsonCodec().loads(TieClient._create_file_first_refs_request(hashes, 10).payload))
+                    self.assertEqual(
+                        {"hashes": expected_hashes, "trustLevel": TrustLevel.KNOWN_TRUSTED,
+                         "providerId": FileProvider.ENTERPRISE, "filename": u"n\u00e9\"x", "comment": ""},
+                        JsonCodec().loads(TieClient._create_set_file_reputation_request(
+                            TrustLevel.KNOWN_TRUSTED, hashes, u"n\u00e9\"x", "").payload))
+            finally:
+                TieClient.set_hash_memo(None)
+
+
+class TestJsonCodec(TestCase):
+
+    def test_roundtrip(self):
+        value = {"hashes": [{"type": "md5", "value": "8se7isyX+S6Yei1Ah9AhsQ=="}], "scanType": 3}
+        for codec in create_codecs():
+            payload = codec.dumps(value)
+            self.assertIsInstance(payload, bytes)
+            self.assertEqual(value, codec.loads(payload))
+
+    def test_loads_strips_nul(self):
+        for codec in create_codecs():
+            self.assertEqual({"a": 1}, codec.loads(b'{"a": 1}\0'))
+            self.assertEqual({"a": 1}, codec.loads(u'{"a": 1}\0'))
+
+    def test_loads_buffers(self):
+        payload = b'{"agents": [{"agentGuid": "{68125cd6}", "date": 1475873692}]}'
+        for codec in create_codecs():
+            for value in (bytearray(payload), memoryview(payload), memoryview(payload + b"\0\0")):
+                self.assertEqual(1475873692, codec.loads(value)["agents"][0]["date"])
+
+    def test_strip_payload(self):
+        payload = b'{"a": 1}'
+        self.assertIs(payload, _strip_payload(payload))
+        stripped = _strip_payload(payload + b"\0\0")
+        self.assertIsInstance(stripped, memoryview)
+        self.assertEqual(payload, stripped.tobytes())
+        self.assertEqual(b"", _strip_payload(b"\0").tobytes())
+        self.assertEqual(u"{}", _strip_payload(u"{}\0"))
+
+    def test_parse_agents_memoryview(self):
+        response = Response(Request("/test"))
+        response.payload = memoryview(b'{"agents": [{"agentGuid": "{68125cd6}", "date": 1475873692}]}\0')
+        for codec in create_codecs():
+            self.assertEqual([{"agentGuid": "{68125cd6}", "date": 1475873692}],
+                             TieClient._parse_agents_response(response, codec))
+
+    def test_default_codec(self):
+        codec = get_default_codec()
+        self.assertIs(codec, get_default_codec())
+        self.assertIn(codec.name, [c.name for c in create_codecs()])
+
+    def test_client_codec(self):
+        codec = RecordingCodec()
+        tie_client = TieClient(None, codec=codec)
+        self.assertIs(codec, tie_client.codec)
+        tie_client.codec = None
+        self.assertIs(get_default_codec(), tie_client.codec)
+
+        request = TieClient._create_cert_reputation_request(
+            "6eae26db8c13182a7947982991b4321732cc3de2", None, codec)
+        self.assertEqual(["dumps"], codec.calls)
+        self.assertEqual("sha1", JsonCodec().loads(request.payload)["hashes"][0]["type"])
+
+        response = Response(Request("/test"))
+        response.payload = JsonCodec().dumps({
+            "reputations": [{ReputationProp.PROVIDER_ID: FileProvider.GTI, ReputationProp.TRUST_LEVEL: 99}]
+        })
+        reputations_dict = TieClient._parse_reputations_response(response, codec)
+        self.assertEqual(["dumps", "loads"], codec.calls)
+        self.assertEqual(99, reputations_dict[FileProvider.GTI][ReputationProp.TRUST_LEVEL])
+
+    def test_callback_codec(self):
+
+        class MyDetectionCallback(DetectionCallback):
+
+            def __init__(self, codec):
+                super(MyDetectionCallback, self).__init__(codec)
+                self.detection_dict = None
+
+            def on_detection(self, detection_dict, original_event):
+                self.detection_dict = detection_dict
+
+        codec = RecordingCodec()
+        callback = MyDetectionCallback(codec)
+        event = Event("/test")
+        event.payload = JsonCodec().dumps({
+            "agentGuid": "{68125cd6-a5d8-11e6-348e-000c29663178}",
+            "hashes": [{"type": "md5", "value": "8se7isyX+S6Yei1Ah9AhsQ=="}]
+        })
+        callback.on_event(event)
+        self.assertEqual(["loads"], codec.calls)
+        self.assertEqual({HashType.MD5: "f2c7bb8acc97f92e987a2d4087d021b1"},
+                         callback.detection_dict["hashes"])
+
+
+class TestIterJsonArray(TestCase):
+
+    AGENTS = [
+        {FirstRefProp.SYSTEM_GUID: "{3a6f574a-3e6f-436d-acd4-b3de336b054d}", FirstRefProp.DATE: 1475873692},
+        {FirstRefProp.SYSTEM_GUID: "{68125cd6-a5d8-11e6-348e-000c29663178}", FirstRefProp.DATE: 1478626172}
+    ]
+
+    def test_iter(self):
+        payloads = [
+            json.dumps({"props": {"agents": [0]}, "agents": self.AGENTS, "count": 2}).encode("utf-8"),
+            json.dumps({"agents": self.AGENTS}, indent=4).encode("utf-8") + b"\0",
+            memoryview(json.dumps({"agents": self.AGENTS}).encode("utf-8")),
+            json.dumps({"agents": self.AGENTS})
+        ]
+        payloads.append(b'{"a\\"": "agents", "agents" : [ {"agentGuid": "[{,:}]\\"", "date": [1, {"x": 2}]} ] }')
+        for payload in payloads[:-1]:
+            self.assertEqual(self.AGENTS, list(_iter_json_array(payload, "agents")))
+        self.assertEqual([{"agentGuid": "[{,:}]\"", "date": [1, {"x": 2}]}],
+                         list(_iter_json_array(payloads[-1], "agents")))
+
+    def test_iter_empty(self):
+        for payload in (b"{}", b' { "agents" : [ ] } ', b'{"props": {}}', b'{"agents": null}'):
+            self.assertEqual([], list(_iter_json_array(payload, "agents")))
+
+    def test_iter_incremental(self):
+        # Elements preceding a malformed element are yielded
+        for codec in create_codecs():
+            agents = _iter_json_array(b'{"agents": [{"date": 1}, {"date": 2}, {"date" 3}]}', "agents", codec)
+            self.assertEqual({"date": 1}, next(agents))
+            self.assertEqual({"date": 2}, next(agents))
+            self.assertRaises(ValueError, next, agents)
+        agents = _iter_json_array(b'{"agents": [{"date": 1}, {"date": 2}', "agents")
+        self.assertEqual([{"date": 1}], [next(agents)])
+        self.assertRaises(ValueError, list, agents)
+        self.assertRaises(ValueError, list, _iter_json_array(b'[]', "agents"))
+
+    def test_iter_codec(self):
+        codec = RecordingCodec()
+        payload = memoryview(json.dumps({"agents": self.AGENTS, "props": {"agents": []}}).encode("utf-8") + b"\0")
+        self.assertEqual(self.AGENTS, list(_iter_json_array(payload, "agents", codec)))
+        # The elements are decoded together by the codec
+        self.assertEqual(["loads"], codec.calls)
+
+    def test_iter_chunks(self):
+        codec = RecordingCodec()
+        agents = [{FirstRefProp.SYSTEM_GUID: str(index), FirstRefProp.DATE: index} for index in range(5)]
+        with patch("dxltieclient.codec._CHUNK_SIZE", 40):
+            self.assertEqual(agents, list(_iter_json_array(json.dumps({"agents": agents}), "agents", codec)))
+        # The elements are decoded in chunks of (approximately) _CHUNK_SIZE bytes
+        self.assertEqual(3, len(codec.calls))
+
+    def test_iter_file_first_references(self):
+        tie_client = TieClient(None)
+        response = Response(Request("/test"))
+        response.payload = json.dumps({"agents": self.AGENTS}).encode("utf-8")
+        with patch.object(tie_client, "_dxl_sync_request", return_value=response) as sync_request:
+            agents = tie_client.iter_file_first_references(
+                {HashType.MD5: "f2c7bb8acc97f92e987a2d4087d021b1"}, query_limit=2)
+            # The request is sent before the generator is consumed
+            self.assertEqual(1, sync_request.call_count)
+            self.assertEqual(2, json.loads(sync_request.call_args[0][0].payload.decode("utf-8"))["queryLimit"])
+            self.assertEqual(self.AGENTS, list(agents))
@@ -0,0 +1,166 @@
+"""
+Unit tests for the dxltieclient event deduplication
+"""
+
+import json
+from unittest import TestCase
+
+from mock import patch
+
+from dxlclient import Event
+from dxltieclient import EventDeduplicator
+from dxltieclient.callbacks import BatchingReputationChangeCallback, FirstInstanceCallback, \
+    ReputationChangeCallback
+from dxltieclient.codec import JsonCodec
+from dxltieclient.constants import FileProvider, FirstInstanceEventProp, RepChangeEventProp, ReputationProp, \
+    TrustLevel
+from tests.test_value_constants import FILE_NOTEPAD_EXE_HASH_DICT, SAMPLE_NOTEPAD_HASHES_PAYLOAD_DICT, \
+    TEST_TOPIC
+
+SYSTEM_GUID = "{68125cd6-a5d8-11e6-348e-000c29663178}"
+
+
+def create_rep_change(update_time=1481219581, hashes=SAMPLE_NOTEPAD_HASHES_PAYLOAD_DICT):
+    return {
+        RepChangeEventProp.HASHES: hashes,
+        RepChangeEventProp.NEW_REPUTATIONS: {
+            "reputations": [{ReputationProp.PROVIDER_ID: FileProvider.ENTERPRISE,
+                             ReputationProp.TRUST_LEVEL: TrustLevel.KNOWN_TRUSTED}]
+        },
+        RepChangeEventProp.UPDATE_TIME: update_time
+    }
+
+
+def create_first_instance(system_guid=SYSTEM_GUID, hashes=SAMPLE_NOTEPAD_HASHES_PAYLOAD_DICT):
+    return {
+        FirstInstanceEventProp.SYSTEM_GUID: system_guid,
+        FirstInstanceEventProp.HASHES: hashes,
+        FirstInstanceEventProp.NAME: "notepad.exe"
+    }
+
+
+def create_event(event_dict):
+    event = Event(TEST_TOPIC)
+    event.payload = json.dumps(event_dict).encode("utf-8")
+    return event
+
+
+class CountingCodec(JsonCodec):
+
+    def __init__(self):
+        self.loads_count = 0
+
+    def loads(self, payload):
+        self.loads_count += 1
+        return super(CountingCodec, self).loads(payload)
+
+
+class TestEventDeduplicator(TestCase):
+
+    def test_rep_change_key(self):
+        payload = json.dumps(create_rep_change()).encode("utf-8")
+        key = EventDeduplicator.make_rep_change_key(payload)
+        self.assertEqual(key, EventDeduplicator.make_rep_change_key(payload + b"\0"))
+        self.assertEqual(key, EventDeduplicator.make_rep_change_key(memoryview(payload)))
+        self.assertEqual(key, EventDeduplicator.make_rep_change_key(payload.decode("utf-8")))
+        self.assertNotEqual(key, EventDeduplicator.make_rep_change_key(
+            json.dumps(create_rep_change(update_time=1481219582))))
+        self.assertNotEqual(key, EventDeduplicator.make_rep_change_key(
+            json.dumps(create_rep_change(hashes=SAMPLE_NOTEPAD_HASHES_PAYLOAD_DICT[:1]))))
+
+    def test_first_instance_key(self):
+        key = EventDeduplicator.make_first_instance_key(json.dumps(create_first_instance()).encode("utf-8"))
+        self.assertIsNotNone(key)
+        self.assertEqual(key, EventDeduplicator.make_first_instance_key(
+            json.dumps(create_first_instance(system_guid=SYSTEM_GUID.upper()))))
+        self.assertNotEqual(key, EventDeduplicator.make_first_instance_key(
+            json.dumps(create_first_instance(system_guid="{00000000}"))))
+        self.assertIsNone(EventDeduplicator.make_first_instance_key(b'{"hashes": []}'))
+
+    def test_window(self):
+        deduplicator = EventDeduplicator(window=10)
+        self.assertEqual(10, deduplicator.window)
+        with patch("dxltieclient.dedupe.time.time", return_value=1000.0) as time_mock:
+            self.assertFalse(deduplicator.is_duplicate("a"))
+            time_mock.return_value = 1009.0
+            self.assertTrue(deduplicator.is_duplicate("a"))
+            # The window is measured from the time the event was first seen
+            time_mock.return_value = 1010.0
+            self.assertFalse(deduplicator.is_duplicate("a"))
+            self.assertTrue(deduplicator.is_duplicate("a"))
+        self.assertEqual(2, deduplicator.duplicates)
+
+    def test_max_size(self):
+        deduplicator = EventDeduplicator(max_size=2)
+        for key in ("a", "b", "c"):
+            self.assertFalse(deduplicator.is_duplicate(key))
+        self.assertEqual(2, deduplicator.size)
+        # The least recently seen event is forgotten
+        self.assertFalse(deduplicator.is_duplicate("a"))
+        self.assertTrue(deduplicator.is_duplicate("c"))
+        deduplicator.clear()
+        self.assertEqual(0, deduplicator.size)
+        self.assertFalse(deduplicator.is_duplicate("c"))
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, EventDeduplicator, max_size=0)
+        self.assertRaises(ValueError, EventDeduplicator, window=0)
+
+
+class TestCallbackDeduplication(TestCase):
+
+    def test_reputation_change_callback(self):
+        changes = []
+
+        class MyReputationChangeCallback(ReputationChangeCallback):
+            def on_reputation_change(self, rep_change_dict, original_event):
+                changes.append(rep_change_dict)
+
+        codec = CountingCodec()
+        callback = MyReputationChangeCallback(codec=codec, deduplicator=EventDeduplicator())
+        callback.on_event(create_event(create_rep_change()))
+        callback.on_event(create_event(create_rep_change()))
+        # Duplicates are discarded before they are decoded
+        self.assertEqual(1, codec.loads_count)
+        callback.on_event(create_event(create_rep_change(update_time=1481219582)))
+        self.assertEqual([1481219581, 1481219582], [change[RepChangeEventProp.UPDATE_TIME] for change in changes])
+        self.assertEqual(FILE_NOTEPAD_EXE_HASH_DICT, changes[0][RepChangeEventProp.HASHES])
+        self.assertEqual(1, callback.deduplicator.duplicates)
+
+        # Distinct changes to the same file within the same second are delivered
+        event_dict = create_rep_change()
+        event_dict[RepChangeEventProp.NEW_REPUTATIONS]["reputations"][0][ReputationProp.PROVIDER_ID] = \
+            FileProvider.GTI
+        callback.on_event(create_event(event_dict))
+        callback.on_event(create_event(event_dict))
+        self.assertEqual(3, len(changes))
+        self.assertIn(FileProvider.GTI, changes[2][RepChangeEventProp.NEW_REPUTATIONS])
+
+    def test_shared_deduplicator(self):
+        changes = []
+
+        class MyBatchingReputationChangeCallback(BatchingReputationChangeCallback):
+            def on_reputation_changes(self, batch):
+                changes.extend(batch)
+
+        deduplicator = EventDeduplicator()
+        callbacks = [MyBatchingReputationChangeCallback(deduplicator=deduplicator) for _ in range(2)]
+        for callback in callbacks:
+            callback.on_event(create_event(create_rep_change()))
+            callback.close()
+        self.assertEqual(1, len(changes))
+
+    def test_first_instance_callback(self):
+        first_instances = []
+
+        class MyFirstInstanceCallback(FirstInstanceCallback):
+            def on_first_instance(self, first_instance_dict, original_event):
+                first_instances.append(first_instance_dict)
+
+        callback = MyFirstInstanceCallback()
+        callback.deduplicator = EventDeduplicator()
+        callback.on_event(create_event(create_first_instance()))
+        callback.on_event(create_event(create_first_instance()))
+        callback.on_event(create_event(create_first_instance(system_guid="{00000000}")))
+        self.assertEqual([SYSTEM_GUID, "{00000000}"],
+                         [first_instance[FirstInstanceEventProp.SYSTEM_GUID] for first_instance in first_instances])
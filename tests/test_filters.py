@@ -0,0 +1,149 @@
+"""
+Unit tests for the dxltieclient event filters
+"""
+
+import json
+from unittest import TestCase
+
+from mock import patch
+
+from dxlclient import Event
+from dxltieclient import TieClient
+from dxltieclient.callbacks import DetectionCallback, ReputationChangeCallback, QueuedDetectionCallback
+from dxltieclient.constants import DetectionEventProp, FileProvider, RepChangeEventProp, ReputationProp, \
+    TrustLevel
+from dxltieclient.filters import HashFilter, SystemGuidFilter, TrustLevelFilter
+from tests.test_value_constants import FILE_NOTEPAD_EXE_HASH_DICT, SAMPLE_NOTEPAD_HASHES_PAYLOAD_DICT, \
+    TEST_TOPIC
+
+SYSTEM_GUID = "{68125cd6-a5d8-11e6-348e-000c29663178}"
+OTHER_HASHES_PAYLOAD = [{"type": "md5", "value": "6wsrnc/UGBCG17l+tSQQqw=="}]
+
+
+def create_detection(local_reputation=TrustLevel.KNOWN_MALICIOUS, system_guid=SYSTEM_GUID,
+                     hashes=SAMPLE_NOTEPAD_HASHES_PAYLOAD_DICT):
+    return {
+        DetectionEventProp.SYSTEM_GUID: system_guid,
+        DetectionEventProp.DETECTION_TIME: 1481301038,
+        DetectionEventProp.HASHES: hashes,
+        DetectionEventProp.LOCAL_REPUTATION: local_reputation,
+        DetectionEventProp.NAME: "TEST_MALWARE.EXE"
+    }
+
+
+def create_rep_change(trust_level, provider_id=FileProvider.ENTERPRISE, hashes=SAMPLE_NOTEPAD_HASHES_PAYLOAD_DICT):
+    return {
+        RepChangeEventProp.HASHES: hashes,
+        RepChangeEventProp.NEW_REPUTATIONS: {
+            "reputations": [{ReputationProp.PROVIDER_ID: provider_id, ReputationProp.TRUST_LEVEL: trust_level}]
+        },
+        RepChangeEventProp.OLD_REPUTATIONS: {
+            "reputations": [{ReputationProp.PROVIDER_ID: provider_id,
+                             ReputationProp.TRUST_LEVEL: TrustLevel.NOT_SET}]
+        },
+        RepChangeEventProp.UPDATE_TIME: 1481219581
+    }
+
+
+def matches(event_filter, event_dict):
+    payload = json.dumps(event_dict).encode("utf-8")
+    # The raw payload check must never reject an event that matches
+    return event_filter.matches_payload(payload) and event_filter.matches(event_dict)
+
+
+class TestFilters(TestCase):
+
+    def test_trust_level(self):
+        event_filter = TrustLevelFilter(max_trust_level=TrustLevel.MIGHT_BE_MALICIOUS)
+        self.assertTrue(matches(event_filter, create_detection(TrustLevel.KNOWN_MALICIOUS)))
+        self.assertFalse(matches(event_filter, create_detection(TrustLevel.KNOWN_TRUSTED)))
+        self.assertFalse(event_filter.matches_payload(
+            json.dumps(create_detection(TrustLevel.KNOWN_TRUSTED)).encode("utf-8")))
+
+        event_filter = TrustLevelFilter(min_trust_level=TrustLevel.MOST_LIKELY_TRUSTED,
+                                        provider_id=FileProvider.ENTERPRISE)
+        self.assertTrue(matches(event_filter, create_rep_change(TrustLevel.KNOWN_TRUSTED)))
+        self.assertFalse(matches(event_filter, create_rep_change(TrustLevel.KNOWN_MALICIOUS)))
+        self.assertFalse(matches(event_filter, create_rep_change(TrustLevel.KNOWN_TRUSTED, FileProvider.GTI)))
+
+        self.assertRaises(ValueError, TrustLevelFilter)
+
+    def test_hashes(self):
+        event_filter = HashFilter([FILE_NOTEPAD_EXE_HASH_DICT["sha1"].upper()])
+        self.assertTrue(matches(event_filter, create_detection()))
+        self.assertTrue(matches(event_filter, create_rep_change(TrustLevel.KNOWN_TRUSTED)))
+        self.assertFalse(event_filter.matches_payload(
+            json.dumps(create_detection(hashes=OTHER_HASHES_PAYLOAD)).encode("utf-8")))
+        self.assertFalse(event_filter.matches(create_detection(hashes=OTHER_HASHES_PAYLOAD)))
+
+    def test_hashes_escaped(self):
+        event_filter = HashFilter(["eb0b2b9dcfd4181086d7b97eb52410ab"])
+        payload = json.dumps(create_detection(hashes=OTHER_HASHES_PAYLOAD)).replace("/", "\\/")
+        self.assertTrue(event_filter.matches_payload(payload.encode("utf-8")))
+
+    def test_system_guid(self):
+        event_filter = SystemGuidFilter([SYSTEM_GUID.upper()])
+        self.assertTrue(matches(event_filter, create_detection()))
+        self.assertFalse(matches(event_filter, create_detection(system_guid="{00000000}")))
+        self.assertFalse(event_filter.matches_payload(
+            json.dumps(create_detection(system_guid="{00000000}")).encode("utf-8")))
+
+
+class TestCallbackFilters(TestCase):
+
+    @staticmethod
+    def create_event(event_dict):
+        event = Event(TEST_TOPIC)
+        event.payload = json.dumps(event_dict).encode("utf-8")
+        return event
+
+    def test_detection_callback(self):
+        detections = []
+
+        class MyDetectionCallback(DetectionCallback):
+            def on_detection(self, detection_dict, original_event):
+                detections.append(detection_dict)
+
+        callback = MyDetectionCallback(filters=[
+            TrustLevelFilter(max_trust_level=TrustLevel.MIGHT_BE_MALICIOUS),
+            SystemGuidFilter([SYSTEM_GUID])])
+
+        with patch.object(TieClient, "_transform_hashes", wraps=TieClient._transform_hashes) as transform:
+            callback.on_event(self.create_event(create_detection(TrustLevel.KNOWN_TRUSTED)))
+            callback.on_event(self.create_event(create_detection(system_guid="{00000000}")))
+            # Rejected events are not transformed
+            self.assertEqual(0, transform.call_count)
+            callback.on_event(self.create_event(create_detection()))
+            self.assertEqual(1, transform.call_count)
+
+        self.assertEqual(1, len(detections))
+        self.assertEqual(FILE_NOTEPAD_EXE_HASH_DICT, detections[0][DetectionEventProp.HASHES])
+
+    def test_reputation_change_callback(self):
+        changes = []
+
+        class MyReputationChangeCallback(ReputationChangeCallback):
+            def on_reputation_change(self, rep_change_dict, original_event):
+                changes.append(rep_change_dict)
+
+        callback = MyReputationChangeCallback()
+        callback.filters = [HashFilter([FILE_NOTEPAD_EXE_HASH_DICT["md5"]])]
+        callback.on_event(self.create_event(create_rep_change(TrustLevel.KNOWN_TRUSTED, hashes=OTHER_HASHES_PAYLOAD)))
+        callback.on_event(self.create_event(create_rep_change(TrustLevel.KNOWN_TRUSTED)))
+        self.assertEqual(1, len(changes))
+        self.assertEqual(FILE_NOTEPAD_EXE_HASH_DICT, changes[0][RepChangeEventProp.HASHES])
+
+    def test_queued_detection_callback(self):
+        detections = []
+
+        class MyQueuedDetectionCallback(QueuedDetectionCallback):
+            def on_detections(self, batch):
+                detections.extend(batch)
+
+        callback = MyQueuedDetectionCallback(filters=[SystemGuidFilter([SYSTEM_GUID])])
+        callback.on_event(self.create_event(create_detection(system_guid="{00000000}")))
+        # Rejected events are not queued
+        self.assertEqual(0, callback.queue_depth)
+        callback.on_event(self.create_event(create_detection()))
+        callback.close()
+        self.assertEqual([SYSTEM_GUID], [detection[DetectionEventProp.SYSTEM_GUID] for detection in detections])
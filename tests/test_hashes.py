@@ -0,0 +1,191 @@
+"""
+Unit tests for dxltieclient hash conversions
+"""
+
+import binascii
+import json
+import pickle
+import sys
+from unittest import TestCase
+
+from mock import patch
+
+from dxltieclient import TieClient, FileHashes, HashMemo, LazyHashes, ReputationCache
+from tests import test_batch
+from tests.test_value_constants import *
+
+
+class TestHashConversion(TestCase):
+
+    HEX_VALUES = [
+        FILE_NOTEPAD_EXE_HASH_DICT[HashType.MD5],
+        FILE_NOTEPAD_EXE_HASH_DICT[HashType.SHA1],
+        FILE_NOTEPAD_EXE_HASH_DICT[HashType.SHA256],
+        ""
+    ]
+
+    def test_hextobase64(self):
+        base64_values = [TieClient._hex_to_base64(hex_value) for hex_value in self.HEX_VALUES]
+        self.assertEqual(base64_values[0], SAMPLE_NOTEPAD_HASHES_PAYLOAD_DICT[0]["value"])
+        self.assertEqual([TieClient._base64_to_hex(base64_value) for base64_value in base64_values],
+                         self.HEX_VALUES)
+
+    def test_hextobase64_invalid(self):
+        for hex_value in ["abc", "zz"]:
+            with self.assertRaises((TypeError, ValueError, binascii.Error)):
+                TieClient._hex_to_base64(hex_value)
+
+    def test_transformhashes(self):
+        self.assertDictEqual(
+            TieClient._transform_hashes(SAMPLE_NOTEPAD_HASHES_PAYLOAD_DICT),
+            FILE_NOTEPAD_EXE_HASH_DICT
+        )
+        self.assertEqual(
+            TieClient._transform_hashes(
+                json.loads(TieClient._encode_hashes_payload(FILE_NOTEPAD_EXE_HASH_DICT).decode("ascii"))),
+            FILE_NOTEPAD_EXE_HASH_DICT
+        )
+
+    def test_certhashestopayload(self):
+        payload_dict = {}
+        TieClient._add_cert_hashes_to_payload(payload_dict, CERT_CERT1_SHA1, CERT_CERT1_PUBLIC_KEY_SHA1)
+        self.assertEqual(
+            [TieClient._base64_to_hex(payload_dict["hashes"][0]["value"]),
+             TieClient._base64_to_hex(payload_dict["publicKeySha1"])],
+            [CERT_CERT1_SHA1, CERT_CERT1_PUBLIC_KEY_SHA1]
+        )
+        payload_dict = {}
+        TieClient._add_cert_hashes_to_payload(payload_dict, CERT_CERT1_SHA1)
+        self.assertNotIn("publicKeySha1", payload_dict)
+
+
+class TestHashMemo(TestCase):
+
+    def tearDown(self):
+        TieClient.set_hash_memo(None)
+
+    def test_memo(self):
+        hash_memo = HashMemo(max_size=2)
+        TieClient.set_hash_memo(hash_memo)
+        self.assertIs(TieClient.get_hash_memo(), hash_memo)
+        self.assertEqual(hash_memo.hit_rate, 0.0)
+
+        base64_values = [TieClient._hex_to_base64(hex_value) for hex_value in TestHashConversion.HEX_VALUES[:2]]
+        self.assertEqual(TieClient._hex_to_base64(TestHashConversion.HEX_VALUES[0]), base64_values[0])
+        self.assertEqual(TieClient._base64_to_hex(base64_values[1]), TestHashConversion.HEX_VALUES[1])
+        self.assertEqual(hash_memo.hits, 1)
+        self.assertEqual(hash_memo.misses, 3)
+        self.assertEqual(hash_memo.size, 3)
+        self.assertEqual(hash_memo.hit_rate, 0.25)
+
+        # The oldest conversion is discarded once the table is full
+        TieClient._hex_to_base64(TestHashConversion.HEX_VALUES[2])
+        TieClient._hex_to_base64(TestHashConversion.HEX_VALUES[0])
+        self.assertEqual(hash_memo.misses, 5)
+        self.assertEqual(hash_memo.size, 3)
+
+        hash_memo.clear()
+        self.assertEqual(hash_memo.size, 0)
+        self.assertEqual(hash_memo.hits, 0)
+
+    def test_memo_transformhashes(self):
+        hash_memo = HashMemo()
+        TieClient.set_hash_memo(hash_memo)
+        for _ in range(2):
+            self.assertDictEqual(
+                TieClient._transform_hashes(SAMPLE_NOTEPAD_HASHES_PAYLOAD_DICT),
+                FILE_NOTEPAD_EXE_HASH_DICT
+            )
+        self.assertEqual(hash_memo.hits, len(SAMPLE_NOTEPAD_HASHES_PAYLOAD_DICT))
+
+        # Invalid values are not stored
+        with self.assertRaises((TypeError, ValueError, binascii.Error)):
+            TieClient._hex_to_base64("zz")
+        self.assertEqual(hash_memo.size, len(SAMPLE_NOTEPAD_HASHES_PAYLOAD_DICT))
+
+    def test_memo_invalidsize(self):
+        with self.assertRaises(ValueError):
+            HashMemo(max_size=0)
+
+
+class TestFileHashes(TestCase):
+
+    def test_normalize(self):
+        file_hashes = FileHashes(
+            {HashType.MD5.upper(): FILE_NOTEPAD_EXE_HASH_DICT[HashType.MD5].upper()},
+            sha1=FILE_NOTEPAD_EXE_HASH_DICT[HashType.SHA1],
+            sha256=FILE_NOTEPAD_EXE_HASH_DICT[HashType.SHA256])
+        self.assertEqual(file_hashes, FILE_NOTEPAD_EXE_HASH_DICT)
+        self.assertDictEqual(file_hashes.to_dict(), FILE_NOTEPAD_EXE_HASH_DICT)
+        self.assertEqual(file_hashes.md5, FILE_NOTEPAD_EXE_HASH_DICT[HashType.MD5])
+        self.assertEqual(
+            file_hashes.get_bytes(HashType.SHA1),
+            binascii.unhexlify(FILE_NOTEPAD_EXE_HASH_DICT[HashType.SHA1])
+        )
+        # collections.Mapping does not define __slots__ on Python 2
+        self.assertEqual(sys.version_info[0] == 2, hasattr(file_hashes, "__dict__"))
+
+    def test_invalid(self):
+        for hashes in [{},
+                       {HashType.MD5: "abc"},
+                       {HashType.MD5: FILE_NOTEPAD_EXE_HASH_DICT[HashType.SHA1]},
+                       {HashType.MD5: "zz" * 16},
+                       {"crc32": "abcdef01"},
+                       {HashType.MD5: FILE_NOTEPAD_EXE_HASH_DICT[HashType.MD5],
+                        HashType.MD5.upper(): "00" * 16}]:
+            with self.assertRaises(ValueError):
+                FileHashes(hashes)
+
+    def test_hashable(self):
+        file_hashes = FileHashes(FILE_NOTEPAD_EXE_HASH_DICT)
+        self.assertEqual(file_hashes, FileHashes(file_hashes))
+        self.assertEqual(len({file_hashes, FileHashes(FILE_NOTEPAD_EXE_HASH_DICT)}), 1)
+        self.assertNotEqual(file_hashes, FileHashes(md5=FILE_NOTEPAD_EXE_HASH_DICT[HashType.MD5]))
+        self.assertEqual(
+            ReputationCache.make_key(file_hashes),
+            ReputationCache.make_key(FILE_NOTEPAD_EXE_HASH_DICT)
+        )
+
+    def test_payload(self):
+        file_hashes = FileHashes(FILE_NOTEPAD_EXE_HASH_DICT)
+        self.assertEqual(
+            TieClient._transform_hashes(json.loads(TieClient._encode_hashes_payload(file_hashes).decode("ascii"))),
+            FILE_NOTEPAD_EXE_HASH_DICT
+        )
+
+    def test_getfilerep(self):
+        dxl_client = test_batch.FakeAsyncDxlClient(
+            create_response=test_batch.TestGetFileReputations.create_response)
+        tie_client = TieClient(dxl_client, file_reputation_cache=ReputationCache())
+
+        file_hashes = FileHashes(FILE_NOTEPAD_EXE_HASH_DICT)
+        reputations_dict = tie_client.get_file_reputation_async(file_hashes).result(timeout=5)
+        self.assertIn(FileProvider.GTI, reputations_dict)
+
+        # Equivalent dictionary of hashes is satisfied by the cache
+        results = tie_client.get_file_reputations([FILE_NOTEPAD_EXE_HASH_DICT, file_hashes])
+        self.assertDictEqual(results[0].value, reputations_dict)
+        self.assertDictEqual(results[1].value, reputations_dict)
+        self.assertEqual(len(dxl_client.requests), 1)
+
+
+class TestLazyHashes(TestCase):
+
+    def test_conversion(self):
+        with patch.object(TieClient, "_transform_hashes", wraps=TieClient._transform_hashes) as transform:
+            hashes = LazyHashes(SAMPLE_NOTEPAD_HASHES_PAYLOAD_DICT)
+            self.assertEqual(0, transform.call_count)
+            self.assertEqual(FILE_NOTEPAD_EXE_HASH_DICT[HashType.SHA1], hashes[HashType.SHA1])
+            self.assertEqual(len(FILE_NOTEPAD_EXE_HASH_DICT), len(hashes))
+            self.assertEqual(FILE_NOTEPAD_EXE_HASH_DICT, hashes)
+            self.assertIn(HashType.MD5, hashes)
+            # The hashes are only converted once
+            self.assertEqual(1, transform.call_count)
+
+    def test_to_dict(self):
+        hashes = LazyHashes(SAMPLE_NOTEPAD_HASHES_PAYLOAD_DICT)
+        self.assertIs(dict, type(hashes.to_dict()))
+        self.assertEqual(FILE_NOTEPAD_EXE_HASH_DICT, hashes.to_dict())
+        self.assertEqual(FILE_NOTEPAD_EXE_HASH_DICT, dict(hashes))
+        self.assertEqual(FILE_NOTEPAD_EXE_HASH_DICT, pickle.loads(pickle.dumps(hashes)))
+        self.assertIn(FILE_NOTEPAD_EXE_HASH_DICT[HashType.MD5], repr(hashes))
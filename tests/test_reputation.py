@@ -0,0 +1,178 @@
+"""
+Unit tests for dxltieclient reputation objects
+"""
+
+import json
+from unittest import TestCase
+
+from dxltieclient import TieClient, ReputationCache
+from dxltieclient.reputation import Reputation, ReputationSet, LazyReputationSet
+from tests import test_batch
+from tests.test_value_constants import *
+
+
+SAMPLE_FILE_REPUTATIONS_DICT = {
+    FileProvider.GTI: {
+        ReputationProp.PROVIDER_ID: FileProvider.GTI,
+        ReputationProp.TRUST_LEVEL: TrustLevel.KNOWN_TRUSTED,
+        ReputationProp.CREATE_DATE: 1480455704,
+        ReputationProp.ATTRIBUTES: {
+            FileGtiAttrib.ORIGINAL_RESPONSE: "2139160704"
+        }
+    },
+    FileProvider.ENTERPRISE: {
+        ReputationProp.PROVIDER_ID: FileProvider.ENTERPRISE,
+        ReputationProp.TRUST_LEVEL: TrustLevel.NOT_SET,
+        ReputationProp.CREATE_DATE: 1476902802,
+        ReputationProp.ATTRIBUTES: {
+            FileEnterpriseAttrib.PREVALENCE: "52",
+            FileEnterpriseAttrib.FIRST_CONTACT: "1476902802",
+            FileEnterpriseAttrib.SERVER_VERSION: SAMPLE_ENTERPRISE_VERSION
+        }
+    }
+}
+
+SAMPLE_CERT_REPUTATIONS_DICT = {
+    CertProvider.ENTERPRISE: {
+        ReputationProp.PROVIDER_ID: CertProvider.ENTERPRISE,
+        ReputationProp.TRUST_LEVEL: TrustLevel.NOT_SET,
+        ReputationProp.CREATE_DATE: 1476318514,
+        ReputationProp.ATTRIBUTES: {},
+        CertReputationProp.OVERRIDDEN: {
+            CertReputationOverriddenProp.FILES: [
+                {RepChangeEventProp.HASHES: FILE_NOTEPAD_EXE_HASH_DICT}
+            ],
+            CertReputationOverriddenProp.TRUNCATED: 0
+        }
+    }
+}
+
+
+class TestReputationSet(TestCase):
+
+    def test_fromdict(self):
+        reputation_set = ReputationSet.from_dict(SAMPLE_FILE_REPUTATIONS_DICT)
+
+        self.assertEqual(len(reputation_set), 2)
+        self.assertEqual(list(reputation_set), [FileProvider.GTI, FileProvider.ENTERPRISE])
+        self.assertEqual(reputation_set.get_trust_level(FileProvider.GTI), TrustLevel.KNOWN_TRUSTED)
+        self.assertEqual(reputation_set.get_trust_level(FileProvider.ATD), TrustLevel.NOT_SET)
+        self.assertNotIn(FileProvider.ATD, reputation_set)
+
+        ent_rep = reputation_set[FileProvider.ENTERPRISE]
+        self.assertEqual(ent_rep.create_date, 1476902802)
+        self.assertEqual(ent_rep.get_int_attribute(FileEnterpriseAttrib.PREVALENCE), 52)
+        self.assertEqual(ent_rep.get_attribute(FileEnterpriseAttrib.SERVER_VERSION), SAMPLE_ENTERPRISE_VERSION)
+        self.assertIsNone(ent_rep.get_int_attribute(FileEnterpriseAttrib.DETECTION_COUNT))
+        self.assertDictEqual(
+            ent_rep.attributes,
+            SAMPLE_FILE_REPUTATIONS_DICT[FileProvider.ENTERPRISE][ReputationProp.ATTRIBUTES]
+        )
+        self.assertFalse(hasattr(ent_rep, "__dict__"))
+        self.assertFalse(hasattr(reputation_set, "__dict__"))
+
+    def test_todict(self):
+        for reputations_dict in [SAMPLE_FILE_REPUTATIONS_DICT, SAMPLE_CERT_REPUTATIONS_DICT]:
+            reputation_set = ReputationSet.from_dict(reputations_dict)
+            self.assertDictEqual(reputation_set.to_dict(), reputations_dict)
+            self.assertEqual(reputation_set, ReputationSet.from_dict(reputations_dict))
+
+        cert_rep = ReputationSet.from_dict(SAMPLE_CERT_REPUTATIONS_DICT)[CertProvider.ENTERPRISE]
+        self.assertEqual(
+            cert_rep.get_property(CertReputationProp.OVERRIDDEN)[CertReputationOverriddenProp.TRUNCATED],
+            0
+        )
+        self.assertEqual(Reputation(FileProvider.GTI).to_dict()[ReputationProp.ATTRIBUTES], {})
+
+
+class TestResultMode(TestCase):
+
+    def test_objectmode(self):
+        dxl_client = test_batch.FakeAsyncDxlClient(
+            create_response=test_batch.TestGetFileReputations.create_response)
+        tie_client = TieClient(
+            dxl_client, file_reputation_cache=ReputationCache(), result_mode=ResultMode.OBJECT)
+
+        reputation_set = tie_client.get_file_reputation_async(FILE_NOTEPAD_EXE_HASH_DICT).result(timeout=5)
+        self.assertIsInstance(reputation_set, ReputationSet)
+        self.assertEqual(reputation_set.get_trust_level(FileProvider.GTI), TrustLevel.KNOWN_TRUSTED)
+
+        results = tie_client.get_file_reputations([FILE_NOTEPAD_EXE_HASH_DICT, FILE_INVALID_HASH_DICT])
+        self.assertEqual(results[0].value, reputation_set)
+        self.assertIsNotNone(results[1].error)
+
+        # The cache holds the standard form
+        tie_client.result_mode = ResultMode.DICT
+        reputations_dict = tie_client.get_file_reputation_async(FILE_NOTEPAD_EXE_HASH_DICT).result()
+        self.assertDictEqual(reputations_dict, reputation_set.to_dict())
+        self.assertEqual(len(dxl_client.requests), 2)
+
+    def test_invalidmode(self):
+        with self.assertRaises(ValueError):
+            TieClient(None, result_mode="unknown")
+
+
+class TestLazyReputationSet(TestCase):
+
+    @staticmethod
+    def create_payload(reputations_dict):
+        return json.dumps({"reputations": [
+            dict(reputation, **({CertReputationProp.OVERRIDDEN: {
+                CertReputationOverriddenProp.FILES: [
+                    {RepChangeEventProp.HASHES: SAMPLE_NOTEPAD_HASHES_PAYLOAD_DICT}],
+                CertReputationOverriddenProp.TRUNCATED: 0
+            }} if CertReputationProp.OVERRIDDEN in reputation else {}))
+            for reputation in reputations_dict.values()
+        ]}).encode("utf-8")
+
+    def test_lazy(self):
+        reputation_set = LazyReputationSet(self.create_payload(SAMPLE_FILE_REPUTATIONS_DICT))
+
+        self.assertEqual(reputation_set.get_trust_level(FileProvider.GTI), TrustLevel.KNOWN_TRUSTED)
+        self.assertEqual(reputation_set.get_trust_level(FileProvider.ATD, None), None)
+        # Reputations are only created when accessed
+        self.assertNotIsInstance(reputation_set._entries[FileProvider.GTI], Reputation)
+        self.assertEqual(
+            reputation_set[FileProvider.ENTERPRISE].get_int_attribute(FileEnterpriseAttrib.PREVALENCE),
+            52
+        )
+        self.assertIsInstance(reputation_set._entries[FileProvider.ENTERPRISE], Reputation)
+        self.assertEqual(list(reputation_set), [FileProvider.GTI, FileProvider.ENTERPRISE])
+        self.assertDictEqual(reputation_set.to_dict(), SAMPLE_FILE_REPUTATIONS_DICT)
+        self.assertEqual(reputation_set, ReputationSet.from_dict(SAMPLE_FILE_REPUTATIONS_DICT))
+
+    def test_lazy_cert(self):
+        reputation_set = LazyReputationSet(self.create_payload(SAMPLE_CERT_REPUTATIONS_DICT))
+        self.assertDictEqual(reputation_set.to_dict(), SAMPLE_CERT_REPUTATIONS_DICT)
+
+    def test_lazy_cert_shared(self):
+        reputation_set = LazyReputationSet(self.create_payload(SAMPLE_CERT_REPUTATIONS_DICT))
+        entry = reputation_set._get_entries()[CertProvider.ENTERPRISE]
+        # Concurrent accesses may create a reputation from the same entry more than once, which must
+        # not modify the (shared) entry
+        reputations = [Reputation._from_payload(entry) for _ in range(2)]
+        self.assertEqual(reputations[0], reputations[1])
+        self.assertEqual(
+            SAMPLE_NOTEPAD_HASHES_PAYLOAD_DICT,
+            entry[CertReputationProp.OVERRIDDEN][CertReputationOverriddenProp.FILES][0]["hashes"])
+        self.assertDictEqual(reputations[1].to_dict(), SAMPLE_CERT_REPUTATIONS_DICT[CertProvider.ENTERPRISE])
+
+    def test_lazymode(self):
+        dxl_client = test_batch.FakeAsyncDxlClient(
+            create_response=test_batch.TestGetFileReputations.create_response)
+        tie_client = TieClient(dxl_client, result_mode=ResultMode.LAZY)
+
+        reputation_set = tie_client.get_file_reputation_async(FILE_NOTEPAD_EXE_HASH_DICT).result(timeout=5)
+        self.assertIsInstance(reputation_set, LazyReputationSet)
+        self.assertEqual(reputation_set.get_trust_level(FileProvider.GTI), TrustLevel.KNOWN_TRUSTED)
+
+        results = tie_client.get_file_reputations([FILE_NOTEPAD_EXE_HASH_DICT, FILE_INVALID_HASH_DICT])
+        self.assertIsInstance(results[0].value, LazyReputationSet)
+        self.assertEqual(results[0].value, reputation_set)
+        self.assertIsNotNone(results[1].error)
+
+        # Reputations are parsed when cached
+        tie_client.file_reputation_cache = ReputationCache()
+        reputation_set = tie_client.get_file_reputation_async(FILE_NOTEPAD_EXE_HASH_DICT).result(timeout=5)
+        self.assertNotIsInstance(reputation_set, LazyReputationSet)
+        self.assertEqual(tie_client.file_reputation_cache.size, 1)
@@ -257,3 +257,32 @@ class TestSamples(BaseClientTest):
                 )
 
             dxl_client.disconnect()
+
+    def test_advancedjsoncodecbenchmark_example(self):
+        # Modify sample file to limit the number of iterations
+        sample_filename = self.ADVANCED_FOLDER + "/advanced_json_codec_benchmark.py"
+        temp_sample_file = TempSampleFile(sample_filename)
+
+        target_line = "ITERATIONS = "
+        replacement_line = target_line + "2\n"
+        temp_sample_file.write_file_line(
+            target=target_line,
+            replacement=replacement_line
+        )
+
+        with self.create_client(max_retries=0) as dxl_client:
+            # Set up client, and register mock service
+            dxl_client.connect()
+
+            with MockTieServer(dxl_client):
+                mock_print = BaseClientTest.run_sample(temp_sample_file.temp_file.name)
+
+                mock_print.assert_any_call(
+                    StringContains("json")
+                )
+
+                mock_print.assert_any_call(
+                    StringDoesNotContain("Error")
+                )
+
+            dxl_client.disconnect()